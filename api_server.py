@@ -0,0 +1,396 @@
+"""
+API Server Module
+
+This module exposes the dashboard pipelines over HTTP so other systems can
+submit dashboards without the Streamlit UI. Every request that calls a model
+is queued as a job and answered immediately with a job id; clients poll the
+job for its stage and result. The jobs run the same pipelines as the app
+(dashboard_pipeline). Queued jobs hold the encoded upload bytes, which are
+only decoded once a worker picks the job up.
+
+Endpoints (JSON bodies, images as base64 strings):
+    POST /v1/analyze   {"image", "objective", "filename", "dashboard", "model", "validate"}
+    POST /v1/compare   {"dashboards": [{"image", "objective", "filename"}], "dashboard", "versions", "model"}
+    POST /v1/chat      {"objective", "analysis", "message", "history", "kpis", "model"}
+    POST /v1/pdf       {"objective", "analysis", "filename", "images": [{"image", "caption"}]}
+
+"dashboard" optionally names a recurring dashboard; uploads under the same name
+are tracked as its versions and analyzed from their changed regions. "versions"
+declares two compared dashboards to be versions of one dashboard, so only
+their changed regions are compared.
+    GET  /v1/jobs/<id>           Job status, stage and result (the result is returned once)
+    DELETE /v1/jobs/<id>         Cancel a job
+    GET  /v1/reports/<id>        Download a PDF produced by a pdf job
+    GET  /v1/health              Liveness, queue depth, model call de-duplication and backend breakers
+    GET  /metrics                Prometheus metrics
+
+Run with: python api_server.py --host 127.0.0.1 --port 8600
+"""
+
+import argparse
+import base64
+import binascii
+import json
+import os
+import re
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from dotenv import load_dotenv
+
+from llm_service import get_model_identifier, get_model_call_stats, get_backend_statuses
+from image_codec import check_upload, decode_upload, ImageTooLargeError
+from utils import image_content_hash
+from kpi_extraction import answer_kpi_question
+from context_manager import build_chat_prompt
+from comparison_pipeline import MAX_COMPARISON_DASHBOARDS
+from dashboard_pipeline import run_summary_job, run_comparison_job, complete_text, SOURCE_CACHE
+from snapshot_tracking import dashboard_scope
+from region_diff import summarize_diff
+from report_jobs import report_content_hash, submit_pdf_report, get_pdf_report_path
+from artifact_store import get_artifact_store
+from job_queue import get_job_queue, QueueFullError, JobFailedError, FINISHED_STATES
+from metrics import get_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+
+MODEL_CHOICES = {
+    "gemini": "Gemini (Online)",
+    "ollama": "Ollama (Local)",
+}
+DEFAULT_MAX_BODY_BYTES = 64 * 1024 * 1024
+_JOB_PATH = re.compile(r"^/v1/jobs/([0-9a-f]{32})$")
+_REPORT_PATH = re.compile(r"^/v1/reports/([0-9a-f]{64})$")
+
+
+class BadRequestError(ValueError):
+    """Raised for malformed API requests; answered with HTTP 400."""
+
+
+def _model_choice(body):
+    model = body.get("model", "gemini")
+    if model not in MODEL_CHOICES:
+        raise BadRequestError(f"'model' must be one of: {', '.join(MODEL_CHOICES)}")
+    return MODEL_CHOICES[model]
+
+
+def _scope(body):
+    name = body.get("dashboard")
+    if name is not None and not isinstance(name, str):
+        raise BadRequestError("'dashboard' must be a string")
+    return dashboard_scope(name)
+
+
+def _require_text(body, field):
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise BadRequestError(f"'{field}' is required")
+    return value
+
+
+def _require_kpis(body):
+    """Check the optional 'kpis' rows have the shape extract_kpis() returns."""
+    kpis = body.get("kpis") or []
+    if not isinstance(kpis, list):
+        raise BadRequestError("'kpis' must be a list of {\"name\", \"value\", \"unit\", \"period\"} objects")
+    for index, kpi in enumerate(kpis):
+        if (not isinstance(kpi, dict) or not {"name", "value", "unit", "period"} <= kpi.keys()
+                or not isinstance(kpi["name"], str) or not kpi["name"].strip()
+                or isinstance(kpi["value"], bool) or not isinstance(kpi["value"], (int, float))
+                or not isinstance(kpi["unit"], str) or not isinstance(kpi["period"], str)):
+            raise BadRequestError(
+                f"'kpis[{index}]' must have a string 'name', 'unit' and 'period' and a numeric 'value'"
+            )
+    return kpis
+
+
+def _read_image(data, field="image"):
+    """Decode the base64 of an uploaded image and check its header; returns the encoded bytes."""
+    if not isinstance(data, str) or not data:
+        raise BadRequestError(f"'{field}' must be a base64-encoded image")
+    try:
+        raw = base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        raise BadRequestError(f"'{field}' is not valid base64")
+    try:
+        check_upload(BytesIO(raw))
+    except ImageTooLargeError as e:
+        raise BadRequestError(str(e))
+    except Exception:
+        raise BadRequestError(f"'{field}' is not a supported image")
+    return raw
+
+
+def _load_image(raw, field="image"):
+    """Decode an upload's bytes inside the job, within the upload pixel budget."""
+    try:
+        return decode_upload(BytesIO(raw))
+    except Exception as e:
+        raise JobFailedError(f"'{field}' could not be decoded: {e}")
+
+
+def run_analyze_job(job, raw_image, filename, objective, model_choice, validate, scope):
+    """Job: validate, analyze, extract KPIs from and record one dashboard."""
+    job.set_stage("Decoding image")
+    image = _load_image(raw_image)
+    result = run_summary_job(job, image, filename, objective, model_choice, scope, validate)
+    return {
+        "analysis": result["analysis"],
+        "source": result["source"],
+        "cached": result["source"] == SOURCE_CACHE,
+        "kpis": result["kpis"],
+        "model": get_model_identifier(model_choice),
+        "image_hash": image_content_hash(image),
+    }
+
+
+def run_compare_job(job, raw_dashboards, model_choice, scope, versions):
+    """Job: compare dashboards, from changed regions when they are two versions of one dashboard."""
+    job.set_stage("Decoding images")
+    dashboards = [
+        (_load_image(raw, f"dashboards[{index}].image"), filename, objective)
+        for index, (raw, filename, objective) in enumerate(raw_dashboards)
+    ]
+    result = run_comparison_job(job, dashboards, model_choice, scope=scope, versions=versions)
+    response = {
+        "duplicates": {str(index): original for index, original in result["duplicates"].items()},
+        "compared": len(result["dashboards"]),
+        "model": get_model_identifier(model_choice),
+        "comparison": result["comparison"],
+    }
+    if result["skipped"]:
+        response["skipped"] = result["skipped"]
+    if result["version_diff"] is not None:
+        response["changes"] = summarize_diff(result["version_diff"], result["dashboards"][1][0].size)
+    if result["analyses"]:
+        response["analyses"] = result["analyses"]
+    return response
+
+
+def run_chat_job(job, objective, analysis, history, message, kpis, model_choice):
+    """Job: answer a chat message about an analyzed dashboard."""
+    local_answer = answer_kpi_question(message, kpis)
+    if local_answer:
+        return {"response": local_answer, "source": "kpi_table"}
+
+    job.set_stage("Getting response")
+    response = complete_text(model_choice, build_chat_prompt(objective, analysis, history, message))
+    if not response:
+        raise JobFailedError("The model did not return a response.")
+    return {"response": response, "source": "model"}
+
+
+def run_pdf_job(job, objective, analysis, filename, raw_images):
+    """Job: build a PDF report in the artifact store."""
+    job.set_stage("Decoding images")
+    images = [(_load_image(raw, f"images[{index}].image"), caption) for index, (raw, caption) in enumerate(raw_images)]
+    job.set_stage("Building PDF report")
+    content_hash = report_content_hash(objective, analysis, [image_content_hash(image) for image, _ in images])
+    submit_pdf_report(content_hash, objective, analysis, filename, images or None)
+    get_pdf_report_path(content_hash, wait=True)
+    return {"report_id": content_hash, "url": f"/v1/reports/{content_hash}"}
+
+
+def submit_analyze(body):
+    """Queue an analyze job from a request body."""
+    raw_image = _read_image(body.get("image"))
+    return get_job_queue().submit(
+        "analyze", run_analyze_job, raw_image, str(body.get("filename") or "dashboard"), _require_text(body, "objective"),
+        _model_choice(body), bool(body.get("validate", True)), _scope(body)
+    )
+
+
+def submit_compare(body):
+    """Queue a compare job from a request body."""
+    items = body.get("dashboards")
+    if not isinstance(items, list) or not 2 <= len(items) <= MAX_COMPARISON_DASHBOARDS:
+        raise BadRequestError(f"'dashboards' must list between 2 and {MAX_COMPARISON_DASHBOARDS} dashboards")
+    dashboards = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BadRequestError(f"'dashboards[{index}]' must be an object")
+        dashboards.append((
+            _read_image(item.get("image"), f"dashboards[{index}].image"),
+            str(item.get("filename") or f"dashboard_{index + 1}"),
+            _require_text(item, "objective"),
+        ))
+    return get_job_queue().submit(
+        "compare", run_compare_job, dashboards, _model_choice(body), _scope(body), bool(body.get("versions", False))
+    )
+
+
+def submit_chat(body):
+    """Queue a chat job from a request body."""
+    history = body.get("history") or []
+    if not isinstance(history, list) or not all(isinstance(msg, dict) and {"role", "message"} <= msg.keys() for msg in history):
+        raise BadRequestError("'history' must be a list of {\"role\", \"message\"} objects")
+    return get_job_queue().submit(
+        "chat", run_chat_job,
+        _require_text(body, "objective"), _require_text(body, "analysis"), history,
+        _require_text(body, "message"), _require_kpis(body), _model_choice(body)
+    )
+
+
+def submit_pdf(body):
+    """Queue a PDF job from a request body."""
+    images = []
+    for index, item in enumerate(body.get("images") or []):
+        if not isinstance(item, dict):
+            raise BadRequestError(f"'images[{index}]' must be an object")
+        images.append((_read_image(item.get("image"), f"images[{index}].image"), str(item.get("caption") or "")))
+    return get_job_queue().submit(
+        "pdf", run_pdf_job,
+        _require_text(body, "objective"), _require_text(body, "analysis"), str(body.get("filename") or "dashboard"), images
+    )
+
+
+SUBMIT_ROUTES = {
+    "/v1/analyze": submit_analyze,
+    "/v1/compare": submit_compare,
+    "/v1/chat": submit_chat,
+    "/v1/pdf": submit_pdf,
+}
+
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    """Routes API requests to the job queue."""
+
+    server_version = "KPIDashboardAPI/1.0"
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        token = os.getenv("API_TOKEN")
+        if not token or self.headers.get("Authorization") == f"Bearer {token}":
+            return True
+        self._send_json(401, {"error": "Missing or invalid bearer token."})
+        return False
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > int(os.getenv("API_MAX_BODY_BYTES", DEFAULT_MAX_BODY_BYTES)):
+            self._send_json(413, {"error": "Request body is too large."})
+            return None
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "Request body must be JSON."})
+            return None
+        if not isinstance(body, dict):
+            self._send_json(400, {"error": "Request body must be a JSON object."})
+            return None
+        return body
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        submit = SUBMIT_ROUTES.get(self.path)
+        if submit is None:
+            self._send_json(404, {"error": "Not found."})
+            return
+
+        body = self._read_json()
+        if body is None:
+            return
+        try:
+            job = submit(body)
+        except BadRequestError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except QueueFullError as e:
+            self._send_json(429, {"error": str(e)})
+            return
+        self._send_json(202, {"job_id": job.id, "status": job.status, "url": f"/v1/jobs/{job.id}"})
+
+    def do_GET(self):
+        if self.path == "/v1/health":
+            self._send_json(200, {
+                "status": "ok",
+                "queue": get_job_queue().stats(),
+                "model_calls": get_model_call_stats(),
+                "backends": get_backend_statuses(),
+            })
+            return
+        if self.path == "/metrics":
+            body = get_metrics().render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if not self._authorized():
+            return
+
+        match = _JOB_PATH.match(self.path)
+        if match:
+            job = get_job_queue().get(match.group(1))
+            if job is None:
+                self._send_json(404, {"error": "Unknown or expired job."})
+            else:
+                data = job.to_dict()
+                if job.status in FINISHED_STATES:
+                    # The result is delivered once; later polls only see the status.
+                    job.take_result()
+                self._send_json(200, data)
+            return
+
+        match = _REPORT_PATH.match(self.path)
+        if match:
+            store = get_artifact_store()
+            content_hash = match.group(1)
+            if not store.exists(content_hash):
+                self._send_json(404, {"error": "Unknown or expired report."})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(os.path.getsize(store.path_for(content_hash))))
+            self.end_headers()
+            for chunk in store.iter_chunks(content_hash):
+                self.wfile.write(chunk)
+            return
+
+        self._send_json(404, {"error": "Not found."})
+
+    def do_DELETE(self):
+        if not self._authorized():
+            return
+        match = _JOB_PATH.match(self.path)
+        if not match:
+            self._send_json(404, {"error": "Not found."})
+            return
+        cancelled = get_job_queue().cancel(match.group(1))
+        self._send_json(200 if cancelled else 409, {"cancelled": cancelled})
+
+
+class APIServer(ThreadingHTTPServer):
+    """Threaded HTTP server; each connection only parses input and queues a job."""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Serve the KPI dashboard pipelines over HTTP.")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", 8600)))
+    args = parser.parse_args()
+
+    server = APIServer((args.host, args.port), APIRequestHandler)
+    print(f"Serving KPI dashboard API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,386 @@
-import streamlit as st
 import os
-from PIL import Image
-from dotenv import load_dotenv
-from llm_service import gemini_inference, ollama_inference, gemini_chat_inference, ollama_chat_inference
-from dashboard_validator import validate_dashboard_image, get_validation_error_message, get_uploader_help_text
-from dashboard_similarity import detect_dashboard_similarity, should_proceed_with_comparison
-from pdf_generator import create_pdf_report
-from styles import custom_styles
-from context_manager import DashboardContextManager
+import time
+import uuid
+from datetime import datetime
+from plugin_registry import import_timer, get_import_report
+
+with import_timer("streamlit"):
+    import streamlit as st
+with import_timer("dotenv"):
+    from dotenv import load_dotenv
+with import_timer("llm_service"):
+    from llm_service import (
+        gemini_chat_inference, ollama_chat_inference, get_model_identifier, get_model_call_stats, get_backend_statuses
+    )
+with import_timer("dashboard_validator"):
+    from dashboard_validator import get_uploader_help_text
+with import_timer("app modules"):
+    from styles import stylesheet_html
+    from context_manager import DashboardContextManager
+    from shared_cache import get_shared_cache
+    from utils import image_content_hash
+    from image_codec import decode_upload, ImageTooLargeError
+    from kpi_extraction import answer_kpi_question
+    from snapshot_tracking import get_snapshot_store, dashboard_scope, session_scope
+    from report_jobs import report_content_hash, submit_pdf_report, read_pdf_report, pop_report_notice, retry_delay
+    from dashboard_library import get_dashboard_library
+    from comparison_pipeline import MAX_COMPARISON_DASHBOARDS
+    from dashboard_pipeline import run_summary_job, run_comparison_job, KPI_CACHE_OBJECTIVE
+    from tracing import start_span, current_span, get_tracer
+    from metrics import start_metrics_server
+    from cassette import get_cassette
+    from job_queue import get_job_queue, QueueFullError, FINISHED_STATES, QUEUED, SUCCEEDED, CANCELLED
 
 load_dotenv()
 
 context_manager = DashboardContextManager()
 
-@st.cache_data
-def generate_pdf_report(objective, analysis, filename):
-    return create_pdf_report(objective, analysis, filename) 
+# How often the page polls the session's background jobs for progress.
+JOB_POLL_SECONDS = 1.0
+JOB_LABELS = {
+    "summary": "Dashboard analysis",
+    "comparison": "Dashboard comparison",
+}
+
+def render_pdf_download(label, content_hash, objective, analysis, source_filename, download_filename, images=None):
+    """Offer a PDF download that is built in the background and read from disk on click."""
+    notice = pop_report_notice(content_hash)
+    if notice:
+        st.warning(notice)
+    try:
+        future = submit_pdf_report(content_hash, objective, analysis, source_filename, images)
+    except Exception as e:
+        st.error(f"Error generating PDF report: {e}")
+        return
+    if future.done() and future.exception() is not None:
+        st.error(
+            f"Error generating PDF report: {future.exception()}. "
+            f"It will be retried in {retry_delay(content_hash):.0f}s."
+        )
+        return
+
+    # A callable defers reading the stored report until the user clicks, so
+    # neither the session nor the rerun holds the PDF bytes. An evicted report
+    # is rebuilt on click from the same content.
+    st.download_button(
+        label=label,
+        data=lambda: read_pdf_report(content_hash, objective, analysis, source_filename, images) or b"",
+        file_name=download_filename,
+        mime="application/pdf",
+        key=f"download_pdf_{content_hash}"
+    )
+
+def load_uploaded_image(uploaded_file):
+    """Decode an upload once within the pixel budget and share that copy across reruns."""
+    decoded_uploads = st.session_state.setdefault('decoded_uploads', {})
+    image = decoded_uploads.get(uploaded_file.file_id)
+    if image is None:
+        uploaded_file.seek(0)
+        image = decode_upload(uploaded_file)
+        # Only the uploads currently on screen need to stay decoded.
+        if len(decoded_uploads) >= 4:
+            decoded_uploads.pop(next(iter(decoded_uploads)))
+        decoded_uploads[uploaded_file.file_id] = image
+    return image
+
+def get_comparison_report_images():
+    """Return the (image, caption) pairs of the compared dashboards for the PDF report."""
+    images = [(dashboard['image_pil'], dashboard['filename']) for dashboard in st.session_state.get('comparison_dashboards', [])]
+    if st.session_state.get('comparison_diff'):
+        images.append((st.session_state.comparison_diff['heatmap'], "Changed regions"))
+    return images
+
+def store_comparison_result(comparison_result, version_diff=None):
+    """Keep a finished comparison in the session and start building its PDF report."""
+    st.session_state.comparison_analysis = comparison_result
+    st.session_state.comparison_diff = None
+    if version_diff is not None:
+        st.session_state.comparison_diff = {
+            "heatmap": version_diff['heatmap'],
+            "crops": version_diff['crops'],
+        }
+    if not comparison_result:
+        return
+
+    images = get_comparison_report_images()
+    st.session_state.comparison_report_hash = report_content_hash(
+        "Dashboard Comparison Analysis",
+        comparison_result,
+        [image_content_hash(image) for image, _ in images]
+    )
+    submit_pdf_report(
+        st.session_state.comparison_report_hash,
+        "Dashboard Comparison Analysis",
+        comparison_result,
+        "dashboard_comparison_report.pdf",
+        images
+    )
+
+def apply_summary_result(result):
+    """Open the analysis session of a finished summary job."""
+    model_choice = result['model_choice']
+    model_used = "gemini" if model_choice == "Gemini (Online)" else "ollama"
+    created = context_manager.create_session(
+        'single_dashboard', result['image'], result['filename'], result['objective'], result['analysis'],
+        model_used, result['kpis'], model_id=get_model_identifier(model_choice)
+    )
+    if not created:
+        return
+    session_data = context_manager.get_session_data()
+    submit_pdf_report(session_data['report_hash'], result['objective'], result['analysis'], result['filename'], [(result['image'], result['filename'])])
+    st.session_state.comparison_analysis = None
+    st.session_state.analysis_result = result['analysis']
+    st.session_state.snapshot_scope = result['scope']
+
+def apply_comparison_result(result):
+    """Store the dashboards and report of a finished comparison job."""
+    if not result['comparison']:
+        return
+    model_choice = result['model_choice']
+    model_used = "gemini" if model_choice == "Gemini (Online)" else "ollama"
+    if result['analyses']:
+        context_manager.store_comparison_analyses(result['dashboards'], model_used, get_model_identifier(model_choice), result['analyses'])
+    else:
+        context_manager.set_comparison_dashboards(result['dashboards'], model_used)
+    store_comparison_result(result['comparison'], result['version_diff'])
+
+JOB_APPLIERS = {
+    "summary": apply_summary_result,
+    "comparison": apply_comparison_result,
+}
+
+def get_job_owner():
+    """Return the id that ties background jobs to this browser session."""
+    if 'job_owner' not in st.session_state:
+        st.session_state.job_owner = uuid.uuid4().hex
+    return st.session_state.job_owner
+
+def get_snapshot_scope(dashboard_name=""):
+    """Scope snapshot history to a named recurring dashboard, or else to this browser session."""
+    return dashboard_scope(dashboard_name) or session_scope(get_job_owner())
+
+def has_active_job(kind):
+    """Check whether this session already has a job of this kind in flight."""
+    return kind in st.session_state.get('active_jobs', {}).values()
+
+def submit_session_job(kind, function, *args):
+    """Run a pipeline in the background for this session; its result is applied on a later rerun."""
+    try:
+        job = get_job_queue().submit(kind, function, *args, owner=get_job_owner())
+    except QueueFullError as e:
+        st.error(f"The server is busy. Please try again in a moment. ({e})")
+        return
+    st.session_state.setdefault('active_jobs', {})[job.id] = kind
+
+def apply_finished_jobs():
+    """Apply the results of this session's finished jobs in the script thread and show their messages."""
+    active_jobs = st.session_state.get('active_jobs', {})
+    for job_id, kind in list(active_jobs.items()):
+        job = get_job_queue().get(job_id)
+        if job is None:
+            del active_jobs[job_id]
+            st.error(f"{JOB_LABELS[kind]} expired before its result was collected. Please run it again.")
+            continue
+        if job.status not in FINISHED_STATES:
+            continue
+
+        del active_jobs[job_id]
+        for level, message in job.messages:
+            getattr(st, level)(message)
+        if job.status == SUCCEEDED:
+            # Applying the result (and starting its PDF) continues the job's trace.
+            with start_span(f"apply.{kind}", parent=job.span):
+                JOB_APPLIERS[kind](job.take_result())
+        elif job.status == CANCELLED:
+            st.info(f"{JOB_LABELS[kind]} was cancelled.")
+        else:
+            st.error(job.error)
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_active_jobs():
+    """Poll this session's background jobs, show their stages and rerun the page when one finishes."""
+    finished = False
+    for job_id, kind in list(st.session_state.get('active_jobs', {}).items()):
+        job = get_job_queue().get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            finished = True
+            continue
+
+        label = f"{JOB_LABELS[kind]}: {job.stage} ({time.time() - job.created_at:.0f}s)"
+        with st.status(label, state="running", expanded=True):
+            if job.status == QUEUED:
+                st.write("Waiting for a free worker...")
+            stages = [stage for stage in job.stages if stage[1] != "Started"]
+            for (started, stage), (ended, _) in zip(stages, stages[1:]):
+                st.write(f"✅ {stage} · {ended - started:.1f}s")
+            if stages:
+                st.write(f"⏳ {stages[-1][1]}")
+            if job.cancelled:
+                st.caption("Cancelling after the current step...")
+            elif st.button("Cancel", key=f"cancel_job_{job_id}"):
+                get_job_queue().cancel(job_id)
+    if finished:
+        st.rerun()
+
+def render_kpi_trends(image, scope):
+    """Chart each KPI across the tracked snapshots of this dashboard."""
+    if not scope:
+        return
+    try:
+        store = get_snapshot_store()
+        dashboard_id = store.dashboard_for_image(image_content_hash(image), scope)
+        trends = store.get_kpi_trends(dashboard_id) if dashboard_id is not None else {}
+    except Exception as e:
+        st.warning(f"Could not load KPI trends: {e}")
+        return
+
+    series = {name: points for name, points in trends.items() if len({point[0] for point in points}) > 1}
+    if not series:
+        return
+
+    import pandas as pd
+
+    st.markdown("### KPI Trends")
+    selected = st.selectbox("KPI", sorted(series), key="kpi_trend_choice")
+    points = series[selected]
+    chart_data = pd.DataFrame(
+        {"value": [value for _, _, value in points]},
+        index=pd.to_datetime([created_at for created_at, _, _ in points], unit="s")
+    )
+    st.line_chart(chart_data)
+
+def render_library_matches(image):
+    """List previously seen versions of this dashboard and their cached analyses."""
+    try:
+        matches = get_dashboard_library().find_similar(image)
+    except Exception as e:
+        st.warning(f"Could not search the dashboard library: {e}")
+        return
+    if not matches:
+        return
+
+    with st.expander(f"🔎 Seen before: {len(matches)} similar dashboard(s)", expanded=False):
+        for match in matches:
+            seen = datetime.fromtimestamp(match['last_seen']).strftime("%Y-%m-%d %H:%M")
+            st.markdown(f"**{match['filename']}** · {match['distance']} bit(s) apart · last seen {seen} · uploaded {match['upload_count']}×")
+            analyses = [analysis for analysis in match['analyses'] if analysis['objective'] != KPI_CACHE_OBJECTIVE]
+            for analysis in analyses:
+                with st.popover(f"Cached analysis: {analysis['objective'][:60]} ({analysis['model']})"):
+                    st.write(analysis['analysis'])
+
+def render_cache_admin_view():
+    """Show shared analysis cache hit rates in the sidebar."""
+    with st.sidebar.expander("🗄️ Shared Analysis Cache", expanded=False):
+        try:
+            stats = get_shared_cache().stats()
+        except Exception as e:
+            st.error(f"Could not read cache statistics: {e}")
+            return
+
+        col1, col2 = st.columns(2)
+        col1.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+        col2.metric("Entries", f"{stats['entries']}/{stats['max_entries']}")
+        st.caption(f"{stats['hits']} hits · {stats['misses']} misses · {stats['evictions']} evictions")
+
+        for model, counts in stats['per_model'].items():
+            st.write(f"**{model}**: {counts['hit_rate']:.0%} ({counts['hits']} hits / {counts['misses']} misses)")
+
+        if st.button("Clear shared cache", key="clear_shared_cache"):
+            get_shared_cache().clear()
+            st.rerun()
+
+def render_backend_status():
+    """Show each model backend's circuit breaker state in the sidebar."""
+    statuses = get_backend_statuses()
+    with st.sidebar.expander("🩺 Model Backends", expanded=any(status['state'] != "closed" for status in statuses)):
+        for status in statuses:
+            if status['state'] == "closed":
+                st.write(f"🟢 **{status['name']}** · available")
+            elif status['state'] == "open":
+                st.write(f"🔴 **{status['name']}** · paused after repeated failures, retrying in {status['retry_in']:.0f}s")
+            else:
+                st.write(f"🟡 **{status['name']}** · checking whether it has recovered")
+            if status['failures'] and status['last_error']:
+                st.caption(f"{status['failures']} recent failure(s) · last: {status['last_error'][:200]}")
+        cassette = get_cassette().status()
+        if cassette['mode'] == "replay":
+            st.info(f"📼 Replaying {cassette['responses']} recorded response(s) from `{cassette['path']}`; no model is called.")
+        elif cassette['mode'] == "record":
+            st.info(f"📼 Recording model responses to `{cassette['path']}` ({cassette['responses']} so far).")
+
+def warn_if_backend_unavailable(model_choice):
+    """Warn before a run that the chosen backend is currently failing fast."""
+    name = model_choice.split(" ")[0]
+    for status in get_backend_statuses():
+        if status['name'] == name and status['state'] == "open":
+            st.warning(f"⚠️ {name} is failing and requests to it are paused for {status['retry_in']:.0f}s. Choose the other model or try again shortly.")
+
+def render_model_call_stats():
+    """Show how many identical in-flight model calls were collapsed into one, in the sidebar."""
+    with st.sidebar.expander("🔁 Model Call De-duplication", expanded=False):
+        stats = get_model_call_stats()
+        col1, col2 = st.columns(2)
+        col1.metric("Collapsed", f"{stats['collapse_rate']:.0%}")
+        col2.metric("In flight", stats['in_flight'])
+        st.caption(
+            f"{stats['calls']} calls · {stats['executed']} sent · {stats['collapsed']} shared · "
+            f"{stats['cancelled']} cancelled while waiting · up to {stats['max_followers']} callers on one request"
+        )
+
+def render_performance_panel():
+    """Show a waterfall of the spans of this session's recent requests."""
+    traces = get_tracer().recent_traces(owner=get_job_owner())
+    with st.expander("⏱️ Performance", expanded=False):
+        if not traces:
+            st.caption("No traced requests in this session yet.")
+            return
+
+        import altair as alt
+        import pandas as pd
+
+        labels = [
+            f"{datetime.fromtimestamp(trace['start_ns'] / 1e9).strftime('%H:%M:%S')} · {trace['name']} · {trace['duration_ms'] / 1000:.1f}s"
+            for trace in traces
+        ]
+        selected = st.selectbox("Request", range(len(traces)), format_func=lambda index: labels[index], key="performance_trace")
+        trace = traces[selected]
+
+        depths = {}
+        rows = []
+        for span in trace['spans']:
+            depth = depths.get(span.parent_id, -1) + 1
+            depths[span.span_id] = depth
+            rows.append({
+                "span": f"{len(rows) + 1:02d} {'· ' * depth}{span.name}",
+                "start_ms": (span.start_ns - trace['start_ns']) / 1e6,
+                "end_ms": (span.end_ns - trace['start_ns']) / 1e6,
+                "duration_ms": round(span.duration_ms, 1),
+                "kind": span.name.split(".")[0] if "." in span.name else "stage",
+                "status": "error" if span.error else "ok",
+                "details": ", ".join(f"{key}={value}" for key, value in span.attributes.items()),
+            })
+        spans = pd.DataFrame(rows)
+
+        chart = alt.Chart(spans).mark_bar().encode(
+            x=alt.X("start_ms:Q", title="ms since request start"),
+            x2="end_ms:Q",
+            y=alt.Y("span:N", sort=None, title=None),
+            color=alt.Color("kind:N", title="Kind"),
+            opacity=alt.condition(alt.datum.status == "error", alt.value(0.4), alt.value(1.0)),
+            tooltip=["span", "duration_ms", "status", "details"],
+        ).properties(height=max(120, 24 * len(rows)))
+        st.altair_chart(chart)
+        st.dataframe(spans[["span", "duration_ms", "status", "details"]], hide_index=True)
+        st.caption(f"Spans are also written to `{get_tracer().path}` (OTLP JSON, one span per line).")
+
+def render_import_report():
+    """Show per-module import cost, including lazily loaded plugins, in the sidebar."""
+    with st.sidebar.expander("⏱️ Import Cost", expanded=False):
+        report = get_import_report()
+        total = sum(record['seconds'] for record in report)
+        st.caption(f"{total * 1000:.0f} ms across {len(report)} tracked imports")
+        for record in report:
+            st.write(f"`{record['module']}` · {record['seconds'] * 1000:.1f} ms ({record['phase']})")
 
 def main():
     st.set_page_config(
@@ -23,7 +388,18 @@ def main():
         layout="wide"
     )
 
-    st.markdown(custom_styles(), unsafe_allow_html=True)
+    st.markdown(stylesheet_html(), unsafe_allow_html=True)
+    render_backend_status()
+
+    try:
+        start_metrics_server()
+    except OSError as e:
+        st.sidebar.warning(f"Metrics endpoint unavailable: {e}")
+
+    if os.getenv("SHOW_ADMIN_VIEW", "").lower() in ("1", "true", "yes"):
+        render_cache_admin_view()
+        render_model_call_stats()
+        render_import_report()
     
     st.markdown("""
     <div class="main-header">
@@ -37,12 +413,17 @@ def main():
         st.session_state.analysis_result = None
     if 'comparison_analysis' not in st.session_state:
         st.session_state.comparison_analysis = None
+    if 'active_jobs' not in st.session_state:
+        st.session_state.active_jobs = {}
+
+    apply_finished_jobs()
         
     tab1, tab2 = st.tabs(["📈 Single Dashboard Analysis", "⚖️ Dashboard Comparison Tool"])
     
     with tab1:
         st.header("Analyze a Single Dashboard")
         model_choice = st.radio("Choose the model for analysis", ("Gemini (Online)", "Ollama (Local)"), horizontal=True, key="single_model_choice")
+        warn_if_backend_unavailable(model_choice)
 
         uploaded_file = st.file_uploader(
             "Upload a Dashboard Image", 
@@ -50,144 +431,120 @@ def main():
             help=get_uploader_help_text()
         )
         objective = st.text_area("Provide a business objective for the analysis", height=100)
+        dashboard_name = st.text_input(
+            "Dashboard name (optional)",
+            key="dashboard_name",
+            help="Name a recurring dashboard to compare each upload with its earlier versions under that name. "
+                 "Without a name, uploads are only compared with earlier ones from this session."
+        )
         
         
-        if st.button("Generate Summary"):
+        if st.button("Generate Summary", disabled=has_active_job("summary")):
             if uploaded_file and objective:
-                with st.spinner('Validating dashboard image...'):
-                    image = Image.open(uploaded_file)
-                    
-                    # First validate if it's actually a dashboard
-                    is_dashboard = validate_dashboard_image(image, model_choice)
-                    
-                    if not is_dashboard:
-                        st.error(get_validation_error_message())
-                        return
-                
-                with st.spinner('Analyzing the dashboard...'):
-                    if model_choice == "Gemini (Online)":
-                        analysis_result = gemini_inference(objective, [image])
-                        model_used = "gemini"
-                    else:
-                        analysis_result = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), objective, [image])
-                        model_used = "ollama"
-                    
-                    if analysis_result:
-                        context_manager.create_session('single_dashboard', image, uploaded_file.name, objective, analysis_result, model_used)
-                        st.session_state.comparison_analysis = None
-                        st.session_state.analysis_result = analysis_result
-                        st.rerun()
-                    else:
-                        st.error("Failed to get analysis from the model.")
+                try:
+                    image = load_uploaded_image(uploaded_file)
+                except ImageTooLargeError as e:
+                    st.error(f"❌ **This image is too large to analyze.** {e}")
+                    return
+
+                # Validation and analysis run in the background, so widget
+                # interactions while the model works no longer discard them.
+                submit_session_job(
+                    "summary", run_summary_job, image, uploaded_file.name, objective, model_choice, get_snapshot_scope(dashboard_name)
+                )
+                st.rerun()
             else:
                 st.error("Please upload an image and provide a business objective.")
 
     with tab2:
-        st.header("Compare Two Dashboards")
+        st.header("Compare Dashboards")
         
-        st.info("""
-        💡 **Smart Comparison Feature**: The system will automatically detect if you upload the same or very similar dashboards 
-        and provide appropriate feedback instead of meaningless comparison results.
+        st.info(f"""
+        💡 **Smart Comparison Feature**: Upload between 2 and {MAX_COMPARISON_DASHBOARDS} dashboards. The system automatically 
+        detects uploads of the same or very similar dashboards and leaves the duplicates out of the comparison.
         """)
         
         comparison_model_choice = st.radio("Choose the model for comparison", ("Gemini (Online)", "Ollama (Local)"), horizontal=True, key="comparison_model_choice")
+        warn_if_backend_unavailable(comparison_model_choice)
         
-        col1, col2 = st.columns([1, 1])
-        
-        with col1:
-            st.markdown("<h4><i class='bi bi-speedometer'></i> Dashboard 1</h4>", unsafe_allow_html=True)
-            uploaded_file1 = st.file_uploader(
-                "Upload Dashboard Image", 
-                type=["png", "jpg", "jpeg"], 
-                key="dashboard1_uploader",
-                help=get_uploader_help_text()
-            )
-            objective1 = st.text_area("Dashboard 1 Objective", height=100, key="objective1")
-            
-        with col2:
-            st.markdown("<h4><i class='bi bi-speedometer2'></i> Dashboard 2</h4>", unsafe_allow_html=True)
-            uploaded_file2 = st.file_uploader(
-                "Upload Dashboard Image", 
-                type=["png", "jpg", "jpeg"], 
-                key="dashboard2_uploader",
-                help=get_uploader_help_text()
-            )
-            objective2 = st.text_area("Dashboard 2 Objective", height=100, key="objective2")
+        uploaded_files = st.file_uploader(
+            "Upload Dashboard Images", 
+            type=["png", "jpg", "jpeg"], 
+            accept_multiple_files=True,
+            key="comparison_uploader",
+            help=get_uploader_help_text()
+        )
+        shared_objective = st.text_area("Business objective for all dashboards", height=100, key="comparison_objective")
 
-        if uploaded_file1 and objective1 and uploaded_file2 and objective2:
-            if st.button("Compare Dashboards"):
-                with st.spinner("Validating dashboard images..."):
-                    image1 = Image.open(uploaded_file1)
-                    image2 = Image.open(uploaded_file2)
-                    
-                    # Validate both images are dashboards
-                    is_dashboard1 = validate_dashboard_image(image1, comparison_model_choice)
-                    is_dashboard2 = validate_dashboard_image(image2, comparison_model_choice)
-                    
-                    if not is_dashboard1:
-                        st.error(get_validation_error_message("Dashboard 1"))
-                        return
-                    
-                    if not is_dashboard2:
-                        st.error(get_validation_error_message("Dashboard 2"))
-                        return
-                
-                with st.spinner("Checking dashboard similarity..."):
-                    # Check if dashboards are similar/identical
-                    similarity_result = detect_dashboard_similarity(image1, image2, comparison_model_choice)
-                    
-                    # Display similarity analysis
-                    st.info(similarity_result['message'])
-                    
-                    # Check if we should proceed with comparison
-                    if not should_proceed_with_comparison(similarity_result):
-                        st.warning("""
-                        ⚠️ **Comparison Skipped**
-                        
-                        The dashboards are too similar to provide meaningful comparison insights. 
-                        Please upload two different dashboards for a proper comparison analysis.
-                        """)
-                        return
-                
-                with st.spinner("Analyzing and Comparing Dashboards..."):
-                    if comparison_model_choice == "Gemini (Online)":
-                        analysis1 = gemini_inference(objective1, [image1]) 
-                        analysis2 = gemini_inference(objective2, [image2])
-                        model_used = "gemini"
-                    else:
-                        analysis1 = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), objective1, [image1])
-                        analysis2 = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), objective2, [image2])
-                        model_used = "ollama"
-                    
-                    context_manager.create_session('dashboard_one', image1, uploaded_file1.name, objective1, analysis1, model_used)
-                    context_manager.create_session('dashboard_two', image2, uploaded_file2.name, objective2, analysis2, model_used)
+        objectives = {}
+        if uploaded_files:
+            with st.expander("Per-dashboard objectives (optional)", expanded=False):
+                for uploaded in uploaded_files:
+                    objectives[uploaded.file_id] = st.text_input(
+                        f"Objective for {uploaded.name}",
+                        key=f"comparison_objective_{uploaded.file_id}",
+                        placeholder="Uses the objective above when left empty"
+                    )
 
-                    comparison_prompt = context_manager.get_comparison_context()
+        compare_versions = False
+        if uploaded_files and len(uploaded_files) == 2:
+            compare_versions = st.checkbox(
+                "These are two versions of the same dashboard",
+                key="compare_versions",
+                help="Compare only the regions that changed between the versions instead of analyzing both dashboards in full."
+            )
 
-                    if comparison_model_choice == "Gemini (Online)":
-                        comparison_result = gemini_chat_inference(comparison_prompt)
-                    else:
-                        comparison_result = ollama_chat_inference(os.getenv("OLLAMA_MODEL_NAME"), comparison_prompt)
-                    
-                    st.session_state.comparison_analysis = comparison_result
-                    st.rerun()
+        if uploaded_files and len(uploaded_files) > MAX_COMPARISON_DASHBOARDS:
+            st.error(f"Please upload at most {MAX_COMPARISON_DASHBOARDS} dashboards to compare.")
+        elif uploaded_files and len(uploaded_files) >= 2 and (shared_objective or all(objectives.values())):
+            if st.button("Compare Dashboards", disabled=has_active_job("comparison")):
+                dashboards = []
+                try:
+                    for uploaded in uploaded_files:
+                        dashboards.append((load_uploaded_image(uploaded), uploaded.name, objectives.get(uploaded.file_id) or shared_objective))
+                except ImageTooLargeError as e:
+                    st.error(f"❌ **One of the images is too large to compare.** {e}")
+                    return
+
+                indexed_analyses = context_manager.get_indexed_analyses(dashboards, get_model_identifier(comparison_model_choice))
+                submit_session_job(
+                    "comparison", run_comparison_job, dashboards, comparison_model_choice, indexed_analyses,
+                    get_snapshot_scope(), compare_versions
+                )
+                st.rerun()
 
     st.markdown("---")
+
+    if st.session_state.get('active_jobs'):
+        render_active_jobs()
     
     if st.session_state.get('comparison_analysis'):
         st.subheader("Dashboard Comparison Analysis")
+        comparison_diff = st.session_state.get('comparison_diff')
+        if comparison_diff:
+            st.image(comparison_diff['heatmap'], caption="Changed regions between the two versions")
+            with st.expander("Before / after of each changed region", expanded=False):
+                for number, (before_crop, after_crop) in enumerate(comparison_diff['crops'], start=1):
+                    before_col, after_col = st.columns(2)
+                    before_col.image(before_crop, caption=f"Region {number} · before")
+                    after_col.image(after_crop, caption=f"Region {number} · after")
         st.write(st.session_state.comparison_analysis)
         
-        pdf_bytes = generate_pdf_report(
-            "Dashboard Comparison Analysis", 
-            st.session_state.comparison_analysis, 
-            "dashboard_comparison_report.pdf"
-        )
-        st.download_button(
-            label="Download Comparison PDF Report",
-            data=pdf_bytes,
-            file_name="dashboard_comparison_report.pdf",
-            mime="application/pdf"
+        comparison_images = get_comparison_report_images()
+        if not st.session_state.get('comparison_report_hash'):
+            st.session_state.comparison_report_hash = report_content_hash(
+                "Dashboard Comparison Analysis",
+                st.session_state.comparison_analysis,
+                [image_content_hash(image) for image, _ in comparison_images]
+            )
+        render_pdf_download(
+            "Download Comparison PDF Report",
+            st.session_state.comparison_report_hash,
+            "Dashboard Comparison Analysis",
+            st.session_state.comparison_analysis,
+            "dashboard_comparison_report.pdf",
+            "dashboard_comparison_report.pdf",
+            comparison_images
         )
         
     elif context_manager.has_active_session():
@@ -201,16 +558,24 @@ def main():
                 st.markdown("### Analysis:")
                 st.write(session_data['analysis'])
 
-                pdf_bytes = generate_pdf_report(session_data['objective'], session_data['analysis'], session_data['filename'])
-                st.download_button(
-                    label="Download PDF Report",
-                    data=pdf_bytes,
-                    file_name=f"{session_data['filename'].split('.')[0]}_report.pdf",
-                    mime="application/pdf"
+                render_pdf_download(
+                    "Download PDF Report",
+                    session_data['report_hash'],
+                    session_data['objective'],
+                    session_data['analysis'],
+                    session_data['filename'],
+                    f"{session_data['filename'].split('.')[0]}_report.pdf",
+                    [(session_data['image_pil'], session_data['filename'])]
                 )
 
+            render_kpi_trends(session_data["image_pil"], st.session_state.get('snapshot_scope'))
+            render_library_matches(session_data["image_pil"])
+
             st.info("Start a conversation about your dashboard!")
 
+    if os.getenv("SHOW_PERFORMANCE_PANEL", "").lower() in ("1", "true", "yes"):
+        render_performance_panel()
+
     if context_manager.has_active_session() or st.session_state.get('comparison_analysis'):
         for message in context_manager.get_chat_history():
             with st.chat_message(message["role"]):
@@ -219,7 +584,8 @@ def main():
         user_input = st.chat_input("Ask about your dashboard...")
         
         if user_input:
-            handle_chat_message(user_input)
+            with start_span("chat", owner=get_job_owner(), message_chars=len(user_input)):
+                handle_chat_message(user_input)
 
 def handle_chat_message(user_message: str):
     if not context_manager.has_active_session() and not st.session_state.get('comparison_analysis'):
@@ -228,6 +594,14 @@ def handle_chat_message(user_message: str):
     
     try:
         context_manager.add_chat_message("user", user_message)
+
+        if not st.session_state.get('comparison_analysis'):
+            # Simple numeric lookups are answered from the extracted KPI table.
+            local_answer = answer_kpi_question(user_message, context_manager.get_session_kpis())
+            if local_answer:
+                current_span().set("source", "kpi_table")
+                context_manager.add_chat_message("assistant", local_answer)
+                st.rerun()
         
         with st.spinner("Getting response..."):
             if st.session_state.get('comparison_analysis'):
@@ -253,6 +627,7 @@ def handle_chat_message(user_message: str):
                     ollama_model_name = os.getenv("OLLAMA_MODEL_NAME", "qwen2.5vl:7b")
                     ai_response = ollama_chat_inference(ollama_model_name, chat_prompt)
             
+            current_span().set("source", "model")
             if ai_response:
                 context_manager.add_chat_message("assistant", ai_response)
                 st.rerun()
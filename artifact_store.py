@@ -0,0 +1,131 @@
+"""
+Artifact Store Module
+
+This module keeps generated files (PDF reports) on disk, keyed by content
+hash, so sessions can reference a file instead of holding its bytes in memory.
+"""
+
+import os
+import tempfile
+import threading
+
+
+DEFAULT_ARTIFACT_DIR = os.path.join(tempfile.gettempdir(), "kpi_dashboard_artifacts")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+
+class ArtifactStore:
+    """Directory of content-addressed files with least-recently-used size eviction."""
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or os.getenv("ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR)
+        self.max_bytes = max_bytes or int(os.getenv("ARTIFACT_MAX_BYTES", DEFAULT_MAX_BYTES))
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, key, suffix=".pdf"):
+        """Return the path an artifact is (or would be) stored at."""
+        return os.path.join(self.root, f"{key}{suffix}")
+
+    def exists(self, key, suffix=".pdf"):
+        """Check whether an artifact has been written."""
+        return os.path.exists(self.path_for(key, suffix))
+
+    def write(self, key, write_fn, suffix=".pdf"):
+        """
+        Write an artifact atomically.
+
+        Args:
+            key: Content hash identifying the artifact
+            write_fn: Callable that writes the artifact to the temporary path it is given
+            suffix: File extension of the artifact
+
+        Returns:
+            str: Path of the stored artifact
+        """
+        path = self.path_for(key, suffix)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            write_fn(temp_path)
+            # Readers in other sessions or processes only ever see a complete file.
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._enforce_limit()
+        return path
+
+    def iter_chunks(self, key, suffix=".pdf", chunk_size=CHUNK_SIZE):
+        """
+        Stream an artifact in chunks, e.g. for a chunked HTTP response.
+
+        Args:
+            key: Content hash identifying the artifact
+            suffix: File extension of the artifact
+            chunk_size: Maximum bytes per chunk
+
+        Yields:
+            bytes: Consecutive chunks of the file
+        """
+        path = self.path_for(key, suffix)
+        self._touch(path)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def read(self, key, suffix=".pdf"):
+        """Read a whole artifact into memory."""
+        path = self.path_for(key, suffix)
+        self._touch(path)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _enforce_limit(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def get_artifact_store():
+    """
+    Get the process-wide artifact store.
+
+    Returns:
+        ArtifactStore: Store rooted at ARTIFACT_DIR
+    """
+    global _artifact_store
+    if _artifact_store is None:
+        with _artifact_store_lock:
+            if _artifact_store is None:
+                _artifact_store = ArtifactStore()
+    return _artifact_store
@@ -0,0 +1,378 @@
+"""
+Benchmark Module
+
+This module benchmarks the model pipelines offline. It starts the fake model
+server, points the app's Ollama or Gemini client at it, and drives dashboard
+validation, similarity detection, the comparison workflow, chat and PDF
+rendering over a corpus of synthetic dashboards. Each scenario reports
+throughput, p50/p95/p99 latency, error rate and peak traced memory, and a run
+can be saved as a baseline and later runs compared against it.
+
+Usage:
+    python benchmark.py --operations 20 --concurrency 4 --save-baseline bench_baseline.json
+    python benchmark.py --operations 20 --concurrency 4 --baseline bench_baseline.json
+    python benchmark.py --record-cassette bench.jsonl
+    python benchmark.py --replay-cassette bench.jsonl --save-baseline bench_pipeline.json
+
+Replaying a cassette removes the model from the measurement, leaving prompt
+construction, parsing, comparison and PDF rendering.
+
+The exit status is 1 when a scenario regressed beyond --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_model_server import (
+    ServerBehavior, add_behavior_arguments, behavior_from_arguments, build_reply, start_fake_server
+)
+from synthetic_dashboards import make_dashboard
+
+
+SCENARIOS = ("validation", "similarity", "comparison", "version_comparison", "chat", "pdf")
+MODEL_CHOICES = {"ollama": "Ollama (Local)", "gemini": "Gemini (Online)"}
+OBJECTIVE = "Track quarterly revenue, churn and user growth against targets."
+CHAT_MESSAGES = [
+    "Which metric moved the most this quarter?",
+    "What should we do about churn?",
+    "Summarize the risks in two sentences.",
+]
+
+
+def configure_environment(server_url, work_dir, cassette_mode="off", cassette_path=None):
+    """
+    Point both model backends at the fake server and the app at empty stores in work_dir.
+
+    Must run before the pipeline modules are imported, since some of them read
+    their settings at import time. Fresh stores keep cached analyses, snapshots
+    and library entries from hiding the work being measured.
+    """
+    os.environ.update({
+        "ANALYSIS_CACHE_PATH": os.path.join(work_dir, "analysis_cache.sqlite3"),
+        "SNAPSHOT_DB_PATH": os.path.join(work_dir, "snapshots.sqlite3"),
+        "DASHBOARD_LIBRARY_PATH": os.path.join(work_dir, "library.sqlite3"),
+        "ARTIFACT_DIR": os.path.join(work_dir, "artifacts"),
+        "TRACE_PATH": os.path.join(work_dir, "traces.jsonl"),
+        "LLM_CASSETTE_MODE": cassette_mode,
+    })
+    if cassette_path:
+        os.environ["LLM_CASSETTE_PATH"] = os.path.abspath(cassette_path)
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    os.environ["GEMINI_API_ENDPOINT"] = server_url
+    os.environ["OLLAMA_API_URL"] = server_url
+    os.environ["OLLAMA_MODEL_NAME"] = os.getenv("OLLAMA_MODEL_NAME") or "benchmark"
+
+
+def _complete(model_choice, prompt):
+    from llm_service import gemini_chat_inference, ollama_chat_inference
+
+    if model_choice == "Gemini (Online)":
+        return gemini_chat_inference(prompt)
+    return ollama_chat_inference(os.getenv("OLLAMA_MODEL_NAME"), prompt)
+
+
+def build_operation(scenario, model_choice, size):
+    """
+    Build the callable for one scenario.
+
+    Every operation uses dashboards no other operation uses, so neither the
+    analysis cache nor in-flight call sharing serves it from earlier work.
+
+    Args:
+        scenario: One of SCENARIOS
+        model_choice: "Gemini (Online)" or "Ollama (Local)"
+        size: Dashboard size in pixels
+
+    Returns:
+        callable: operation(index) -> result; a falsy result counts as an error
+    """
+    if scenario == "validation":
+        from dashboard_validator import validate_dashboard_image
+
+        return lambda index: validate_dashboard_image(make_dashboard(index, size=size), model_choice)
+
+    if scenario == "similarity":
+        from dashboard_similarity import detect_dashboard_similarity
+
+        def similarity(index):
+            result = detect_dashboard_similarity(
+                make_dashboard(2 * index, size=size), make_dashboard(2 * index + 1, size=size), model_choice
+            )
+            return result if "error" not in result.get("message", "").lower() else None
+        return similarity
+
+    if scenario in ("comparison", "version_comparison"):
+        from dashboard_pipeline import run_comparison_job
+        from job_queue import Job
+
+        def comparison(index):
+            if scenario == "comparison":
+                images = [make_dashboard(3 * index + offset, size=size) for offset in range(3)]
+            else:
+                images = [make_dashboard(index, size=size), make_dashboard(index, version=2, size=size)]
+            dashboards = [(image, f"dashboard_{position}.png", OBJECTIVE) for position, image in enumerate(images)]
+            result = run_comparison_job(Job("compare"), dashboards, model_choice, versions=scenario == "version_comparison")
+            return result if result.get("comparison") or result.get("skipped") else None
+        return comparison
+
+    if scenario == "chat":
+        from context_manager import build_chat_prompt
+
+        analysis = build_reply(OBJECTIVE, 1, ServerBehavior(), random.Random(0))
+
+        def chat(index):
+            history = [{"role": "user", "message": message} for message in CHAT_MESSAGES[:index % len(CHAT_MESSAGES)]]
+            message = f"{CHAT_MESSAGES[index % len(CHAT_MESSAGES)]} (question {index})"
+            return _complete(model_choice, build_chat_prompt(OBJECTIVE, analysis, history, message))
+        return chat
+
+    if scenario == "pdf":
+        from io import BytesIO
+        from pdf_generator import create_pdf_report
+
+        def pdf(index):
+            analysis = build_reply(OBJECTIVE, 1, ServerBehavior(analysis_words=1200), random.Random(index))
+            images = [(make_dashboard(index, size=size), "Dashboard")]
+            output = create_pdf_report(OBJECTIVE, analysis, f"dashboard_{index}.png", output=BytesIO(), images=images)
+            return output.getbuffer().nbytes
+        return pdf
+
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+
+def _run_one(operation, index):
+    from job_queue import Job, bind_job
+
+    # Bound so messages the pipeline raises via notify() are collected instead
+    # of going to a Streamlit page that does not exist here.
+    job = Job("benchmark")
+    bind_job(job)
+    start = time.perf_counter()
+    try:
+        ok = bool(operation(index))
+        error = None if ok else next((message for level, message in job.messages if level == "error"), "empty result")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        bind_job(None)
+    return time.perf_counter() - start, error
+
+
+def _run_batch(operation, indices, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(lambda index: _run_one(operation, index), indices))
+
+
+def run_scenario(scenario, operation, operations, concurrency, warmup, offset):
+    """
+    Run one scenario and summarize it.
+
+    Latency and throughput come from one pass and peak memory from a second,
+    shorter pass of `concurrency` operations: tracemalloc slows allocation-heavy
+    work such as PDF rendering several times over, so it cannot run while
+    latency is measured.
+
+    Args:
+        scenario: Scenario name
+        operation: Callable from build_operation
+        operations: Number of measured operations
+        concurrency: Operations in flight at once
+        warmup: Unmeasured operations run first
+        offset: First operation index, so scenarios never share dashboards
+
+    Returns:
+        dict: Throughput, latency percentiles (ms), error rate and peak memory (MB)
+    """
+    for index in range(warmup):
+        _run_one(operation, offset + operations + index)
+
+    start = time.perf_counter()
+    outcomes = _run_batch(operation, range(offset, offset + operations), concurrency)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    memory_start = offset + operations + warmup
+    _run_batch(operation, range(memory_start, memory_start + concurrency), concurrency)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = [latency * 1000 for latency, error in outcomes if error is None]
+    errors = [error for _, error in outcomes if error is not None]
+    return {
+        "scenario": scenario,
+        "operations": operations,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ops": round(operations / elapsed, 3) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+        "error_rate": round(len(errors) / operations, 4) if operations else 0.0,
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        "sample_errors": sorted(set(errors))[:3],
+    }
+
+
+# (metric, direction): +1 when larger is worse, -1 when smaller is worse.
+COMPARED_METRICS = [("p50_ms", 1), ("p95_ms", 1), ("p99_ms", 1), ("throughput_ops", -1), ("peak_memory_mb", 1)]
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compare a run with a baseline run.
+
+    Args:
+        results: {scenario: summary} of this run
+        baseline: {scenario: summary} of the baseline run
+        tolerance: Allowed relative change before a metric counts as regressed
+
+    Returns:
+        list: [{'scenario', 'metric', 'baseline', 'current', 'change', 'regressed'}, ...]
+    """
+    rows = []
+    for scenario, summary in results.items():
+        previous = baseline.get(scenario)
+        if not previous:
+            continue
+        for metric, direction in COMPARED_METRICS:
+            before, after = previous.get(metric), summary.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            rows.append({
+                "scenario": scenario,
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "change": round(change, 4),
+                "regressed": direction * change > tolerance,
+            })
+        if summary["error_rate"] > previous.get("error_rate", 0.0):
+            rows.append({
+                "scenario": scenario,
+                "metric": "error_rate",
+                "baseline": previous.get("error_rate", 0.0),
+                "current": summary["error_rate"],
+                "change": None,
+                "regressed": True,
+            })
+    return rows
+
+
+def print_results(results):
+    header = f"{'scenario':<20}{'ops/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}{'peak MB':>10}"
+    print(header)
+    print("-" * len(header))
+    for summary in results.values():
+        print(
+            f"{summary['scenario']:<20}{summary['throughput_ops']:>9.2f}{summary['p50_ms']:>10.1f}"
+            f"{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}{summary['error_rate']:>8.1%}"
+            f"{summary['peak_memory_mb']:>10.2f}"
+        )
+        for error in summary["sample_errors"]:
+            print(f"    {error[:100]}")
+
+
+def print_comparison(rows, tolerance):
+    print(f"\nAgainst baseline (tolerance {tolerance:.0%}):")
+    for row in rows:
+        change = "" if row["change"] is None else f"{row['change']:+.1%}"
+        flag = "REGRESSED" if row["regressed"] else "ok"
+        print(f"  {row['scenario']:<20}{row['metric']:<16}{row['baseline']:>10}{row['current']:>10}{change:>9}  {flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the model pipelines against a fake model server.")
+    parser.add_argument("--backend", choices=sorted(MODEL_CHOICES), default="ollama")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--operations", type=int, default=20, help="Measured operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured operations per scenario")
+    parser.add_argument("--image-size", default="1280x800", help="Synthetic dashboard size, WIDTHxHEIGHT")
+    parser.add_argument("--output", help="Write the run as JSON")
+    parser.add_argument("--save-baseline", help="Write the run as the new baseline")
+    parser.add_argument("--baseline", help="Compare the run with this baseline")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record-cassette", help="Record the model responses of this run to a cassette")
+    cassette.add_argument("--replay-cassette", help="Answer model calls from a cassette recorded with the same options")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative change (default 0.10)")
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = sorted(set(scenarios) - set(SCENARIOS))
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    size = tuple(int(side) for side in args.image_size.lower().split("x"))
+
+    behavior = behavior_from_arguments(args)
+    server = start_fake_server(behavior)
+    work_dir = tempfile.mkdtemp(prefix="kpi_benchmark_")
+    if args.record_cassette:
+        configure_environment(server.url, work_dir, "record", args.record_cassette)
+    elif args.replay_cassette:
+        configure_environment(server.url, work_dir, "replay", args.replay_cassette)
+    else:
+        configure_environment(server.url, work_dir)
+    model_choice = MODEL_CHOICES[args.backend]
+
+    results = {}
+    try:
+        for position, scenario in enumerate(scenarios):
+            operation = build_operation(scenario, model_choice, size)
+            # Spread indices so no two scenarios draw the same dashboards.
+            offset = (position + 1) * 1_000_000
+            results[scenario] = run_scenario(scenario, operation, args.operations, args.concurrency, args.warmup, offset)
+            print(f"{scenario}: done", file=sys.stderr)
+    finally:
+        server.shutdown()
+
+    run = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "server": vars(behavior),
+        "cassette": "replay" if args.replay_cassette else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "requests_served": server.stats(),
+        "scenarios": results,
+    }
+    print_results(results)
+    print(f"\nProcess max RSS: {run['max_rss_mb']} MB; fake server: {run['requests_served']}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as output:
+                json.dump(run, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        for key in ("backend", "server", "cassette"):
+            if baseline.get(key) != run[key]:
+                print(f"\nWarning: the baseline was recorded with a different {key} setting: {baseline.get(key)}")
+        rows = compare_to_baseline(results, baseline.get("scenarios", {}), args.tolerance)
+        print_comparison(rows, args.tolerance)
+        if any(row["regressed"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
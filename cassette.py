@@ -0,0 +1,159 @@
+"""
+Cassette Module
+
+This module records model responses to a cassette file and replays them, so
+the pipelines around the models (prompt construction, parsing, comparison,
+PDF rendering) can be re-run deterministically and profiled without a model
+backend. Each recorded call is one JSON line keyed by the request fingerprint
+(backend, model, prompt and image content hashes); prompts and images
+themselves are not stored.
+
+Modes (LLM_CASSETTE_MODE):
+    off     Call the backends as usual (default)
+    record  Call the backends and append every response to the cassette
+    replay  Answer every call from the cassette; unrecorded requests fail
+
+Replay latency (LLM_CASSETTE_LATENCY):
+    none      Return immediately (default)
+    recorded  Wait as long as the recorded call took
+    <seconds> Wait a fixed time per call
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+MODES = (OFF, RECORD, REPLAY)
+
+DEFAULT_CASSETTE_PATH = os.path.join(tempfile.gettempdir(), "kpi_dashboard_llm_cassette.jsonl")
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode for a request the cassette has no response for."""
+
+
+class Cassette:
+    """Recorded model responses, keyed by request fingerprint."""
+
+    def __init__(self, path=None, mode=None, latency=None):
+        self.path = path or os.getenv("LLM_CASSETTE_PATH", DEFAULT_CASSETTE_PATH)
+        self.mode = (mode or os.getenv("LLM_CASSETTE_MODE", OFF)).lower()
+        if self.mode not in MODES:
+            raise ValueError(f"LLM_CASSETTE_MODE must be one of {', '.join(MODES)}, not {self.mode!r}")
+        self.latency = (latency or os.getenv("LLM_CASSETTE_LATENCY", "none")).lower()
+        # Responses per key in recording order; the nth replay of a key gets
+        # the nth recorded response, and the last one once they run out.
+        self._entries = {}
+        self._replayed = {}
+        self._lock = threading.Lock()
+        if self.mode == REPLAY:
+            self._load()
+
+    @property
+    def recording(self):
+        return self.mode == RECORD
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as cassette_file:
+                for line in cassette_file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+        except FileNotFoundError:
+            pass
+
+    def record(self, key, backend, model, task, response, elapsed):
+        """
+        Append a response to the cassette.
+
+        Args:
+            key: Request fingerprint
+            backend: "gemini" or "ollama"
+            model: Model the call went to
+            task: Task label of the call
+            response: Response text
+            elapsed: Seconds the call took
+        """
+        entry = {
+            "key": key,
+            "backend": backend,
+            "model": model,
+            "task": task,
+            "latency_ms": round(elapsed * 1000, 1),
+            "response": response,
+        }
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            with open(self.path, "a", encoding="utf-8") as cassette_file:
+                cassette_file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    def replay(self, key):
+        """
+        Return the recorded response for a request, after the configured latency.
+
+        Args:
+            key: Request fingerprint
+
+        Returns:
+            str: Recorded response text
+
+        Raises:
+            CassetteMissError: If the request was never recorded
+        """
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMissError(f"No recorded response for this request in {self.path}.")
+            position = self._replayed.get(key, 0)
+            self._replayed[key] = position + 1
+            entry = entries[min(position, len(entries) - 1)]
+
+        if self.latency == "recorded":
+            time.sleep(entry["latency_ms"] / 1000)
+        elif self.latency not in ("none", "0", ""):
+            time.sleep(float(self.latency))
+        return entry["response"]
+
+    def status(self):
+        """
+        Describe the cassette for the UI.
+
+        Returns:
+            dict: {'mode', 'path', 'requests', 'responses'}
+        """
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": self.path,
+                "requests": len(self._entries),
+                "responses": sum(len(entries) for entries in self._entries.values()),
+            }
+
+
+def get_cassette():
+    """
+    Get the process-wide cassette.
+
+    Returns:
+        Cassette: Cassette configured from LLM_CASSETTE_MODE, LLM_CASSETTE_PATH and LLM_CASSETTE_LATENCY
+    """
+    global _cassette
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette()
+    return _cassette
@@ -0,0 +1,136 @@
+"""
+Circuit Breaker Module
+
+This module keeps one circuit breaker per model backend. After repeated
+failures or timeouts a breaker opens and calls to that backend fail fast
+instead of tying up a session or worker until their deadline. Once the reset
+timeout has passed, a single probe call is let through (half-open); its
+outcome closes the breaker again or keeps it open.
+"""
+
+import os
+import threading
+import time
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker counting consecutive failures."""
+
+    def __init__(self, name, failure_threshold=None, reset_seconds=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or int(os.getenv("BREAKER_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD))
+        self.reset_seconds = reset_seconds or float(os.getenv("BREAKER_RESET_SECONDS", DEFAULT_RESET_SECONDS))
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._last_error = None
+        self._lock = threading.Lock()
+
+    def _before_call(self):
+        with self._lock:
+            if self._state == OPEN and time.time() - self._opened_at >= self.reset_seconds:
+                self._state = HALF_OPEN
+            if self._state == OPEN or (self._state == HALF_OPEN and self._probing):
+                retry_in = max(0.0, self.reset_seconds - (time.time() - self._opened_at))
+                raise CircuitOpenError(
+                    f"{self.name} is unavailable after repeated failures; retrying in {retry_in:.0f}s."
+                )
+            if self._state == HALF_OPEN:
+                self._probing = True
+
+    def _record(self, error):
+        with self._lock:
+            self._probing = False
+            if error is None:
+                self._state = CLOSED
+                self._failures = 0
+                return
+            self._failures += 1
+            self._last_error = f"{type(error).__name__}: {error}"
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.time()
+
+    def call(self, function):
+        """
+        Call a backend through the breaker.
+
+        Args:
+            function: Callable with no arguments performing the request
+
+        Returns:
+            The function's result
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with a probe in flight
+            Exception: Whatever the function raised, after counting it as a failure
+        """
+        self._before_call()
+        try:
+            result = function()
+        except Exception as e:
+            self._record(e)
+            raise
+        self._record(None)
+        return result
+
+    def status(self):
+        """
+        Describe the breaker for the UI.
+
+        Returns:
+            dict: {'name', 'state', 'failures', 'retry_in', 'last_error'}
+        """
+        with self._lock:
+            state = self._state
+            retry_in = 0.0
+            if state == OPEN:
+                retry_in = max(0.0, self.reset_seconds - (time.time() - self._opened_at))
+                if retry_in == 0.0:
+                    state = HALF_OPEN
+            return {
+                "name": self.name,
+                "state": state,
+                "failures": self._failures,
+                "retry_in": retry_in,
+                "last_error": self._last_error,
+            }
+
+
+def get_circuit_breaker(name):
+    """
+    Get the process-wide breaker of a backend.
+
+    Args:
+        name: Backend name ("Gemini", "Ollama")
+
+    Returns:
+        CircuitBreaker: Breaker shared by every session and job in this process
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def get_breaker_statuses():
+    """Return the status of every backend breaker created so far, by name."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.status() for breaker in breakers}
@@ -0,0 +1,206 @@
+"""
+Comparison Pipeline Module
+
+This module compares any number of dashboards. Near-duplicate uploads are
+dropped with a multi-index perceptual-hash table instead of pairwise model
+calls, the per-dashboard work runs concurrently, and the comparison is built by
+hierarchical map-reduce: groups of at most COMPARISON_FAN_IN analyses are
+summarized, then groups of summaries, until one prompt writes the final report.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from dashboard_library import MultiIndexHashTable
+from image_fingerprint import perceptual_hash
+from job_queue import bind_job, current_job
+from tracing import bind_span, current_span
+from region_diff import images_match
+from utils import image_content_hash
+
+
+MAX_COMPARISON_DASHBOARDS = int(os.getenv("MAX_COMPARISON_DASHBOARDS", 16))
+COMPARISON_FAN_IN = max(2, int(os.getenv("COMPARISON_FAN_IN", 4)))
+COMPARISON_WORKERS = int(os.getenv("COMPARISON_WORKERS", 4))
+
+# Uploads whose hashes differ in at most this many bits are treated as duplicates.
+DUPLICATE_HASH_DISTANCE = 3
+
+
+def find_duplicate_dashboards(images):
+    """
+    Find uploads that are the same dashboard as an earlier upload.
+
+    Args:
+        images: List of PIL Image objects
+
+    Returns:
+        dict: {index: index of the earlier upload it duplicates}
+    """
+    duplicates = {}
+    by_content = {}
+    index = MultiIndexHashTable()
+
+    for position, image in enumerate(images):
+        content_hash = image_content_hash(image)
+        if content_hash in by_content:
+            duplicates[position] = by_content[content_hash]
+            continue
+
+        value = perceptual_hash(image)
+        # Dashboards built from one template share a perceptual hash, so a hash
+        # match is only a duplicate if a local diff finds no changed region.
+        matches = [
+            original for _, original in index.search(value, DUPLICATE_HASH_DISTANCE)
+            if images_match(images[original], image)
+        ]
+        if matches:
+            duplicates[position] = min(matches)
+            continue
+
+        by_content[content_hash] = position
+        index.add(value, position)
+
+    return duplicates
+
+
+def run_concurrently(function, items, max_workers=None):
+    """
+    Apply a function to every item on a thread pool, keeping the input order.
+
+    Worker threads are attached to the calling Streamlit script run, job and
+    trace span, so messages and spans raised inside the function still reach
+    the page and the caller's trace.
+
+    Args:
+        function: Callable taking one item
+        items: List of items
+        max_workers: Optional pool size (default COMPARISON_WORKERS)
+
+    Returns:
+        list: Results in the same order as items
+    """
+    if len(items) <= 1:
+        return [function(item) for item in items]
+
+    # Job workers and the API server have no script context; that is expected.
+    ctx = get_script_run_ctx(suppress_warning=True)
+    job = current_job()
+    span = current_span()
+
+    def attach():
+        if ctx:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        bind_job(job)
+        bind_span(span)
+
+    with ThreadPoolExecutor(
+        max_workers=min(len(items), max_workers or COMPARISON_WORKERS),
+        thread_name_prefix="comparison",
+        initializer=attach
+    ) as executor:
+        return list(executor.map(function, items))
+
+
+def build_comparison_entries(dashboards, analyses):
+    """
+    Pair the compared dashboards with their analyses for reduce_comparison().
+
+    Args:
+        dashboards: [(image, filename, objective), ...] in display order
+        analyses: Per-dashboard analyses, in the same order
+
+    Returns:
+        list: [{'label', 'objective', 'analysis'}, ...]
+    """
+    return [
+        {"label": f"Dashboard {number} ({filename})", "objective": objective, "analysis": analysis}
+        for number, ((_, filename, objective), analysis) in enumerate(zip(dashboards, analyses), start=1)
+    ]
+
+
+def build_comparison_prompt(entries, final=True):
+    """
+    Build the prompt comparing one group of dashboards or group summaries.
+
+    Args:
+        entries: List of {'label': str, 'objective': str, 'analysis': str}
+        final: True for the prompt that writes the report shown to the user,
+               False for an intermediate summary consumed by the next level
+
+    Returns:
+        str: Prompt for a text-only model call
+    """
+    sections = "\n".join(
+        f"""
+            {entry['label']} Context:
+            - Objective: {entry['objective']}
+            - Analysis: {entry['analysis']}
+        """
+        for entry in entries
+    )
+
+    if final:
+        task = (
+            f"Task: Provide a detailed comparison of the {len(entries)} items above. Highlight key differences, "
+            "similarities, performance shifts, standout and lagging dashboards, and potential strategic insights. "
+            "Format the response clearly with headings."
+        )
+    else:
+        task = (
+            "Task: Write a compact comparison summary of the dashboards above for a later comparison step. "
+            "Name every dashboard, keep each one's key KPI values and objective, and state how they differ "
+            "and which stand out. Use short bullet points and no introduction."
+        )
+
+    return f"""
+            You are an expert at comparing KPI dashboards.
+            {sections}
+            {task}
+        """
+
+
+def reduce_comparison(entries, complete, fan_in=None, max_workers=None):
+    """
+    Compare dashboards by hierarchical map-reduce over their analyses.
+
+    Args:
+        entries: List of {'label': str, 'objective': str, 'analysis': str}
+        complete: Callable taking a prompt and returning the model's text (or None)
+        fan_in: Maximum entries per prompt (default COMPARISON_FAN_IN)
+        max_workers: Optional number of group prompts run at once
+
+    Returns:
+        str or None: The final comparison, or None if any model call failed
+    """
+    fan_in = max(2, fan_in or COMPARISON_FAN_IN)
+    level = 1
+
+    while len(entries) > fan_in:
+        groups = [entries[start:start + fan_in] for start in range(0, len(entries), fan_in)]
+
+        def summarize(group):
+            if len(group) == 1:
+                return group[0]["analysis"]
+            return complete(build_comparison_prompt(group, final=False))
+
+        summaries = run_concurrently(summarize, groups, max_workers)
+        if not all(summaries):
+            return None
+
+        next_entries = []
+        for number, (group, summary) in enumerate(zip(groups, summaries), start=1):
+            members = [member for entry in group for member in entry.get("members", [entry["label"]])]
+            next_entries.append({
+                "label": f"Group {level}.{number} (covering {', '.join(members)})",
+                "objective": "; ".join(dict.fromkeys(entry["objective"] for entry in group)),
+                "analysis": summary,
+                "members": members,
+            })
+        entries = next_entries
+        level += 1
+
+    return complete(build_comparison_prompt(entries, final=True))
@@ -2,7 +2,10 @@ import streamlit as st
 from datetime import datetime
 from typing import Dict, List, Optional
 from PIL import Image
-from utils import image_to_base64
+from utils import image_to_base64, image_content_hash
+from report_jobs import report_content_hash
+from shared_cache import normalize_objective
+from job_queue import notify
 
 class DashboardContextManager:
     """Minimal context manager for dashboard sessions and chat functionality."""
@@ -12,33 +15,59 @@ class DashboardContextManager:
     
     def _init_session_state(self):
         """Initialize basic session state structure for comparison mode."""
-        if 'dashboard_one' not in st.session_state:
-            st.session_state.dashboard_one = None
-        if 'dashboard_two' not in st.session_state:
-            st.session_state.dashboard_two = None
+        if 'comparison_dashboards' not in st.session_state:
+            st.session_state.comparison_dashboards = []
         if 'comparison_analysis' not in st.session_state:
             st.session_state.comparison_analysis = None
+        if 'comparison_report_hash' not in st.session_state:
+            st.session_state.comparison_report_hash = None
         if 'chat_history' not in st.session_state:
             st.session_state.chat_history = []
         if 'current_session' not in st.session_state:
             st.session_state.current_session = None
+        if 'analysis_index' not in st.session_state:
+            st.session_state.analysis_index = {}
 
-    def create_session(self, dashboard_key, image, filename, objective, analysis, model_used):
-        """Create a new session for a specific dashboard."""
+    def _analysis_key(self, image, objective, model_id):
+        return (image_content_hash(image), normalize_objective(objective), model_id)
+
+    def record_analysis(self, image, objective, model_id, analysis):
+        """Index a completed analysis by (image hash, objective, model) for reuse."""
+        if analysis:
+            st.session_state.analysis_index[self._analysis_key(image, objective, model_id)] = analysis
+
+    def get_indexed_analysis(self, image, objective, model_id) -> Optional[str]:
+        """Get a previously completed analysis of this image, objective and model."""
+        return st.session_state.analysis_index.get(self._analysis_key(image, objective, model_id))
+
+    def _build_session_data(self, image, filename, objective, analysis, model_used, kpis=None):
         try:
             image_base64 = image_to_base64(image)
-            if not image_base64:
-                return False
+        except Exception as e:
+            notify("error", f"Error processing image: {e}")
+            return None
+
+        return {
+            "image_base64": image_base64,
+            "image_pil": image,
+            "filename": filename,
+            "objective": objective,
+            "analysis": analysis,
+            "model_used": model_used,
+            "kpis": kpis or [],
+            "report_hash": report_content_hash(objective, analysis, [image_content_hash(image)]) if analysis else None,
+            "created_at": datetime.now()
+        }
+
+    def create_session(self, dashboard_key, image, filename, objective, analysis, model_used, kpis=None, model_id=None):
+        """Create a new session for a specific dashboard."""
+        try:
+            if model_id:
+                self.record_analysis(image, objective, model_id, analysis)
 
-            session_data = {
-                "image_base64": image_base64,
-                "image_pil": image,
-                "filename": filename,
-                "objective": objective,
-                "analysis": analysis,
-                "model_used": model_used,
-                "created_at": datetime.now()
-            }
+            session_data = self._build_session_data(image, filename, objective, analysis, model_used, kpis)
+            if not session_data:
+                return False
             st.session_state[dashboard_key] = session_data
             st.session_state.current_session = dashboard_key 
             return True
@@ -46,28 +75,56 @@ class DashboardContextManager:
             st.error(f"Error creating session: {e}")
             return False
 
-    def get_comparison_context(self):
-        """Prepare a combined context for LLM comparison."""
-        dash1 = st.session_state.dashboard_one
-        dash2 = st.session_state.dashboard_two
-        
-        if not dash1 or not dash2:
-            return None
-        
-        prompt = f"""
-            You are an expert at comparing KPI dashboards.
-            
-            Dashboard 1 Context:
-            - Objective: {dash1['objective']}
-            - Initial Analysis: {dash1['analysis']}
-            
-            Dashboard 2 Context:
-            - Objective: {dash2['objective']}
-            - Initial Analysis: {dash2['analysis']}
-            
-            Task: Provide a detailed comparison of the two dashboards. Highlight key differences, similarities, performance shifts, and potential strategic insights. Format the response clearly with headings.
+    def set_comparison_dashboards(self, dashboards, model_used, analyses=None):
+        """
+        Store the sessions of the dashboards being compared.
+
+        Args:
+            dashboards: [(image, filename, objective), ...] in display order
+            model_used: Backend name stored on the sessions ("gemini" or "ollama")
+            analyses: Optional per-dashboard analyses, in the same order
+
+        Returns:
+            bool: True if every session was created
         """
-        return prompt
+        sessions = []
+        for (image, filename, objective), analysis in zip(dashboards, analyses or [None] * len(dashboards)):
+            session_data = self._build_session_data(image, filename, objective, analysis, model_used)
+            if not session_data:
+                return False
+            sessions.append(session_data)
+        st.session_state.comparison_dashboards = sessions
+        return True
+
+    def get_indexed_analyses(self, dashboards, model_id) -> List[Optional[str]]:
+        """
+        Look up the indexed analysis of each dashboard to be compared.
+
+        Args:
+            dashboards: [(image, filename, objective), ...] in display order
+            model_id: Backend-qualified model name the analyses are indexed under
+
+        Returns:
+            list: One analysis per dashboard, None where it was not analyzed yet
+        """
+        return [self.get_indexed_analysis(image, objective, model_id) for image, _, objective in dashboards]
+
+    def store_comparison_analyses(self, dashboards, model_used, model_id, analyses):
+        """
+        Keep the analyses of compared dashboards: index them for reuse and store their sessions.
+
+        Args:
+            dashboards: [(image, filename, objective), ...] in display order
+            model_used: Backend name stored on the sessions ("gemini" or "ollama")
+            model_id: Backend-qualified model name the analyses are indexed under
+            analyses: Per-dashboard analyses, in the same order
+
+        Returns:
+            bool: True if every session was created
+        """
+        for (image, _, objective), analysis in zip(dashboards, analyses):
+            self.record_analysis(image, objective, model_id, analysis)
+        return self.set_comparison_dashboards(dashboards, model_used, analyses)
 
     def get_session_data(self) -> Optional[Dict]:
         """Get the data for the current active session."""
@@ -79,6 +136,11 @@ class DashboardContextManager:
         """Check if there is an active session."""
         return st.session_state.current_session is not None and st.session_state[st.session_state.current_session] is not None
         
+    def get_session_kpis(self) -> List[Dict]:
+        """Get the extracted KPI table of the current active session."""
+        session = self.get_session_data()
+        return session.get("kpis", []) if session else []
+
     def add_chat_message(self, role: str, message: str):
         """Add a new message to the chat history."""
         st.session_state.chat_history.append({"role": role, "message": message})
@@ -97,25 +159,29 @@ class DashboardContextManager:
             return ""
         
         session = st.session_state[st.session_state.current_session]
+        return build_chat_prompt(session['objective'], session['analysis'], st.session_state.chat_history, user_message)
+
+
+def build_chat_prompt(objective: str, analysis: str, chat_history: List[Dict], user_message: str) -> str:
+    """Build the chat prompt for a dashboard from its analysis and recent messages."""
+    # Format recent chat history (last 5 exchanges to keep context manageable)
+    recent_chat = chat_history[-10:] if len(chat_history) > 10 else chat_history
+    chat_context = ""
+    if recent_chat:
+        chat_context = "Recent conversation:\\n"
+        for msg in recent_chat:
+            chat_context += f"{msg['role'].title()}: {msg['message']}\\n"
+    
+    prompt = f"""You are analyzing a KPI dashboard. Here's the context:
+
+        DASHBOARD OBJECTIVE: {objective}
+        
+        INITIAL ANALYSIS:
+        {analysis}
+        
+        {chat_context}
         
-        # Format recent chat history (last 5 exchanges to keep context manageable)
-        recent_chat = st.session_state.chat_history[-10:] if len(st.session_state.chat_history) > 10 else st.session_state.chat_history
-        chat_context = ""
-        if recent_chat:
-            chat_context = "Recent conversation:\\n"
-            for msg in recent_chat:
-                chat_context += f"{msg['role'].title()}: {msg['message']}\\n"
+        USER QUESTION: {user_message}
         
-        prompt = f"""You are analyzing a KPI dashboard. Here's the context:
-
-            DASHBOARD OBJECTIVE: {session['objective']}
-            
-            INITIAL ANALYSIS:
-            {session['analysis']}
-            
-            {chat_context}
-            
-            USER QUESTION: {user_message}
-            
-            Provide a helpful response focused on the dashboard analysis. Keep it concise and actionable."""
-        return prompt
+        Provide a helpful response focused on the dashboard analysis. Keep it concise and actionable."""
+    return prompt
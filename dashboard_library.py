@@ -0,0 +1,228 @@
+"""
+Dashboard Library Module
+
+This module keeps a persistent near-duplicate index over every dashboard the
+system has analyzed. Each upload is stored as a 64-bit perceptual hash in
+SQLite and loaded into an in-memory multi-index hash table, so a new upload is
+matched against tens of thousands of earlier ones without any model call.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from itertools import combinations
+
+from image_fingerprint import perceptual_hash, hamming_distance
+from shared_cache import get_shared_cache
+from utils import image_content_hash
+
+
+DEFAULT_LIBRARY_PATH = os.path.join(tempfile.gettempdir(), "kpi_dashboard_library.sqlite3")
+
+# Matches further apart than this are different dashboards, not versions. Up to
+# 7 bits the index enumerates at most 1 flipped bit per band, which keeps a
+# lookup well under a millisecond at tens of thousands of uploads.
+MAX_MATCH_DISTANCE = 7
+DEFAULT_MATCH_LIMIT = 5
+
+_dashboard_library = None
+_dashboard_library_lock = threading.Lock()
+
+
+class MultiIndexHashTable:
+    """
+    Multi-index hash table over 64-bit hashes under Hamming distance.
+
+    The hash is split into BANDS bands with one lookup table each. Two hashes
+    within distance r agree within r // BANDS bits on at least one band
+    (pigeonhole), so a search only enumerates that small neighbourhood of each
+    of the query's bands and verifies the candidates it finds.
+    """
+
+    BITS = 64
+    BANDS = 4
+
+    def __init__(self):
+        self._band_bits = self.BITS // self.BANDS
+        self._tables = [{} for _ in range(self.BANDS)]
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _bands(self, value):
+        mask = (1 << self._band_bits) - 1
+        return [(value >> (band * self._band_bits)) & mask for band in range(self.BANDS)]
+
+    def _neighbourhood(self, band_value, radius):
+        """Yield every band value within radius bits of band_value."""
+        for distance in range(radius + 1):
+            for positions in combinations(range(self._band_bits), distance):
+                flipped = band_value
+                for position in positions:
+                    flipped ^= 1 << position
+                yield flipped
+
+    def add(self, value, item):
+        """
+        Add an item under a hash.
+
+        Args:
+            value: Integer hash
+            item: Payload returned by search()
+        """
+        index = len(self._entries)
+        self._entries.append((value, item))
+        for table, band_value in zip(self._tables, self._bands(value)):
+            table.setdefault(band_value, []).append(index)
+
+    def search(self, value, max_distance):
+        """
+        Find every item whose hash is within max_distance of value.
+
+        Args:
+            value: Integer hash to match
+            max_distance: Maximum Hamming distance
+
+        Returns:
+            list: (distance, item) pairs, closest first
+        """
+        radius = max_distance // self.BANDS
+        candidates = set()
+        for table, band_value in zip(self._tables, self._bands(value)):
+            for neighbour in self._neighbourhood(band_value, radius):
+                candidates.update(table.get(neighbour, ()))
+
+        matches = []
+        for index in candidates:
+            entry_value, item = self._entries[index]
+            distance = hamming_distance(value, entry_value)
+            if distance <= max_distance:
+                matches.append((distance, item))
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class DashboardLibrary:
+    """SQLite-backed library of seen dashboards with an in-memory near-duplicate index."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("DASHBOARD_LIBRARY_PATH", DEFAULT_LIBRARY_PATH)
+        self._local = threading.local()
+        self._index = MultiIndexHashTable()
+        self._index_lock = threading.Lock()
+        self._loaded_id = 0
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS uploads (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                image_hash TEXT NOT NULL UNIQUE,
+                phash TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                upload_count INTEGER NOT NULL DEFAULT 1
+            )
+        """)
+
+    def _refresh(self):
+        """Load uploads added since the last refresh, including ones from other processes."""
+        with self._index_lock:
+            rows = self._connect().execute(
+                "SELECT id, image_hash, phash FROM uploads WHERE id > ? ORDER BY id",
+                (self._loaded_id,)
+            ).fetchall()
+            for row_id, image_hash, phash in rows:
+                self._index.add(int(phash, 16), image_hash)
+                self._loaded_id = row_id
+
+    def add(self, image, filename):
+        """
+        Record an upload in the library.
+
+        Args:
+            image: PIL Image object
+            filename: Name the dashboard was uploaded under
+        """
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO uploads (image_hash, phash, filename, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(image_hash) DO UPDATE SET last_seen = excluded.last_seen, upload_count = upload_count + 1",
+            (image_content_hash(image), f"{perceptual_hash(image):016x}", filename, now, now)
+        )
+        self._refresh()
+
+    def find_similar(self, image, max_distance=MAX_MATCH_DISTANCE, limit=DEFAULT_MATCH_LIMIT):
+        """
+        Find the nearest previously seen versions of a dashboard.
+
+        Args:
+            image: PIL Image object
+            max_distance: Maximum perceptual-hash distance in bits
+            limit: Maximum number of matches
+
+        Returns:
+            list: [{'image_hash', 'filename', 'distance', 'first_seen', 'last_seen',
+                    'upload_count', 'analyses'}, ...] closest first, excluding the
+                  image itself; 'analyses' lists its cached analyses
+        """
+        self._refresh()
+        image_hash = image_content_hash(image)
+        with self._index_lock:
+            matches = [
+                (distance, match_hash)
+                for distance, match_hash in self._index.search(perceptual_hash(image), max_distance)
+                if match_hash != image_hash
+            ][:limit]
+
+        conn = self._connect()
+        results = []
+        for distance, match_hash in matches:
+            row = conn.execute(
+                "SELECT filename, first_seen, last_seen, upload_count FROM uploads WHERE image_hash = ?",
+                (match_hash,)
+            ).fetchone()
+            if not row:
+                continue
+            results.append({
+                "image_hash": match_hash,
+                "filename": row[0],
+                "distance": distance,
+                "first_seen": row[1],
+                "last_seen": row[2],
+                "upload_count": row[3],
+                "analyses": get_shared_cache().find_by_image(match_hash),
+            })
+        return results
+
+    def __len__(self):
+        self._refresh()
+        return len(self._index)
+
+
+def get_dashboard_library():
+    """
+    Get the process-wide dashboard library.
+
+    Returns:
+        DashboardLibrary: Library shared by every Streamlit session in this process
+    """
+    global _dashboard_library
+    if _dashboard_library is None:
+        with _dashboard_library_lock:
+            if _dashboard_library is None:
+                _dashboard_library = DashboardLibrary()
+    return _dashboard_library
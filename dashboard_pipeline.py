@@ -0,0 +1,354 @@
+"""
+Dashboard Pipeline Module
+
+This module runs the dashboard pipelines shared by the Streamlit app and the
+API service: analyzing one dashboard (from the shared cache, a snapshot delta
+or a full model call), extracting its KPI table, recording it in the snapshot
+history and library, and comparing several dashboards. Both front ends queue
+these functions as jobs and only differ in how they present the results.
+"""
+
+import json
+import os
+
+from llm_service import (
+    gemini_inference, ollama_inference, gemini_chat_inference, ollama_chat_inference, get_model_identifier
+)
+from dashboard_validator import validate_dashboard_image, get_validation_error_message
+from plugin_registry import load_plugin
+from shared_cache import get_shared_cache
+from utils import image_content_hash
+from kpi_extraction import extract_kpis
+from snapshot_tracking import (
+    run_incremental_analysis, record_analysis_snapshot, get_snapshot_store,
+    compute_fingerprint, is_same_dashboard, MAX_CHANGED_FRACTION
+)
+from region_diff import diff_images, run_region_comparison, title_regions_match
+from dashboard_library import get_dashboard_library
+from comparison_pipeline import find_duplicate_dashboards, run_concurrently, build_comparison_entries, reduce_comparison
+from tracing import start_span
+from job_queue import notify, JobFailedError
+
+
+# Objective under which extracted KPI tables are stored in the shared cache.
+KPI_CACHE_OBJECTIVE = "__kpi_extraction__"
+
+# Where an analysis came from.
+SOURCE_CACHE = "cache"
+SOURCE_SNAPSHOT = "snapshot"
+SOURCE_MODEL = "model"
+
+
+def complete_text(model_choice, prompt, task="chat"):
+    """
+    Send a text-only prompt to the chosen backend.
+
+    Args:
+        model_choice: String indicating which model to use
+        prompt: Prompt text
+        task: Task label for metrics and tracing
+
+    Returns:
+        str or None: The model's response
+    """
+    if model_choice == "Gemini (Online)":
+        return gemini_chat_inference(prompt, task=task)
+    return ollama_chat_inference(os.getenv("OLLAMA_MODEL_NAME"), prompt, task=task)
+
+
+def run_dashboard_analysis(objective, image, model_choice, scope=None):
+    """
+    Analyze a dashboard, reusing a cached analysis or, within a snapshot scope, an earlier version's analysis.
+
+    Args:
+        objective: Business objective for the analysis
+        image: PIL Image object of the dashboard
+        model_choice: String indicating which model to use
+        scope: Optional snapshot scope from snapshot_tracking; without one no snapshot delta is tried
+
+    Returns:
+        tuple: (analysis or None, source) where source is SOURCE_CACHE, SOURCE_SNAPSHOT or SOURCE_MODEL
+    """
+    image_hash = image_content_hash(image)
+    model_id = get_model_identifier(model_choice)
+
+    try:
+        with start_span("cache.lookup", cache="analysis") as span:
+            cached_analysis = get_shared_cache().get(image_hash, objective, model_id)
+            span.set("cache_hit", bool(cached_analysis))
+        if cached_analysis:
+            return cached_analysis, SOURCE_CACHE
+    except Exception as e:
+        notify("warning", f"Shared analysis cache unavailable: {e}")
+
+    incremental = None
+    if scope:
+        try:
+            with start_span("snapshot.incremental") as span:
+                incremental = run_incremental_analysis(image, objective, model_choice, model_id, scope)
+                span.set("changed_regions", incremental['changed_regions'] if incremental else None)
+        except Exception as e:
+            notify("warning", f"Snapshot history unavailable: {e}")
+    if incremental:
+        analysis, source = incremental['analysis'], SOURCE_SNAPSHOT
+        notify("toast", f"Recognized a new version of a tracked dashboard; analyzed {incremental['changed_regions']} changed region(s).")
+    elif model_choice == "Gemini (Online)":
+        analysis, source = gemini_inference(objective, [image]), SOURCE_MODEL
+    else:
+        analysis, source = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), objective, [image]), SOURCE_MODEL
+
+    if analysis:
+        try:
+            get_shared_cache().put(image_hash, objective, model_id, analysis)
+        except Exception as e:
+            notify("warning", f"Could not store analysis in the shared cache: {e}")
+    return analysis, source
+
+
+def run_kpi_extraction(image, model_choice):
+    """
+    Extract the dashboard's KPI table, reusing a shared cached extraction when available.
+
+    Args:
+        image: PIL Image object of the dashboard
+        model_choice: String indicating which model to use
+
+    Returns:
+        list: Typed KPI rows from kpi_extraction.extract_kpis()
+    """
+    image_hash = image_content_hash(image)
+    model_id = get_model_identifier(model_choice)
+
+    try:
+        with start_span("cache.lookup", cache="kpis") as span:
+            cached_kpis = get_shared_cache().get(image_hash, KPI_CACHE_OBJECTIVE, model_id)
+            span.set("cache_hit", bool(cached_kpis))
+        if cached_kpis:
+            return json.loads(cached_kpis)
+    except Exception as e:
+        notify("warning", f"Shared analysis cache unavailable: {e}")
+
+    kpis = extract_kpis(image, model_choice)
+    if kpis:
+        try:
+            get_shared_cache().put(image_hash, KPI_CACHE_OBJECTIVE, model_id, json.dumps(kpis))
+        except Exception as e:
+            notify("warning", f"Could not store KPIs in the shared cache: {e}")
+    return kpis
+
+
+def record_dashboard(image, filename, objective, model_id, analysis, scope=None, kpis=None):
+    """
+    Record an analyzed dashboard in its snapshot history (when scoped) and in the library.
+
+    Args:
+        image: PIL Image object of the dashboard
+        filename: Name the dashboard was uploaded under
+        objective: Business objective for the analysis
+        model_id: Backend-qualified model name
+        analysis: Analysis text
+        scope: Optional snapshot scope; without one no snapshot is recorded
+        kpis: Optional extracted KPI table
+    """
+    if scope:
+        record_analysis_snapshot(image, objective, model_id, analysis, scope, kpis)
+    try:
+        get_dashboard_library().add(image, filename)
+    except Exception as e:
+        notify("warning", f"Could not add the dashboard to the library: {e}")
+
+
+def run_summary_job(job, image, filename, objective, model_choice, scope=None, validate=True):
+    """
+    Job: validate, analyze, extract KPIs from and record one dashboard.
+
+    Args:
+        job: The running job
+        image: PIL Image object of the dashboard
+        filename: Name the dashboard was uploaded under
+        objective: Business objective for the analysis
+        model_choice: String indicating which model to use
+        scope: Optional snapshot scope
+        validate: Check that the image is a dashboard first
+
+    Returns:
+        dict: {'image', 'filename', 'objective', 'analysis', 'source', 'kpis', 'model_choice', 'scope'}
+    """
+    if validate:
+        job.set_stage("Validating dashboard image")
+        if not validate_dashboard_image(image, model_choice):
+            raise JobFailedError(get_validation_error_message())
+        job.check_cancelled()
+
+    job.set_stage("Analyzing the dashboard")
+    analysis, source = run_dashboard_analysis(objective, image, model_choice, scope)
+    if not analysis:
+        raise JobFailedError("Failed to get analysis from the model.")
+    job.check_cancelled()
+
+    job.set_stage("Extracting KPIs")
+    kpis = run_kpi_extraction(image, model_choice)
+    job.set_stage("Recording dashboard history")
+    record_dashboard(image, filename, objective, get_model_identifier(model_choice), analysis, scope, kpis)
+    return {
+        "image": image,
+        "filename": filename,
+        "objective": objective,
+        "analysis": analysis,
+        "source": source,
+        "kpis": kpis,
+        "model_choice": model_choice,
+        "scope": scope,
+    }
+
+
+def _tracked_as_same_dashboard(before, after, scope):
+    """Check whether the snapshot history already records both uploads under one dashboard."""
+    if not scope:
+        return False
+    try:
+        store = get_snapshot_store()
+        dashboard_id = store.dashboard_for_image(image_content_hash(before), scope)
+        return dashboard_id is not None and dashboard_id == store.dashboard_for_image(image_content_hash(after), scope)
+    except Exception:
+        return False
+
+
+def get_version_diff(before, after, versions=False, scope=None):
+    """
+    Diff two uploads locally when they are versions of the same dashboard.
+
+    Similar fingerprints alone are not enough, since dashboards built from one
+    template share them. The uploads must also be declared versions by the
+    user, be tracked as one dashboard in the snapshot history, or share the
+    same title region.
+
+    Args:
+        before: PIL Image of the earlier version
+        after: PIL Image of the later version
+        versions: The user declared the uploads to be versions of one dashboard
+        scope: Optional snapshot scope to look the uploads up in
+
+    Returns:
+        dict or None: Result of region_diff.diff_images(), or None if the uploads are not known to be one dashboard
+    """
+    try:
+        if not is_same_dashboard(compute_fingerprint(before), compute_fingerprint(after)):
+            return None
+        if not (versions or _tracked_as_same_dashboard(before, after, scope) or title_regions_match(before, after)):
+            return None
+        return diff_images(before, after)
+    except Exception as e:
+        notify("warning", f"Could not compare the dashboards locally: {e}")
+        return None
+
+
+def _skip(job, result, reason):
+    job.add_message("warning", f"""
+    ⚠️ **Comparison Skipped**
+
+    {reason}
+    """)
+    return dict(result, skipped=reason)
+
+
+def run_comparison_job(job, dashboards, model_choice, indexed_analyses=None, scope=None, versions=False):
+    """
+    Job: deduplicate, validate and compare dashboards.
+
+    Args:
+        job: The running job
+        dashboards: [(image, filename, objective), ...] in upload order
+        model_choice: String indicating which model to use
+        indexed_analyses: Optional analyses already known per dashboard, None where missing
+        scope: Optional snapshot scope the analyzed dashboards are recorded under
+        versions: The user declared two uploads to be versions of one dashboard
+
+    Returns:
+        dict: {'dashboards', 'duplicates', 'model_choice', 'analyses', 'version_diff', 'comparison', 'skipped'};
+              'comparison' is None and 'skipped' gives the reason when the comparison was skipped
+    """
+    indexed_analyses = indexed_analyses or [None] * len(dashboards)
+
+    job.set_stage("Removing duplicate dashboards")
+    duplicates = find_duplicate_dashboards([image for image, _, _ in dashboards])
+    for index, original in duplicates.items():
+        job.add_message("info", f"**{dashboards[index][1]}** is the same dashboard as **{dashboards[original][1]}** and was left out of the comparison.")
+    kept = [index for index in range(len(dashboards)) if index not in duplicates]
+    dashboards = [dashboards[index] for index in kept]
+    analyses = [indexed_analyses[index] for index in kept]
+
+    result = {
+        "dashboards": dashboards, "duplicates": duplicates, "model_choice": model_choice,
+        "analyses": None, "version_diff": None, "comparison": None, "skipped": None,
+    }
+    if len(dashboards) < 2:
+        return _skip(job, result, "The dashboards are too similar to provide meaningful comparison insights. "
+                                  "Please upload different dashboards for a proper comparison analysis.")
+
+    # Validate the dashboards concurrently; ones already analyzed passed validation before
+    job.set_stage("Validating dashboard images")
+    to_validate = [
+        (number, image) for number, ((image, _, _), analysis) in enumerate(zip(dashboards, analyses), start=1)
+        if analysis is None
+    ]
+    results = run_concurrently(lambda item: validate_dashboard_image(item[1], model_choice), to_validate)
+    for (number, _), is_dashboard in zip(to_validate, results):
+        if not is_dashboard:
+            raise JobFailedError(get_validation_error_message(f"Dashboard {number}"))
+    job.check_cancelled()
+
+    if len(dashboards) == 2:
+        job.set_stage("Looking for changed regions")
+        version_diff = get_version_diff(dashboards[0][0], dashboards[1][0], versions, scope)
+        if version_diff is not None and not version_diff['regions']:
+            return _skip(job, result, "No changed regions were found between the two versions of this dashboard. "
+                                      "Please upload two different dashboards for a proper comparison analysis.")
+
+        if version_diff is not None and version_diff['changed_fraction'] <= MAX_CHANGED_FRACTION:
+            # Two versions of one dashboard: only the changed crops go to the model.
+            job.set_stage(f"Comparing {len(version_diff['regions'])} changed region(s)")
+            comparison = run_region_comparison(
+                version_diff, dashboards[1][0].size, dashboards[0][2], dashboards[1][2], model_choice
+            )
+            if not comparison:
+                raise JobFailedError("Failed to get a comparison from the model.")
+            return dict(result, version_diff=version_diff, comparison=comparison)
+
+        job.set_stage("Checking dashboard similarity")
+        similarity = load_plugin("similarity")
+        similarity_result = similarity.detect_dashboard_similarity(dashboards[0][0], dashboards[1][0], model_choice)
+        job.add_message("info", similarity_result['message'])
+        if not similarity.should_proceed_with_comparison(similarity_result):
+            return _skip(job, result, "The dashboards are too similar to provide meaningful comparison insights. "
+                                      "Please upload two different dashboards for a proper comparison analysis.")
+        job.check_cancelled()
+
+    # Dashboards analyzed before reuse their analysis; the rest are analyzed concurrently.
+    job.set_stage(f"Analyzing {len(dashboards)} dashboards")
+    model_id = get_model_identifier(model_choice)
+    missing = [index for index, analysis in enumerate(analyses) if analysis is None]
+
+    def analyze(index):
+        image, filename, objective = dashboards[index]
+        # No snapshot scope here: comparison members are often template
+        # siblings, and a delta seeded from another dashboard's analysis
+        # would misreport this one. They are still recorded for later uploads.
+        analysis, _ = run_dashboard_analysis(objective, image, model_choice)
+        if analysis:
+            record_dashboard(image, filename, objective, model_id, analysis, scope)
+        return analysis
+
+    for index, analysis in zip(missing, run_concurrently(analyze, missing)):
+        analyses[index] = analysis
+    if not all(analyses):
+        raise JobFailedError("Failed to get analysis from the model.")
+    job.check_cancelled()
+
+    job.set_stage(f"Comparing {len(dashboards)} dashboards")
+    comparison = reduce_comparison(
+        build_comparison_entries(dashboards, analyses), lambda prompt: complete_text(model_choice, prompt, "comparison")
+    )
+    if not comparison:
+        raise JobFailedError("Failed to get a comparison from the model.")
+    return dict(result, analyses=analyses, comparison=comparison)
@@ -5,9 +5,9 @@ This module contains functions to detect if two dashboard images are similar
 or identical before performing comparison analysis.
 """
 
-import streamlit as st
 import os
 from llm_service import gemini_inference, ollama_inference
+from job_queue import notify
 
 
 def detect_dashboard_similarity(image1, image2, model_choice):
@@ -56,9 +56,9 @@ Be accurate and strict in your assessment.
 """
         
         if model_choice == "Gemini (Online)":
-            result = gemini_inference(similarity_prompt, [image1, image2])
+            result = gemini_inference(similarity_prompt, [image1, image2], task="similarity")
         else:
-            result = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), similarity_prompt, [image1, image2])
+            result = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), similarity_prompt, [image1, image2], task="similarity")
         
         if result:
             return parse_similarity_result(result)
@@ -66,7 +66,7 @@ Be accurate and strict in your assessment.
             return create_default_similarity_result("Error analyzing similarity")
             
     except Exception as e:
-        st.error(f"Error detecting dashboard similarity: {e}")
+        notify("error", f"Error detecting dashboard similarity: {e}")
         return create_default_similarity_result("Error occurred during similarity analysis")
 
 
@@ -8,6 +8,7 @@ business dashboards before processing them for analysis.
 import streamlit as st
 import os
 from llm_service import gemini_inference, ollama_inference
+from job_queue import notify
 
 
 def validate_dashboard_image(image, model_choice):
@@ -41,9 +42,9 @@ Be strict - only business dashboards and data visualizations should get "YES".
 """
         
         if model_choice == "Gemini (Online)":
-            result = gemini_inference(validation_prompt, [image])
+            result = gemini_inference(validation_prompt, [image], task="validation")
         else:
-            result = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), validation_prompt, [image])
+            result = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), validation_prompt, [image], task="validation")
         
         if result:
             # Clean the response and check for YES/NO
@@ -52,7 +53,7 @@ Be strict - only business dashboards and data visualizations should get "YES".
         return False
         
     except Exception as e:
-        st.error(f"Error validating image: {e}")
+        notify("error", f"Error validating image: {e}")
         return False
 
 
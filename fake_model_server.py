@@ -0,0 +1,352 @@
+"""
+Fake Model Server Module
+
+This module runs a local stand-in for the model backends so the pipeline can
+be exercised offline: the Ollama chat API (/api/chat) and the Gemini REST
+generate endpoints (/v1beta/models/<model>:generateContent and
+:streamGenerateContent). Replies are shaped after the prompt the app sent
+(validation, similarity, KPI extraction, analysis or chat), with configurable
+first-token latency, generation rate and failure injection.
+
+Usage:
+    python fake_model_server.py --port 11434 --latency 0.5 --tokens-per-second 40
+
+Point the app at it with OLLAMA_API_URL=http://127.0.0.1:11434, or with
+GEMINI_API_ENDPOINT=http://127.0.0.1:11434 and any GEMINI_API_KEY.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Words per streamed chunk; one word is counted as one token.
+CHUNK_WORDS = 4
+
+
+class ServerBehavior:
+    """How the fake backend responds."""
+
+    def __init__(self, latency=0.2, tokens_per_second=0.0, failure_rate=0.0, hang_rate=0.0,
+                 hang_seconds=30.0, analysis_words=300, seed=0):
+        """
+        Args:
+            latency: Seconds before the first token
+            tokens_per_second: Generation rate; 0 returns the whole reply at once
+            failure_rate: Fraction of requests answered with HTTP 500
+            hang_rate: Fraction of requests that stall before replying
+            hang_seconds: How long a stalled request stalls
+            analysis_words: Length of analysis and chat replies
+            seed: Seed for generated values and injected faults
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.analysis_words = analysis_words
+        self.seed = seed
+
+
+ANALYSIS_SECTIONS = [
+    "## Summary",
+    "## Key Metrics",
+    "## Trends",
+    "## Risks",
+    "## Recommendations",
+]
+
+FILLER = (
+    "revenue grew steadily across the quarter while churn held near its target and the "
+    "pipeline conversion rate improved in the enterprise segment compared with the prior period"
+).split()
+
+
+def _analysis_text(words, rng):
+    lines = []
+    per_section = max(8, words // len(ANALYSIS_SECTIONS))
+    for section in ANALYSIS_SECTIONS:
+        lines.append(section)
+        for _ in range(max(1, per_section // 16)):
+            start = rng.randrange(len(FILLER))
+            sentence = " ".join(FILLER[(start + offset) % len(FILLER)] for offset in range(16))
+            lines.append(f"- **{sentence[:1].upper()}{sentence[1:]}** {rng.randint(1, 99)}%")
+        lines.append("")
+    lines.append("| Metric | Value | Change |")
+    lines.append("| --- | --- | --- |")
+    for name in ("Revenue", "Churn Rate", "Active Users"):
+        lines.append(f"| {name} | {rng.randint(100, 9999)} | {rng.uniform(-10, 10):+.1f}% |")
+    return "\n".join(lines)
+
+
+def build_reply(prompt, image_count, behavior, rng):
+    """
+    Build the reply text the app expects for a prompt.
+
+    Args:
+        prompt: Prompt text sent by the app
+        image_count: Number of images attached to the request
+        behavior: ServerBehavior
+        rng: random.Random used for the generated values
+
+    Returns:
+        str: Reply text
+    """
+    if "Respond with ONLY one word" in prompt:
+        return "YES"
+    if "similarity_level" in prompt and image_count == 2:
+        percentage = rng.randint(10, 45)
+        return json.dumps({
+            "similarity_level": "different",
+            "similarity_percentage": percentage,
+            "reasoning": "The dashboards track different metrics with different layouts.",
+        })
+    if "Extract every KPI value" in prompt:
+        return json.dumps([
+            {"name": "Revenue", "value": rng.randint(100000, 2000000), "unit": "USD", "period": "Q3 2024"},
+            {"name": "Churn Rate", "value": round(rng.uniform(1, 5), 1), "unit": "%", "period": "Q3 2024"},
+            {"name": "Active Users", "value": rng.randint(1000, 90000), "unit": "", "period": "Q3 2024"},
+        ])
+    return _analysis_text(behavior.analysis_words, rng)
+
+
+def _chunks(text):
+    words = re.findall(r"\S+\s*", text)
+    return ["".join(words[index:index + CHUNK_WORDS]) for index in range(0, len(words), CHUNK_WORDS)] or [""]
+
+
+def _token_count(text):
+    return len(text.split())
+
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def behavior(self):
+        return self.server.behavior
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _pace(self, chunk):
+        if self.behavior.tokens_per_second > 0:
+            time.sleep(_token_count(chunk) / self.behavior.tokens_per_second)
+
+    def _inject(self):
+        """Apply latency and injected faults; returns False when the request was failed."""
+        rng = self.server.next_random()
+        if rng.random() < self.behavior.hang_rate:
+            time.sleep(self.behavior.hang_seconds)
+        time.sleep(self.behavior.latency)
+        if rng.random() < self.behavior.failure_rate:
+            self.server.count("failed")
+            self._send_json(500, {"error": {"code": 500, "message": "Injected failure", "status": "INTERNAL"}})
+            return False
+        return True
+
+    def do_POST(self):
+        try:
+            body = self._read_json()
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        self.server.count("requests")
+
+        match = re.match(r"^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)", self.path)
+        if self.path.split("?")[0] == "/api/chat":
+            self._ollama_chat(body)
+        elif match:
+            self._gemini_generate(body, match.group(1), stream=match.group(2) == "streamGenerateContent")
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "fake"}]})
+        elif self.path == "/stats":
+            self._send_json(200, self.server.stats())
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def _ollama_chat(self, body):
+        message = (body.get("messages") or [{}])[-1]
+        prompt = message.get("content", "")
+        reply = build_reply(prompt, len(message.get("images") or []), self.behavior, self.server.next_random())
+        if not self._inject():
+            return
+
+        base = {"model": body.get("model", "fake"), "created_at": "2024-01-01T00:00:00Z"}
+        totals = {"done": True, "done_reason": "stop", "prompt_eval_count": _token_count(prompt), "eval_count": _token_count(reply)}
+        if body.get("stream") is False:
+            for chunk in _chunks(reply):
+                self._pace(chunk)
+            self._send_json(200, dict(base, message={"role": "assistant", "content": reply}, **totals))
+            return
+
+        self._start_stream("application/x-ndjson")
+        for chunk in _chunks(reply):
+            self._pace(chunk)
+            line = dict(base, message={"role": "assistant", "content": chunk}, done=False)
+            self._write_chunk(json.dumps(line).encode("utf-8") + b"\n")
+        self._write_chunk(json.dumps(dict(base, message={"role": "assistant", "content": ""}, **totals)).encode("utf-8") + b"\n")
+        self._end_stream()
+
+    def _gemini_generate(self, body, model, stream):
+        parts = [part for content in body.get("contents", []) for part in content.get("parts", [])]
+        prompt = "\n".join(part.get("text", "") for part in parts if "text" in part)
+        image_count = sum(1 for part in parts if "inline_data" in part or "inlineData" in part)
+        reply = build_reply(prompt, image_count, self.behavior, self.server.next_random())
+        if not self._inject():
+            return
+
+        usage = {"promptTokenCount": _token_count(prompt), "candidatesTokenCount": _token_count(reply)}
+        usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+
+        def candidate(text):
+            return {"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}
+
+        if not stream:
+            for chunk in _chunks(reply):
+                self._pace(chunk)
+            self._send_json(200, {"candidates": [candidate(reply)], "usageMetadata": usage, "modelVersion": model})
+            return
+
+        # The REST client streams with alt=sse; without it the reply is one JSON array.
+        sse = "alt=sse" in self.path
+        self._start_stream("text/event-stream" if sse else "application/json")
+        chunks = _chunks(reply)
+        for index, chunk in enumerate(chunks):
+            self._pace(chunk)
+            payload = {"candidates": [candidate(chunk)], "modelVersion": model}
+            if index == len(chunks) - 1:
+                payload["usageMetadata"] = usage
+            if sse:
+                self._write_chunk(f"data: {json.dumps(payload)}\r\n\r\n".encode("utf-8"))
+            else:
+                prefix = "[" if index == 0 else ","
+                suffix = "]" if index == len(chunks) - 1 else ""
+                self._write_chunk(f"{prefix}{json.dumps(payload)}{suffix}".encode("utf-8"))
+        self._end_stream()
+
+
+class FakeModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, behavior=None):
+        super().__init__(address, FakeModelHandler)
+        self.behavior = behavior or ServerBehavior()
+        self._random = random.Random(self.behavior.seed)
+        self._counts = {"requests": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def next_random(self):
+        """Return a generator seeded from the server's seed, one per request."""
+        with self._lock:
+            return random.Random(self._random.getrandbits(64))
+
+    def count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_fake_server(behavior=None, host="127.0.0.1", port=0):
+    """
+    Start the fake backend on a background thread.
+
+    Args:
+        behavior: ServerBehavior (defaults apply when omitted)
+        host: Interface to bind
+        port: Port to listen on; 0 picks a free port
+
+    Returns:
+        FakeModelServer: The running server; call shutdown() to stop it
+    """
+    server = FakeModelServer((host, port), behavior)
+    threading.Thread(target=server.serve_forever, name="fake-model-server", daemon=True).start()
+    return server
+
+
+def add_behavior_arguments(parser):
+    """Add the ServerBehavior options to an argument parser."""
+    defaults = ServerBehavior()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second,
+                        help="Generation rate; 0 replies instantly")
+    parser.add_argument("--failure-rate", type=float, default=defaults.failure_rate, help="Fraction of requests failed with HTTP 500")
+    parser.add_argument("--hang-rate", type=float, default=defaults.hang_rate, help="Fraction of requests that stall")
+    parser.add_argument("--hang-seconds", type=float, default=defaults.hang_seconds)
+    parser.add_argument("--analysis-words", type=int, default=defaults.analysis_words)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def behavior_from_arguments(args):
+    """Build a ServerBehavior from parsed add_behavior_arguments options."""
+    return ServerBehavior(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        analysis_words=args.analysis_words,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama/Gemini backend for offline runs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeModelServer((args.host, args.port), behavior_from_arguments(args))
+    print(f"Fake model server on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Image Codec Module
+
+This module encodes dashboard images for model backends, session storage and
+PDF reports. Encoded output is memoized per (content hash, format, quality,
+max side, target size) so the same dashboard is only encoded once no matter
+how many times it is sent.
+"""
+
+import base64
+import math
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image
+
+from utils import image_content_hash
+
+
+SUPPORTED_FORMATS = ("JPEG", "WEBP", "PNG")
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png",
+}
+DEFAULT_QUALITY = 85
+MIN_TARGET_QUALITY = 20
+MAX_CACHE_BYTES = int(os.getenv("IMAGE_CODEC_CACHE_BYTES", 64 * 1024 * 1024))
+
+# Uploads above MAX_UPLOAD_PIXELS are rejected from their header alone; uploads
+# above UPLOAD_PIXEL_BUDGET are downsampled while (or right after) decoding.
+# Only JPEG can be decoded at reduced size, so other formats (PNG) are fully
+# decoded first and are held to the lower MAX_FULL_DECODE_PIXELS.
+MAX_UPLOAD_PIXELS = int(os.getenv("MAX_UPLOAD_PIXELS", 120_000_000))
+MAX_FULL_DECODE_PIXELS = int(os.getenv("MAX_FULL_DECODE_PIXELS", 40_000_000))
+UPLOAD_PIXEL_BUDGET = int(os.getenv("UPLOAD_PIXEL_BUDGET", 16_000_000))
+
+_encoded_cache = OrderedDict()
+_encoded_cache_bytes = 0
+_encoded_cache_lock = threading.Lock()
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload's dimensions exceed the configured pixel limit."""
+
+
+def open_image(source):
+    """
+    Open an image unless it already is one.
+
+    Uploads that need a pixel budget go through decode_upload() instead.
+
+    Args:
+        source: File path, file-like object or PIL Image
+
+    Returns:
+        Image: The opened PIL image
+    """
+    if hasattr(source, "mode"):
+        return source
+    return Image.open(source)
+
+
+def _check_size(size, image_format, max_pixels):
+    """Raise ImageTooLargeError if an image of this size and format must not be decoded."""
+    width, height = size
+    pixels = width * height
+    if pixels > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height} ({pixels / 1e6:.0f} MP); the limit is {max_pixels / 1e6:.0f} MP."
+        )
+    full_decode_limit = min(max_pixels, MAX_FULL_DECODE_PIXELS)
+    if image_format != "JPEG" and pixels > full_decode_limit:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height} ({pixels / 1e6:.0f} MP); {image_format or 'this format'} images are limited "
+            f"to {full_decode_limit / 1e6:.0f} MP. Upload it as a JPEG or at a smaller size."
+        )
+
+
+def check_upload(source, max_pixels=None):
+    """
+    Check an upload from its header without decoding any pixel data.
+
+    Args:
+        source: File path or file-like object
+        max_pixels: Maximum pixels accepted (default MAX_UPLOAD_PIXELS)
+
+    Returns:
+        tuple: (width, height) of the image
+
+    Raises:
+        ImageTooLargeError: If the upload exceeds max_pixels, or MAX_FULL_DECODE_PIXELS for non-JPEG formats
+    """
+    max_pixels = max_pixels or MAX_UPLOAD_PIXELS
+    try:
+        with Image.open(source) as image:
+            size, image_format = image.size, image.format
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    _check_size(size, image_format, max_pixels)
+    return size
+
+
+def decode_upload(source, pixel_budget=None, max_pixels=None):
+    """
+    Decode an uploaded image within a pixel budget.
+
+    The dimensions are read from the header before any pixel data is decoded.
+    Oversized images are rejected outright; images over the budget are decoded
+    at reduced size (JPEG DCT scaling via ``Image.draft``) or, for formats that
+    cannot decode at reduced size such as PNG, downsampled immediately after
+    decoding so the full-resolution buffer is freed straight away.
+
+    Args:
+        source: File path or file-like object (e.g. a Streamlit UploadedFile)
+        pixel_budget: Maximum pixels in the returned image (default UPLOAD_PIXEL_BUDGET)
+        max_pixels: Maximum pixels accepted at all (default MAX_UPLOAD_PIXELS)
+
+    Returns:
+        Image: A fully loaded PIL image no larger than the pixel budget, with
+               the upload's original dimensions in ``image.info['original_size']``
+
+    Raises:
+        ImageTooLargeError: If the upload exceeds max_pixels, or MAX_FULL_DECODE_PIXELS for non-JPEG formats
+    """
+    pixel_budget = pixel_budget or UPLOAD_PIXEL_BUDGET
+    max_pixels = max_pixels or MAX_UPLOAD_PIXELS
+
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+
+    original_size = image.size
+    pixels = original_size[0] * original_size[1]
+    try:
+        _check_size(original_size, image.format, max_pixels)
+    except ImageTooLargeError:
+        image.close()
+        raise
+
+    if pixels > pixel_budget:
+        scale = math.sqrt(pixel_budget / pixels)
+        target = (max(1, int(original_size[0] * scale)), max(1, int(original_size[1] * scale)))
+        if image.format == "JPEG":
+            image.draft("RGB", target)
+
+    image.load()
+
+    decoded_pixels = image.size[0] * image.size[1]
+    if decoded_pixels > pixel_budget:
+        scale = math.sqrt(pixel_budget / decoded_pixels)
+        target = (max(1, int(image.size[0] * scale)), max(1, int(image.size[1] * scale)))
+        # reducing_gap box-reduces first, which is much cheaper than a full resample.
+        reduced = image.resize(target, Image.BILINEAR, reducing_gap=2.0)
+        image.close()
+        image = reduced
+
+    image.info["original_size"] = original_size
+    return image
+
+
+def _prepare(image, image_format, max_side):
+    if image_format == "JPEG" and image.mode != "RGB":
+        if image.mode in ("RGBA", "LA", "P"):
+            rgba = image.convert("RGBA")
+            prepared = Image.new("RGB", rgba.size, "white")
+            prepared.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            prepared = image.convert("RGB")
+    elif image_format == "WEBP" and image.mode not in ("RGB", "RGBA"):
+        prepared = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+    else:
+        prepared = image
+
+    if max_side and max(prepared.size) > max_side:
+        if prepared is image:
+            prepared = image.copy()
+        prepared.thumbnail((max_side, max_side), Image.LANCZOS)
+    return prepared
+
+
+def _save(image, image_format, quality):
+    with BytesIO() as buffer:
+        if image_format == "PNG":
+            image.save(buffer, format="PNG", optimize=True)
+        elif image_format == "WEBP":
+            image.save(buffer, format="WEBP", quality=quality, method=4)
+        else:
+            image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        return buffer.getvalue()
+
+
+def _encode_to_target(image, image_format, quality, target_bytes):
+    # Binary search for the highest quality that fits, falling back to the
+    # smallest encoding if even the minimum quality is too large.
+    low, high = MIN_TARGET_QUALITY, quality
+    best = None
+    while low <= high:
+        candidate_quality = (low + high) // 2
+        data = _save(image, image_format, candidate_quality)
+        if len(data) <= target_bytes:
+            best = data
+            low = candidate_quality + 1
+        else:
+            high = candidate_quality - 1
+    return best if best is not None else _save(image, image_format, MIN_TARGET_QUALITY)
+
+
+def encode_image(image, image_format="JPEG", quality=DEFAULT_QUALITY, max_side=None, target_bytes=None):
+    """
+    Encode an image, reusing a previous encoding of the same content and settings.
+
+    Args:
+        image: PIL Image object
+        image_format: "JPEG", "WEBP" or "PNG"
+        quality: Encoder quality (1-100) for JPEG and WebP
+        max_side: Optional longest side in pixels; larger images are downscaled
+        target_bytes: Optional size budget; quality is lowered until the output fits
+
+    Returns:
+        bytes: The encoded image
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    global _encoded_cache_bytes
+
+    image_format = image_format.upper()
+    if image_format not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported image format: {image_format}")
+
+    key = (image_content_hash(image), image_format, quality, max_side, target_bytes)
+    with _encoded_cache_lock:
+        data = _encoded_cache.get(key)
+        if data is not None:
+            _encoded_cache.move_to_end(key)
+            return data
+
+    prepared = _prepare(image, image_format, max_side)
+    try:
+        if target_bytes and image_format != "PNG":
+            data = _encode_to_target(prepared, image_format, quality, target_bytes)
+        else:
+            data = _save(prepared, image_format, quality)
+    finally:
+        if prepared is not image:
+            prepared.close()
+
+    with _encoded_cache_lock:
+        if key not in _encoded_cache:
+            _encoded_cache[key] = data
+            _encoded_cache_bytes += len(data)
+        while _encoded_cache_bytes > MAX_CACHE_BYTES and len(_encoded_cache) > 1:
+            _, evicted = _encoded_cache.popitem(last=False)
+            _encoded_cache_bytes -= len(evicted)
+    return data
+
+
+def encode_image_base64(image, image_format="JPEG", quality=DEFAULT_QUALITY, max_side=None, target_bytes=None):
+    """
+    Encode an image and return it as a base64 string.
+
+    Args:
+        image: PIL Image object
+        image_format: "JPEG", "WEBP" or "PNG"
+        quality: Encoder quality (1-100) for JPEG and WebP
+        max_side: Optional longest side in pixels
+        target_bytes: Optional size budget for the encoded image
+
+    Returns:
+        str: Base64-encoded image
+    """
+    data = encode_image(image, image_format, quality, max_side, target_bytes)
+    return base64.b64encode(data).decode("utf-8")
+
+
+def scaled_size(size, max_width, max_height=None):
+    """
+    Compute the size an image is downscaled to so it fits a bounding box.
+
+    Args:
+        size: (width, height) of the source image
+        max_width: Maximum width in pixels
+        max_height: Optional maximum height in pixels
+
+    Returns:
+        tuple: (width, height, max_side) where max_side can be passed to encode_image()
+    """
+    width, height = size
+    scale = min(1.0, max_width / width, (max_height / height) if max_height else 1.0)
+    max_side = max(1, int(max(width, height) * scale))
+    # Mirror Image.thumbnail's rounding so the reported size matches the encoding.
+    if width >= height:
+        return max_side, max(1, round(height * max_side / width)), max_side
+    return max(1, round(width * max_side / height)), max_side, max_side
+
+
+def clear_cache():
+    """Drop every memoized encoding."""
+    global _encoded_cache_bytes
+    with _encoded_cache_lock:
+        _encoded_cache.clear()
+        _encoded_cache_bytes = 0
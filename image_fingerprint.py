@@ -0,0 +1,142 @@
+"""
+Image Fingerprint Module
+
+This module computes compact, model-free signatures of dashboard images:
+a 64-bit perceptual hash, a coarse layout signature and a grayscale
+thumbnail that can be compared tile by tile to find changed regions.
+"""
+
+from PIL import Image, ImageFilter
+
+
+HASH_SIZE = 8
+LAYOUT_SIZE = 32
+THUMBNAIL_SIZE = 256
+TILE_GRID = 16
+TILE_CHANGE_THRESHOLD = 10
+
+
+def perceptual_hash(image):
+    """
+    Compute a 64-bit difference hash (dHash) of an image.
+
+    Args:
+        image: PIL Image object
+
+    Returns:
+        int: Hash whose Hamming distance to another hash measures visual difference
+    """
+    small = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR, reducing_gap=2.0)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def layout_signature(image):
+    """
+    Compute a 1024-bit signature of where edges (panels, charts, text) sit.
+
+    Args:
+        image: PIL Image object
+
+    Returns:
+        int: Bit set of edge-dense cells on a 32x32 grid
+    """
+    edges = image.convert("L").resize((LAYOUT_SIZE * 4, LAYOUT_SIZE * 4), Image.BILINEAR, reducing_gap=2.0)
+    edges = edges.filter(ImageFilter.FIND_EDGES).resize((LAYOUT_SIZE, LAYOUT_SIZE), Image.BOX)
+    pixels = edges.tobytes()
+    mean = sum(pixels) / len(pixels)
+    value = 0
+    for pixel in pixels:
+        value = (value << 1) | (pixel > mean)
+    return value
+
+
+def hamming_distance(first, second):
+    """Count the differing bits between two integer signatures."""
+    return bin(first ^ second).count("1")
+
+
+def grayscale_thumbnail(image):
+    """
+    Get the fixed-size grayscale thumbnail used for tile comparison.
+
+    Args:
+        image: PIL Image object
+
+    Returns:
+        bytes: THUMBNAIL_SIZE x THUMBNAIL_SIZE grayscale pixels
+    """
+    size = (THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+    return image.convert("L").resize(size, Image.BILINEAR, reducing_gap=2.0).tobytes()
+
+
+def changed_tiles(previous_thumbnail, current_thumbnail):
+    """
+    Find the grid tiles whose content changed between two thumbnails.
+
+    Args:
+        previous_thumbnail: Bytes from grayscale_thumbnail()
+        current_thumbnail: Bytes from grayscale_thumbnail()
+
+    Returns:
+        set: (row, col) tiles on a TILE_GRID x TILE_GRID grid that changed
+    """
+    tile = THUMBNAIL_SIZE // TILE_GRID
+    changed = set()
+    for row in range(TILE_GRID):
+        for col in range(TILE_GRID):
+            for y in range(row * tile, (row + 1) * tile):
+                start = y * THUMBNAIL_SIZE + col * tile
+                before = previous_thumbnail[start:start + tile]
+                after = current_thumbnail[start:start + tile]
+                if any(abs(a - b) > TILE_CHANGE_THRESHOLD for a, b in zip(before, after)):
+                    changed.add((row, col))
+                    break
+    return changed
+
+
+def tiles_to_regions(tiles, image_size, padding=0.02, grid=TILE_GRID):
+    """
+    Merge adjacent changed tiles into bounding boxes in image coordinates.
+
+    Args:
+        tiles: Set of (row, col) tiles from changed_tiles()
+        image_size: (width, height) of the image the boxes refer to
+        padding: Extra margin around each box, as a fraction of the image size
+        grid: Number of tile rows and columns the tiles were taken from
+
+    Returns:
+        list: (left, top, right, bottom) boxes, largest first
+    """
+    remaining = set(tiles)
+    width, height = image_size
+    tile_width, tile_height = width / grid, height / grid
+    pad_x, pad_y = int(width * padding), int(height * padding)
+
+    regions = []
+    while remaining:
+        stack = [remaining.pop()]
+        component = []
+        while stack:
+            row, col = stack.pop()
+            component.append((row, col))
+            for neighbour in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if neighbour in remaining:
+                    remaining.remove(neighbour)
+                    stack.append(neighbour)
+
+        rows = [row for row, _ in component]
+        cols = [col for _, col in component]
+        regions.append((
+            max(0, int(min(cols) * tile_width) - pad_x),
+            max(0, int(min(rows) * tile_height) - pad_y),
+            min(width, int((max(cols) + 1) * tile_width) + pad_x),
+            min(height, int((max(rows) + 1) * tile_height) + pad_y),
+        ))
+
+    return sorted(regions, key=lambda box: (box[2] - box[0]) * (box[3] - box[1]), reverse=True)
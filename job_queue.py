@@ -0,0 +1,314 @@
+"""
+Job Queue Module
+
+This module runs long model pipelines (analysis, comparison, chat, PDF) as
+jobs on a worker pool. Callers get a job id back immediately and poll for the
+job's status, current stage and result, so no request or script run has to
+stay blocked while a model is working.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from tracing import Span, bind_span
+from metrics import get_metrics
+
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_PENDING = 1000
+# Finished jobs are kept for polling until this many newer jobs have finished
+# or they are older than FINISHED_JOB_TTL seconds, whichever comes first.
+MAX_FINISHED_JOBS = 1000
+FINISHED_JOB_TTL = float(os.getenv("JOB_RESULT_TTL_SECONDS", 600))
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+_current = threading.local()
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobFailedError(RuntimeError):
+    """Raised by a job function to fail the job with a user-facing message."""
+
+
+class Job:
+    """A unit of work with a status, a progress stage and a result."""
+
+    def __init__(self, kind, owner=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.status = QUEUED
+        self.stage = "Queued"
+        self.stages = []
+        self.result = None
+        self.result_collected = False
+        self.error = None
+        self.messages = []
+        self.span = None
+        self._stage_span = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancelled = threading.Event()
+
+    def set_stage(self, stage):
+        """Record the stage the job has reached, for progress reporting and tracing."""
+        self.stage = stage
+        self.stages.append((time.time(), stage))
+        if self.span is None:
+            return
+        # Each stage is a child span of the job; model calls made during the
+        # stage nest under it.
+        if self._stage_span is not None:
+            self._stage_span.end()
+            self._stage_span = None
+        if stage not in ("Started", "Finished"):
+            self._stage_span = Span(stage, self.span)
+        bind_span(self._stage_span or self.span)
+
+    def add_message(self, level, message):
+        """Record a user-facing message ("error", "warning", "info" or "toast") raised while running."""
+        self.messages.append((level, message))
+
+    def take_result(self):
+        """
+        Hand over the result of a finished job and drop the job's reference to it.
+
+        Results can hold decoded images, so they are released as soon as the
+        page or API client has consumed them rather than when the job expires.
+
+        Returns:
+            The job result, or None if it was already taken
+        """
+        result, self.result = self.result, None
+        self.result_collected = True
+        return result
+
+    def cancel(self):
+        """Ask the job to stop; job functions check ``cancelled`` between stages."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        """Stop the job function if the job was cancelled."""
+        if self.cancelled:
+            raise JobFailedError("Job was cancelled.")
+
+    def to_dict(self, include_result=True):
+        """
+        Describe the job for polling.
+
+        Args:
+            include_result: Include the result payload of finished jobs
+
+        Returns:
+            dict: Job id, kind, status, stage, timings and result or error
+        """
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "messages": [{"level": level, "message": message} for level, message in self.messages],
+        }
+        if include_result and self.status == SUCCEEDED:
+            data["result"] = self.result
+            data["result_collected"] = self.result_collected
+        return data
+
+
+class JobQueue:
+    """Thread-pool backed queue of jobs with bounded pending and finished sets."""
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or int(os.getenv("JOB_WORKERS", DEFAULT_WORKERS))
+        self.max_pending = max_pending or int(os.getenv("JOB_QUEUE_MAX", DEFAULT_MAX_PENDING))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _run(self, job, function, args, kwargs):
+        if job.cancelled:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return
+
+        job.status = RUNNING
+        job.started_at = time.time()
+        job.span = Span(f"job.{job.kind}", attributes={
+            "job_id": job.id,
+            "owner": job.owner,
+            "queue_wait_ms": round((job.started_at - job.created_at) * 1000, 1),
+        })
+        job.set_stage("Started")
+        bind_job(job)
+        try:
+            job.result = function(job, *args, **kwargs)
+            job.status = CANCELLED if job.cancelled else SUCCEEDED
+        except JobFailedError as e:
+            job.error = str(e)
+            job.status = CANCELLED if job.cancelled else FAILED
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+        finally:
+            bind_job(None)
+            job.finished_at = time.time()
+            job.set_stage("Finished")
+            job.span.set("status", job.status)
+            if job.error:
+                job.span.error = job.error
+            job.span.end()
+            bind_span(None)
+            get_metrics().jobs.inc(kind=job.kind, status=job.status)
+            get_metrics().job_latency.observe(job.finished_at - job.started_at, kind=job.kind)
+            self._trim()
+
+    def _trim(self):
+        expired_before = time.time() - FINISHED_JOB_TTL
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+            excess = max(0, len(finished) - MAX_FINISHED_JOBS)
+            for position, job_id in enumerate(finished):
+                finished_at = self._jobs[job_id].finished_at
+                if position < excess or (finished_at is not None and finished_at < expired_before):
+                    del self._jobs[job_id]
+
+    def submit(self, kind, function, *args, owner=None, **kwargs):
+        """
+        Queue a job.
+
+        Args:
+            kind: Short job type name ("analyze", "compare", ...)
+            function: Callable invoked as function(job, *args, **kwargs); its
+                      return value becomes the job result
+            owner: Optional owner id (e.g. a session id) used by list_jobs()
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            QueueFullError: If max_pending jobs are already queued or running
+        """
+        job = Job(kind, owner)
+        self._trim()
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                raise QueueFullError(f"The job queue is full ({self.max_pending} pending jobs).")
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, function, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """Return a job by id, or None if it is unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job; queued jobs never start and running jobs stop at their next stage.
+
+        Returns:
+            bool: True if the job exists and had not finished yet
+        """
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        job.cancel()
+        return True
+
+    def list_jobs(self, owner):
+        """Return the jobs submitted by an owner, oldest first."""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.owner == owner]
+
+    def pending(self):
+        """Count jobs that are queued or running."""
+        return sum(1 for job in list(self._jobs.values()) if job.status not in FINISHED_STATES)
+
+    def stats(self):
+        """
+        Summarize the queue for monitoring.
+
+        Returns:
+            dict: {'workers': int, 'queued': int, 'running': int, 'finished': int}
+        """
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.max_workers,
+            "queued": statuses.count(QUEUED),
+            "running": statuses.count(RUNNING),
+            "finished": sum(1 for status in statuses if status in FINISHED_STATES),
+        }
+
+
+def bind_job(job):
+    """Make job the current job of this thread, so helpers it calls can report to it."""
+    _current.job = job
+
+
+def current_job():
+    """Return the job running on this thread, or None in a script or request thread."""
+    return getattr(_current, "job", None)
+
+
+def notify(level, message):
+    """
+    Show a message to the user, wherever the calling code runs.
+
+    In a script thread the message goes to the page (st.error, st.warning, ...);
+    in a job worker it is recorded on the job and shown once the page polls it.
+
+    Args:
+        level: "error", "warning", "info" or "toast"
+        message: Message text (Markdown)
+    """
+    job = current_job()
+    if job is not None:
+        job.add_message(level, message)
+    else:
+        getattr(st, level)(message)
+
+
+def get_job_queue():
+    """
+    Get the process-wide job queue.
+
+    Returns:
+        JobQueue: Queue shared by the API service and every Streamlit session in this process
+    """
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = JobQueue()
+                get_metrics().add_gauge(
+                    "kpi_job_queue_jobs", "Background jobs by state.", ("state",),
+                    lambda: [((state,), count) for state, count in _job_queue.stats().items() if state != "workers"]
+                )
+    return _job_queue
@@ -0,0 +1,323 @@
+"""
+KPI Extraction Module
+
+This module turns a dashboard's visible KPIs into a typed table once, right
+after analysis, and answers simple numeric follow-up questions (lookups,
+rankings and deltas) from that table without another model call.
+"""
+
+import difflib
+import json
+import os
+import re
+
+from llm_service import gemini_inference, ollama_inference
+from job_queue import notify
+
+
+KPI_EXTRACTION_PROMPT = """
+Extract every KPI value that is visible in this dashboard image.
+
+Respond with ONLY a JSON array in this exact format:
+[
+    {"name": "Revenue", "value": 1250000, "unit": "USD", "period": "Q3 2024"},
+    {"name": "Churn Rate", "value": 2.4, "unit": "%", "period": "Q3 2024"}
+]
+
+Guidelines:
+- "value" must be a plain number (no currency symbols, commas or suffixes like K/M)
+- "unit" is the unit of the value ("USD", "%", "users", ...) or "" if none
+- "period" is the time period the value belongs to, or "" if none is shown
+- Emit one entry per KPI per period; include every period shown in charts or tables
+- Do not invent values that are not visible
+"""
+
+_NUMBER_PATTERN = re.compile(r'-?\d[\d,]*\.?\d*')
+_SUFFIX_MULTIPLIERS = {
+    'k': 1e3, 'thousand': 1e3,
+    'm': 1e6, 'mm': 1e6, 'mn': 1e6, 'million': 1e6,
+    'b': 1e9, 'bn': 1e9, 'billion': 1e9,
+}
+# A magnitude suffix only counts as a whole token right after the number, so
+# "12 months" stays 12 while "1.2M" and "3 billion" are scaled.
+_SUFFIX_PATTERN = re.compile(r'\s*(' + '|'.join(sorted(_SUFFIX_MULTIPLIERS, key=len, reverse=True)) + r')(?![a-z])')
+_WORD_PATTERN = re.compile(r"[a-z0-9%$]+")
+_STOP_WORDS = {
+    'what', 'was', 'is', 'the', 'of', 'in', 'for', 'a', 'an', 'our', 'were', 'are', 'did', 'does',
+    'how', 'much', 'many', 'which', 'show', 'me', 'tell', 'value', 'to', 'from', 'between', 'and',
+    'vs', 'versus', 'compared', 'with', 'by', 'at', 'on', 'kpi', 'metric', 'had', 'has', 'have',
+}
+_RANKING_WORDS = {
+    'highest': True, 'largest': True, 'biggest': True, 'max': True, 'maximum': True, 'top': True, 'best': True,
+    'lowest': False, 'smallest': False, 'min': False, 'minimum': False, 'bottom': False, 'worst': False,
+}
+_DELTA_WORDS = {'change', 'changed', 'difference', 'delta', 'grow', 'grew', 'growth', 'increase',
+                'increased', 'decrease', 'decreased', 'drop', 'dropped', 'vs', 'versus', 'compared'}
+# Words that only restate that the user wants a value; any other content word
+# left over once the KPI name, periods and intent are matched means the
+# question asks for more than a table lookup.
+_VALUE_INTENT_WORDS = {'current', 'currently', 'latest', 'now', 'number', 'count', 'total', 'level', 'figure',
+                       'amount', 'reported', 'shown', 'displayed', 'give', 'can', 'you', 'please',
+                       'do', 'we', 'us', 'it', 'its', 'this', 'that', 'there', 'dashboard', 'kpis',
+                       'metrics', 'values', 's', 'be', 'been', 'so', 'far', 'go', 'went', 'get', 'got'}
+_MONTHS = {name: index for index, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1
+)}
+_PERIOD_PART_PATTERN = re.compile(r"(?:fy)?(\d{4})|fy(\d{2})|'(\d{2})|q([1-4])|h([12])|([a-z]{3})[a-z]*")
+# Questions asking for reasoning or advice always go to the model.
+_OPEN_ENDED_WORDS = {'why', 'explain', 'recommend', 'recommendation', 'should', 'suggest', 'improve',
+                     'insight', 'insights', 'strategy', 'cause', 'reason', 'predict', 'forecast'}
+
+
+def parse_kpi_value(raw):
+    """
+    Convert a model-reported KPI value to a float.
+
+    Args:
+        raw: Number or string such as "1,250", "$1.2M" or "2.4%"
+
+    Returns:
+        float or None: The numeric value, or None if it cannot be parsed
+    """
+    if isinstance(raw, (int, float)) and not isinstance(raw, bool):
+        return float(raw)
+    if not isinstance(raw, str):
+        return None
+
+    match = _NUMBER_PATTERN.search(raw)
+    if not match:
+        return None
+    value = float(match.group().replace(',', ''))
+    suffix = _SUFFIX_PATTERN.match(raw.lower(), match.end())
+    if suffix:
+        return value * _SUFFIX_MULTIPLIERS[suffix.group(1)]
+    return value
+
+
+def parse_kpi_result(result):
+    """
+    Parse the model's KPI extraction response into a typed table.
+
+    Args:
+        result: String response from AI model
+
+    Returns:
+        list: [{'name': str, 'value': float, 'unit': str, 'period': str}, ...]
+    """
+    json_match = re.search(r'\[.*\]', result or "", re.DOTALL)
+    if not json_match:
+        return []
+    try:
+        rows = json.loads(json_match.group())
+    except json.JSONDecodeError:
+        return []
+
+    kpis = []
+    for row in rows:
+        if not isinstance(row, dict) or not row.get('name'):
+            continue
+        value = parse_kpi_value(row.get('value'))
+        if value is None:
+            continue
+        kpis.append({
+            'name': str(row['name']).strip(),
+            'value': value,
+            'unit': str(row.get('unit') or '').strip(),
+            'period': str(row.get('period') or '').strip(),
+        })
+    return kpis
+
+
+def extract_kpis(image, model_choice):
+    """
+    Extract the dashboard's visible KPIs with one model call.
+
+    Args:
+        image: PIL Image object of the dashboard
+        model_choice: String indicating which model to use
+
+    Returns:
+        list: Typed KPI rows from parse_kpi_result(); empty on failure
+    """
+    try:
+        if model_choice == "Gemini (Online)":
+            result = gemini_inference(KPI_EXTRACTION_PROMPT, [image], task="kpi_extraction")
+        else:
+            result = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), KPI_EXTRACTION_PROMPT, [image], task="kpi_extraction")
+        return parse_kpi_result(result)
+    except Exception as e:
+        notify("warning", f"Could not extract KPIs from the dashboard: {e}")
+        return []
+
+
+def _words(text):
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def _match_kpi_name(question_words, kpis):
+    """Return the KPI name that best matches the question and the question words it used, or (None, set())."""
+    content_words = [word for word in question_words if word not in _STOP_WORDS]
+    best_name, best_score, best_used = None, 0.0, set()
+    for name in {kpi['name'] for kpi in kpis}:
+        name_words = _words(name)
+        if not name_words:
+            continue
+        matched, used = 0, set()
+        for name_word in name_words:
+            close = [name_word] if name_word in content_words else difflib.get_close_matches(name_word, content_words, n=1, cutoff=0.85)
+            if close:
+                matched += 1
+                used.update(close)
+        score = matched / len(name_words)
+        if score > best_score:
+            best_name, best_score, best_used = name, score, used
+    return (best_name, best_used) if best_score >= 0.5 else (None, set())
+
+
+def _match_periods(question, kpis):
+    """Return the periods mentioned in the question, in the order they appear."""
+    lowered = question.lower()
+    all_periods = {kpi['period'] for kpi in kpis if kpi['period']}
+    found = []
+    for period in all_periods:
+        position = lowered.find(period.lower())
+        if position >= 0:
+            found.append((position, period))
+    if found:
+        return [period for _, period in sorted(found)]
+
+    # Fall back to partial mentions such as "Q3" for "Q3 2024", as long as
+    # each mention identifies exactly one period.
+    question_words = _words(question)
+    for position, word in enumerate(question_words):
+        if word in _STOP_WORDS:
+            continue
+        candidates = [period for period in all_periods if word in _words(period)]
+        if len(candidates) == 1 and candidates[0] not in (period for _, period in found):
+            found.append((position, candidates[0]))
+    return [period for _, period in sorted(found)]
+
+
+def format_kpi_value(value, unit):
+    """Format a KPI value with its unit for display."""
+    sign = "-" if value < 0 else ""
+    value = abs(value)
+    text = f"{value:,.0f}" if float(value).is_integer() else f"{value:,.2f}"
+    if unit == '%':
+        return f"{sign}{text}%"
+    if unit in ('$', 'USD'):
+        return f"{sign}${text}"
+    return f"{sign}{text} {unit}".strip()
+
+
+def period_sort_key(period):
+    """
+    Turn a period label into a chronological sort key.
+
+    Args:
+        period: Label such as "Q3 2024", "Mar 2024", "H1 FY24" or "2023"
+
+    Returns:
+        tuple or None: (year, first month) or None if the label cannot be placed in time
+    """
+    year, month = None, 1
+    for match in _PERIOD_PART_PATTERN.finditer(period.lower()):
+        full_year, fiscal_year, short_year, quarter, half, word = match.groups()
+        if full_year:
+            year = int(full_year)
+        elif fiscal_year or short_year:
+            year = 2000 + int(fiscal_year or short_year)
+        elif quarter:
+            month = (int(quarter) - 1) * 3 + 1
+        elif half:
+            month = (int(half) - 1) * 6 + 1
+        elif word in _MONTHS:
+            month = _MONTHS[word]
+        else:
+            return None
+    return (year, month) if year is not None else None
+
+
+def _describe(kpi):
+    period = f" ({kpi['period']})" if kpi['period'] else ""
+    return f"**{kpi['name']}**{period}: {format_kpi_value(kpi['value'], kpi['unit'])}"
+
+
+def answer_kpi_question(question, kpis):
+    """
+    Answer a numeric lookup, ranking or delta question from the KPI table.
+
+    Anything the table cannot answer exactly goes to the model: a period that
+    is not in the table, or words beyond the KPI name, its periods and the
+    lookup/ranking/delta intent ("revenue target for next year", "is churn
+    good or bad?").
+
+    Args:
+        question: The user's chat message
+        kpis: Typed KPI rows from extract_kpis()
+
+    Returns:
+        str or None: A markdown answer, or None if the question needs the model
+    """
+    if not kpis:
+        return None
+
+    question_words = _words(question)
+    if _OPEN_ENDED_WORDS.intersection(question_words):
+        return None
+
+    name, name_words = _match_kpi_name(question_words, kpis)
+    periods = _match_periods(question, kpis)
+    period_words = {word for period in periods for word in _words(period)}
+    unmatched = [
+        word for word in question_words
+        if word not in _STOP_WORDS and word not in _VALUE_INTENT_WORDS and word not in name_words
+        and word not in period_words and word not in _RANKING_WORDS and word not in _DELTA_WORDS
+    ]
+    if unmatched:
+        return None
+    rows = [kpi for kpi in kpis if kpi['name'] == name] if name else []
+
+    if name and _DELTA_WORDS.intersection(question_words):
+        by_period = {kpi['period']: kpi for kpi in rows}
+        if len(periods) < 2:
+            # "How did revenue change?" compares the earliest and latest period;
+            # periods that cannot be ordered are left to the model.
+            periods = [kpi['period'] for kpi in rows if kpi['period']]
+            keys = [period_sort_key(period) for period in periods]
+            if None in keys:
+                return None
+            periods = [period for _, period in sorted(zip(keys, periods))]
+        if len(periods) >= 2 and periods[0] in by_period and periods[-1] in by_period:
+            start, end = by_period[periods[0]], by_period[periods[-1]]
+            delta = end['value'] - start['value']
+            change = f" ({delta / start['value']:+.1%})" if start['value'] else ""
+            return (
+                f"{name} went from {format_kpi_value(start['value'], start['unit'])} in {start['period']} "
+                f"to {format_kpi_value(end['value'], end['unit'])} in {end['period']}: "
+                f"a change of {format_kpi_value(delta, end['unit'])}{change}."
+            )
+        return None
+
+    ranking = [_RANKING_WORDS[word] for word in question_words if word in _RANKING_WORDS]
+    if ranking:
+        descending = ranking[0]
+        if name and len(rows) > 1:
+            candidates = rows
+        else:
+            candidates = [kpi for kpi in kpis if not periods or kpi['period'] in periods]
+            units = {kpi['unit'] for kpi in candidates}
+            if len(units) > 1:
+                # Values with different units cannot be ranked against each other.
+                return None
+        if not candidates:
+            return None
+        ranked = sorted(candidates, key=lambda kpi: kpi['value'], reverse=descending)
+        lines = [f"{position}. {_describe(kpi)}" for position, kpi in enumerate(ranked[:5], start=1)]
+        return "\n".join(lines)
+
+    if name:
+        matches = [kpi for kpi in rows if not periods or kpi['period'] in periods]
+        if matches:
+            return "\n".join(f"- {_describe(kpi)}" for kpi in matches)
+    return None
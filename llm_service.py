@@ -1,97 +1,255 @@
-import streamlit as st
+import hashlib
 import os
-import google.generativeai as genai
-import ollama
-import tempfile
+import threading
+import time
+from plugin_registry import load_plugin
+from image_codec import encode_image, MIME_TYPES
+from job_queue import notify, current_job
+from single_flight import SingleFlight, CallCancelledError
+from circuit_breaker import get_circuit_breaker
+from cassette import get_cassette
+from tracing import start_span, current_span
+from metrics import get_metrics, time_task, record_tokens
+from utils import image_content_hash
 
-def gemini_inference(instruction, images_pil):
+GEMINI_MODEL_NAME = 'gemini-1.5-flash-latest'
+MODEL_IMAGE_FORMAT = os.getenv("MODEL_IMAGE_FORMAT", "JPEG").upper()
+MODEL_IMAGE_QUALITY = 90
+MODEL_IMAGE_MAX_SIDE = int(os.getenv("MODEL_IMAGE_MAX_SIDE", 2048))
+
+# Per-call deadlines; a call past its deadline fails and counts against the backend's breaker.
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", 120))
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TIMEOUT_SECONDS", 300))
+BACKEND_NAMES = {
+    "gemini": "Gemini",
+    "ollama": "Ollama",
+}
+
+# Identical model calls in flight at the same time share one request.
+_single_flight = SingleFlight()
+
+_ollama_clients = {}
+_ollama_clients_lock = threading.Lock()
+
+get_metrics().add_gauge(
+    "kpi_model_calls_in_flight", "Model requests currently in flight.", (),
+    lambda: [((), _single_flight.stats()["in_flight"])]
+)
+
+def get_model_identifier(model_choice):
+    """Return the backend-qualified model name used to key shared analyses."""
+    if model_choice == "Gemini (Online)":
+        return f"gemini:{GEMINI_MODEL_NAME}"
+    return f"ollama:{os.getenv('OLLAMA_MODEL_NAME')}"
+
+def encode_model_image(img):
+    """Encode an image once for sending to a model backend."""
+    data = encode_image(img, MODEL_IMAGE_FORMAT, quality=MODEL_IMAGE_QUALITY, max_side=MODEL_IMAGE_MAX_SIDE)
+    span = current_span()
+    if span is not None:
+        span.add("image_bytes", len(data))
+    return data
+
+def get_ollama_client():
+    """Return the shared Ollama client for the configured host, with the call deadline applied."""
+    host = os.getenv("OLLAMA_API_URL", "http://localhost:11434")
+    with _ollama_clients_lock:
+        client = _ollama_clients.get(host)
+        if client is None:
+            client = load_plugin("ollama").Client(host=host, timeout=OLLAMA_TIMEOUT_SECONDS)
+            _ollama_clients[host] = client
+        return client
+
+def get_gemini_model(api_key):
+    """
+    Configure the Gemini client and return the model.
+
+    GEMINI_API_ENDPOINT points the client at another server over REST, such as
+    the fake model server used by benchmark.py.
+    """
+    genai = load_plugin("gemini")
+    endpoint = os.getenv("GEMINI_API_ENDPOINT")
+    if endpoint:
+        genai.configure(api_key=api_key, transport="rest", client_options={"api_endpoint": endpoint})
+    else:
+        genai.configure(api_key=api_key)
+    return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+def get_backend_statuses():
+    """
+    Get the circuit breaker status of every model backend.
+
+    Returns:
+        list: [{'name', 'state', 'failures', 'retry_in', 'last_error'}, ...]
+    """
+    return [get_circuit_breaker(name).status() for name in BACKEND_NAMES.values()]
+
+def _caller_cancelled():
+    job = current_job()
+    return job is not None and job.cancelled
+
+def invoke_model(backend, model_name, prompt, images_pil, call, task):
+    """
+    Run a model call, sharing it with identical calls already in flight.
+
+    In cassette record mode the response is saved under the request
+    fingerprint; in replay mode it is answered from the cassette and the
+    backend is never called.
+
+    Args:
+        backend: "gemini" or "ollama"
+        model_name: Model the call goes to
+        prompt: Prompt text
+        images_pil: PIL images sent with the prompt (may be empty)
+        call: Callable with no arguments performing the request
+        task: Metrics label of what the call is for ("validation", "analysis", "chat", ...)
+
+    Returns:
+        The call's result, or None if this caller's job was cancelled while waiting
+
+    Raises:
+        CircuitOpenError: If the backend's breaker is open
+        CassetteMissError: If replaying and the request was never recorded
+    """
+    digest = hashlib.sha256()
+    for part in (backend, model_name or "", prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    for img in images_pil or []:
+        digest.update(image_content_hash(img).encode("utf-8"))
+    key = digest.hexdigest()
+    breaker = get_circuit_breaker(BACKEND_NAMES[backend])
+    cassette = get_cassette()
+    try:
+        with start_span(f"model.{backend}", backend=backend, model=model_name, task=task, prompt_chars=len(prompt),
+                        image_count=len(images_pil or [])) as span:
+            span.set("shared", True)
+
+            def lead():
+                span.set("shared", False)
+                with time_task(task, backend):
+                    if cassette.replaying:
+                        span.set("cassette", "replay")
+                        return cassette.replay(key)
+                    start = time.perf_counter()
+                    result = breaker.call(call)
+                    elapsed = time.perf_counter() - start
+                if cassette.recording and result is not None:
+                    cassette.record(key, backend, model_name, task, result, elapsed)
+                if span.attributes.get("image_bytes"):
+                    get_metrics().image_bytes.inc(span.attributes["image_bytes"], backend=backend)
+                return result
+
+            result = _single_flight.do(key, lead, cancelled=_caller_cancelled)
+            if span.attributes["shared"]:
+                get_metrics().collapsed.inc(backend=backend, task=task)
+            span.set("response_chars", len(result or ""))
+            return result
+    except CallCancelledError:
+        return None
+
+def record_gemini_usage(response):
+    """Add the token counts of a Gemini response to the metrics."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        record_tokens("gemini", getattr(usage, "prompt_token_count", 0), getattr(usage, "candidates_token_count", 0))
+
+def get_model_call_stats():
+    """
+    Get de-duplication counters for model calls in this process.
+
+    Returns:
+        dict: {'calls', 'executed', 'collapsed', 'cancelled', 'max_followers', 'in_flight', 'collapse_rate'}
+    """
+    return _single_flight.stats()
+
+def gemini_inference(instruction, images_pil, task="analysis"):
     """
     Performs analysis inference using a Gemini Vision model via API.
     """
     try:
         api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            st.error("Gemini API key not found. Please set it in your environment.")
+        if not api_key and not get_cassette().replaying:
+            notify("error", "Gemini API key not found. Please set it in your environment.")
             return None
 
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
+        def call():
+            model = get_gemini_model(api_key)
+
+            prompt_parts = [instruction]
+            if images_pil:
+                for img in images_pil:
+                    prompt_parts.append({"mime_type": MIME_TYPES[MODEL_IMAGE_FORMAT], "data": encode_model_image(img)})
 
-        prompt_parts = [instruction]
-        if images_pil:
-            for img in images_pil:
-                prompt_parts.append(img)
+            response = model.generate_content(prompt_parts, request_options={"timeout": GEMINI_TIMEOUT_SECONDS})
+            record_gemini_usage(response)
+            return response.text
 
-        response = model.generate_content(prompt_parts)
-        return response.text
+        return invoke_model("gemini", GEMINI_MODEL_NAME, instruction, images_pil, call, task)
     except Exception as e:
-        st.error(f"Gemini API Error: {e}")
+        notify("error", f"Gemini API Error: {e}")
         return None
 
-def ollama_inference(model_name, instruction, images_pil):
+def ollama_inference(model_name, instruction, images_pil, task="analysis"):
     """
     Performs analysis inference using a local Ollama model.
     """
     try:
-        messages = [
-            {
-                'role': 'user',
-                'content': instruction,
-                'images': [img.filename for img in images_pil] # Note: Ollama expects image paths
-            }
-        ]
-        
-        # Save images temporarily for Ollama
-        temp_dir = tempfile.mkdtemp()
-        for i, img in enumerate(images_pil):
-            img_path = os.path.join(temp_dir, f"image_{i}.jpg")
-            img.save(img_path)
-            messages[0]['images'][i] = img_path
-        
-        client = ollama.Client(host=os.getenv("OLLAMA_API_URL", "http://localhost:11434"))
-        response = client.chat(model=model_name, messages=messages)
-        
-        # Clean up temporary files
-        for f in os.listdir(temp_dir):
-            os.remove(os.path.join(temp_dir, f))
-        os.rmdir(temp_dir)
-        
-        return response['message']['content']
+        def call():
+            messages = [
+                {
+                    'role': 'user',
+                    'content': instruction,
+                    'images': [encode_model_image(img) for img in images_pil]
+                }
+            ]
+
+            response = get_ollama_client().chat(model=model_name, messages=messages)
+            record_tokens("ollama", response.get('prompt_eval_count'), response.get('eval_count'))
+
+            return response['message']['content']
+
+        return invoke_model("ollama", model_name, instruction, images_pil, call, task)
     except Exception as e:
-        st.error(f"Ollama Error: {e}")
-        st.warning("Please ensure Ollama is running and the model is pulled.")
+        notify("error", f"Ollama Error: {e}")
+        notify("warning", "Please ensure Ollama is running and the model is pulled.")
         return None
     
-def gemini_chat_inference(chat_prompt):
+def gemini_chat_inference(chat_prompt, task="chat"):
     """
     Text-only chat inference using Gemini model.
     """
     try:
         api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            st.error("Gemini API key not found.")
+        if not api_key and not get_cassette().replaying:
+            notify("error", "Gemini API key not found.")
             return None
 
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-        
-        response = model.generate_content(chat_prompt)
-        return response.text
+        def call():
+            model = get_gemini_model(api_key)
+
+            response = model.generate_content(chat_prompt, request_options={"timeout": GEMINI_TIMEOUT_SECONDS})
+            record_gemini_usage(response)
+            return response.text
+
+        return invoke_model("gemini", GEMINI_MODEL_NAME, chat_prompt, [], call, task)
     except Exception as e:
-        st.error(f"Gemini Chat Error: {e}")
+        notify("error", f"Gemini Chat Error: {e}")
         return None
 
-def ollama_chat_inference(model_name, chat_prompt):
+def ollama_chat_inference(model_name, chat_prompt, task="chat"):
     """
     Text-only chat inference using Ollama model.
     """
     try:
-        client = ollama.Client(host=os.getenv("OLLAMA_API_URL", "http://localhost:11434"))
-        
-        messages = [{"role": "user", "content": chat_prompt}]
-        response = client.chat(model=model_name, messages=messages)
-        
-        return response['message']['content']
+        def call():
+            messages = [{"role": "user", "content": chat_prompt}]
+            response = get_ollama_client().chat(model=model_name, messages=messages)
+            record_tokens("ollama", response.get('prompt_eval_count'), response.get('eval_count'))
+
+            return response['message']['content']
+
+        return invoke_model("ollama", model_name, chat_prompt, [], call, task)
     except Exception as e:
-        st.error(f"Ollama Chat Error: {e}")
+        notify("error", f"Ollama Chat Error: {e}")
         return None
\ No newline at end of file
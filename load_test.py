@@ -0,0 +1,333 @@
+"""
+Load Test Module
+
+This module simulates analysts using the Streamlit app at the same time, to
+size a deployment. Each simulated user is a headless app session (Streamlit's
+AppTest) that loads the page, analyzes a dashboard, chats about it, compares
+two dashboards and chats about the comparison, against the fake model server
+or a recorded cassette. The user count is ramped up in stages; each stage
+reports latency percentiles and error rates per flow, the size of each
+session's st.session_state and the process's resident memory.
+
+Usage:
+    python load_test.py --users 1,4,8,16 --latency 1.0 --tokens-per-second 30
+    python load_test.py --users 8 --replay-cassette load.jsonl --output load.json
+
+Users go through the real widgets: radio, file uploader, objective, button
+and chat input. While a background job runs, the job queue is polled every
+JOB_POLL_SECONDS and the page is rerun once the job has finished, as the
+in-page job poller does.
+"""
+
+import argparse
+import json
+import logging
+import os
+import pickle
+import resource
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO
+
+from benchmark import CHAT_MESSAGES, MODEL_CHOICES, OBJECTIVE, configure_environment, percentile
+from fake_model_server import add_behavior_arguments, behavior_from_arguments, start_fake_server
+from synthetic_dashboards import make_dashboard
+
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+FLOWS = ("page_load", "summary", "chat", "comparison", "comparison_chat")
+COMPARISON_QUESTION = "Which dashboard is doing better, and why?"
+
+
+def share_app_test_runtime():
+    """
+    Let AppTest sessions run side by side in this process.
+
+    AppTest is built for one test at a time. Every run installs a fresh mock
+    runtime as the process-wide Runtime instance and patches the app-testing
+    config flag, undoes both when the run ends, and compiles the script anew.
+    Concurrent sessions would undo these under each other's running scripts.
+    Instead, every session shares one runtime, one config override and one
+    script cache, as sessions do in a real server process.
+    """
+    from contextlib import nullcontext
+    from unittest.mock import MagicMock
+
+    from streamlit import config
+
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    runtime.bidi_component_registry = BidiComponentManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+    app_test.patch_config_options = lambda overrides: nullcontext()
+
+    script_cache = ScriptCache()
+    app_test.ScriptCache = lambda: script_cache
+    local_script_runner.ScriptCache = lambda: script_cache
+
+
+def resident_memory_mb():
+    """Current resident set size of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def session_state_bytes(at):
+    """Approximate memory held by a session's st.session_state, by pickled size per key."""
+    total = 0
+    for value in at.session_state.to_dict().values():
+        try:
+            total += len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            total += sys.getsizeof(value)
+    return total
+
+
+def png_upload(image, filename):
+    """Return an image as the (filename, content, mime type) an AppTest file uploader takes."""
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return filename, buffer.getvalue(), "image/png"
+
+
+class SimulatedUser:
+    """One analyst driving a headless app session through every flow."""
+
+    def __init__(self, user_id, model_choice, chats, timeout):
+        self.user_id = user_id
+        self.model_choice = model_choice
+        self.chats = chats
+        self.timeout = timeout
+        self.samples = []  # (flow, seconds, error or None)
+        self.session_bytes = 0
+        self.at = None
+
+    def _errors(self):
+        if not self.at.main.children:
+            return "The page did not render."
+        messages = [element.value for element in self.at.exception] + [element.value for element in self.at.error]
+        return "; ".join(str(message)[:200] for message in messages) or None
+
+    def _timed(self, flow, action):
+        start = time.perf_counter()
+        try:
+            error = action()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.samples.append((flow, time.perf_counter() - start, error))
+        return error is None
+
+    def _click(self, label):
+        next(button for button in self.at.button if button.label == label).click().run()
+
+    def _wait_for_jobs(self, kind):
+        """Wait for the session's jobs to finish, then rerun the page so their results are applied."""
+        import app
+        from job_queue import FINISHED_STATES, get_job_queue
+
+        # Empty when the job finished before the rerun that followed the click.
+        job_ids = list(self.at.session_state["active_jobs"])
+        deadline = time.monotonic() + self.timeout
+        while not all(get_job_queue().get(job_id) is None or get_job_queue().get(job_id).status in FINISHED_STATES
+                      for job_id in job_ids):
+            if time.monotonic() > deadline:
+                for job_id in job_ids:
+                    get_job_queue().cancel(job_id)
+                return f"The {kind} job did not finish within {self.timeout:.0f}s."
+            time.sleep(app.JOB_POLL_SECONDS)
+        self.at.run()
+        return self._errors()
+
+    def _chat(self, message):
+        history_length = len(self.at.chat_message)
+        self.at.chat_input[0].set_value(message).run()
+        if self._errors():
+            return self._errors()
+        if len(self.at.chat_message) < history_length + 2:
+            return "No chat response was shown."
+        return None
+
+    def _page_load(self):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+        self.at.run()
+        return self._errors()
+
+    def _summary(self):
+        self.at.radio(key="single_model_choice").set_value(self.model_choice)
+        self.at.file_uploader[0].set_value(png_upload(make_dashboard(self.user_id), f"user_{self.user_id}.png"))
+        self.at.text_area[0].set_value(OBJECTIVE)
+        self._click("Generate Summary")
+        error = self._wait_for_jobs("summary")
+        if error is None and not self.at.session_state["current_session"]:
+            error = "The analysis was not shown."
+        return error
+
+    def _comparison(self):
+        self.at.radio(key="comparison_model_choice").set_value(self.model_choice)
+        self.at.file_uploader(key="comparison_uploader").set_value([
+            png_upload(make_dashboard(1_000_000 * offset + self.user_id), f"user_{self.user_id}_{offset}.png")
+            for offset in (1, 2)
+        ])
+        self.at.text_area(key="comparison_objective").set_value(OBJECTIVE).run()
+        self._click("Compare Dashboards")
+        error = self._wait_for_jobs("comparison")
+        if error is None and not self.at.session_state["comparison_analysis"]:
+            error = "The comparison was not shown."
+        return error
+
+    def run(self):
+        """Go through the flows in order, stopping at the first flow that leaves no page to continue on."""
+        if not self._timed("page_load", self._page_load):
+            return
+        if self._timed("summary", self._summary):
+            for index in range(self.chats):
+                message = f"{CHAT_MESSAGES[index % len(CHAT_MESSAGES)]} (user {self.user_id}, question {index})"
+                self._timed("chat", lambda: self._chat(message))
+        if self._timed("comparison", self._comparison):
+            self._timed("comparison_chat", lambda: self._chat(f"{COMPARISON_QUESTION} (user {self.user_id})"))
+        self.session_bytes = session_state_bytes(self.at)
+
+
+def run_stage(users, first_user_id, model_choice, chats, ramp_seconds, timeout):
+    """
+    Run one ramp stage: start `users` simulated users spread over ramp_seconds and wait for all of them.
+
+    Returns:
+        dict: Per-flow latency and error rate, per-session memory and process memory
+    """
+    rss_before = resident_memory_mb()
+    simulated = [SimulatedUser(first_user_id + index, model_choice, chats, timeout) for index in range(users)]
+    threads = [threading.Thread(target=user.run, name=f"user-{user.user_id}", daemon=True) for user in simulated]
+    start = time.perf_counter()
+    for index, thread in enumerate(threads):
+        thread.start()
+        if index < len(threads) - 1:
+            time.sleep(ramp_seconds / users)
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    flows = {}
+    for flow in FLOWS:
+        samples = [(seconds, error) for user in simulated for name, seconds, error in user.samples if name == flow]
+        if not samples:
+            continue
+        latencies = [seconds * 1000 for seconds, error in samples if error is None]
+        errors = [error for _, error in samples if error is not None]
+        flows[flow] = {
+            "count": len(samples),
+            "p50_ms": round(percentile(latencies, 0.50), 1),
+            "p95_ms": round(percentile(latencies, 0.95), 1),
+            "p99_ms": round(percentile(latencies, 0.99), 1),
+            "error_rate": round(len(errors) / len(samples), 4),
+            "sample_errors": sorted(set(errors))[:3],
+        }
+    session_sizes = [user.session_bytes for user in simulated if user.session_bytes]
+    rss_after = resident_memory_mb()
+    return {
+        "users": users,
+        "elapsed_s": round(elapsed, 2),
+        "flows": flows,
+        "session_state_mb_avg": round(sum(session_sizes) / len(session_sizes) / 1024 / 1024, 2) if session_sizes else 0.0,
+        "session_state_mb_max": round(max(session_sizes) / 1024 / 1024, 2) if session_sizes else 0.0,
+        "rss_mb": round(rss_after, 1),
+        "rss_growth_per_user_mb": round((rss_after - rss_before) / users, 2),
+    }
+
+
+def print_stage(stage):
+    print(
+        f"\n{stage['users']} user(s) in {stage['elapsed_s']}s · session state avg {stage['session_state_mb_avg']} MB, "
+        f"max {stage['session_state_mb_max']} MB · RSS {stage['rss_mb']} MB "
+        f"({stage['rss_growth_per_user_mb']:+} MB per user)"
+    )
+    print(f"  {'flow':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for flow, summary in stage["flows"].items():
+        print(
+            f"  {flow:<18}{summary['count']:>7}{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}"
+            f"{summary['p99_ms']:>10.1f}{summary['error_rate']:>8.1%}"
+        )
+        for error in summary["sample_errors"]:
+            print(f"      {error[:100]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Streamlit app with concurrent headless sessions.")
+    parser.add_argument("--users", default="1,2,4,8", help="Comma-separated user counts, one ramp stage each")
+    parser.add_argument("--ramp-seconds", type=float, default=5.0, help="Time over which a stage's users are started")
+    parser.add_argument("--chats", type=int, default=2, help="Chat messages per user after the analysis")
+    parser.add_argument("--backend", choices=sorted(MODEL_CHOICES), default="ollama")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds a single flow may take")
+    parser.add_argument("--job-workers", type=int, help="Background job workers (default JOB_WORKERS)")
+    parser.add_argument("--output", help="Write the results as JSON")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record-cassette", help="Record the model responses of this run to a cassette")
+    cassette.add_argument("--replay-cassette", help="Answer model calls from a cassette recorded with the same options")
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+
+    stages = [int(count) for count in args.users.split(",") if count.strip()]
+    share_app_test_runtime()
+    # User threads read session state outside a script run, which Streamlit warns about.
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+        lambda record: "missing ScriptRunContext" not in record.getMessage()
+    )
+    behavior = behavior_from_arguments(args)
+    server = start_fake_server(behavior)
+    work_dir = tempfile.mkdtemp(prefix="kpi_load_test_")
+    if args.record_cassette:
+        configure_environment(server.url, work_dir, "record", args.record_cassette)
+    elif args.replay_cassette:
+        configure_environment(server.url, work_dir, "replay", args.replay_cassette)
+    else:
+        configure_environment(server.url, work_dir)
+    if args.job_workers:
+        os.environ["JOB_WORKERS"] = str(args.job_workers)
+
+    results = []
+    first_user_id = 0
+    try:
+        for users in stages:
+            stage = run_stage(users, first_user_id, MODEL_CHOICES[args.backend], args.chats, args.ramp_seconds, args.timeout)
+            first_user_id += users
+            results.append(stage)
+            print_stage(stage)
+    finally:
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "backend": args.backend,
+                "server": vars(behavior),
+                "cassette": "replay" if args.replay_cassette else None,
+                "requests_served": server.stats(),
+                "stages": results,
+            }, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Metrics Module
+
+This module aggregates operational metrics for the whole process: request
+counts and latency histograms per task and backend, token and image-byte
+accounting per backend, and queue depths. Metrics are rendered in the
+Prometheus text exposition format, served at /metrics by the API server and,
+when METRICS_PORT is set, by a small standalone endpoint next to the app.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Seconds; model calls range from sub-second cache-warm chats to minutes-long local vision runs.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_registry = None
+_registry_lock = threading.Lock()
+_server = None
+_server_lock = threading.Lock()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, tuple(zip(self.labelnames, key)), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                labels = tuple(zip(self.labelnames, key))
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", labels + (("le", _format_value(bound)),), count))
+                samples.append((f"{self.name}_sum", labels, total))
+                samples.append((f"{self.name}_count", labels, counts[-1]))
+        return samples
+
+
+class Gauge:
+    """Gauge whose samples are read from a callback when metrics are rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames, read):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._read = read
+
+    def samples(self):
+        try:
+            values = self._read()
+        except Exception:
+            return []
+        return [(self.name, tuple(zip(self.labelnames, key)), value) for key, value in values]
+
+
+class MetricsRegistry:
+    """The application's metrics."""
+
+    def __init__(self):
+        self.requests = Counter(
+            "kpi_requests_total", "Model calls and local tasks by task, backend and outcome.",
+            ("task", "backend", "outcome")
+        )
+        self.latency = Histogram(
+            "kpi_request_duration_seconds", "Latency of model calls and local tasks.", ("task", "backend")
+        )
+        self.tokens = Counter("kpi_model_tokens_total", "Tokens reported by the model backends.", ("backend", "direction"))
+        self.image_bytes = Counter("kpi_model_image_bytes_total", "Encoded image bytes sent to the model backends.", ("backend",))
+        self.collapsed = Counter(
+            "kpi_model_collapsed_calls_total", "Model calls served by an identical call already in flight.", ("backend", "task")
+        )
+        self.jobs = Counter("kpi_jobs_total", "Finished background jobs by kind and status.", ("kind", "status"))
+        self.job_latency = Histogram("kpi_job_duration_seconds", "Run time of background jobs.", ("kind",))
+        self._metrics = [self.requests, self.latency, self.tokens, self.image_bytes, self.collapsed, self.jobs, self.job_latency]
+
+    def add_gauge(self, name, help_text, labelnames, read):
+        """
+        Register a gauge read when metrics are rendered.
+
+        Args:
+            name: Metric name
+            help_text: HELP line
+            labelnames: Label names
+            read: Callable returning [(label values tuple, value), ...]
+        """
+        self._metrics.append(Gauge(name, help_text, labelnames, read))
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def get_metrics():
+    """
+    Get the process-wide metrics registry.
+
+    Returns:
+        MetricsRegistry: Registry shared by every session, job and API request in this process
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry()
+    return _registry
+
+
+def classify_error(error):
+    """Map an exception to a request outcome label: "timeout", "rejected" or "error"."""
+    name = type(error).__name__
+    if "Timeout" in name or "DeadlineExceeded" in name:
+        return "timeout"
+    if name == "CircuitOpenError":
+        return "rejected"
+    return "error"
+
+
+@contextmanager
+def time_task(task, backend="local"):
+    """
+    Count and time a task; exceptions are counted by outcome and re-raised.
+
+    Args:
+        task: Task label ("validation", "analysis", "pdf", ...)
+        backend: Backend label ("gemini", "ollama" or "local")
+    """
+    metrics = get_metrics()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        metrics.requests.inc(task=task, backend=backend, outcome=classify_error(e))
+        metrics.latency.observe(time.perf_counter() - start, task=task, backend=backend)
+        raise
+    metrics.requests.inc(task=task, backend=backend, outcome="success")
+    metrics.latency.observe(time.perf_counter() - start, task=task, backend=backend)
+
+
+def record_tokens(backend, input_tokens, output_tokens):
+    """Add the token counts a backend reported for one call; missing counts are skipped."""
+    metrics = get_metrics()
+    if input_tokens:
+        metrics.tokens.inc(int(input_tokens), backend=backend, direction="input")
+    if output_tokens:
+        metrics.tokens.inc(int(output_tokens), backend=backend, direction="output")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port=None, host=None):
+    """
+    Serve /metrics on a background thread, once per process.
+
+    Args:
+        port: Port to listen on (default METRICS_PORT; nothing is started when unset)
+        host: Interface to bind (default METRICS_HOST or 127.0.0.1)
+
+    Returns:
+        int or None: The port being served, or None when disabled
+    """
+    global _server
+    port = port or int(os.getenv("METRICS_PORT", 0) or 0)
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host or os.getenv("METRICS_HOST", "127.0.0.1"), port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server.server_address[1]
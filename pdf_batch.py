@@ -0,0 +1,149 @@
+"""
+Batch PDF Rendering Module
+
+This module renders many analysis reports in parallel across a process pool,
+writing each finished PDF straight to disk and optionally combining them into
+one bundle with a table of contents.
+
+Usage:
+    python pdf_batch.py reports.jsonl output_dir --bundle period_close.pdf
+
+Each line of the input file is a JSON object with "objective", "analysis"
+and "filename" keys.
+"""
+
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def _output_name(index, filename):
+    stem = os.path.splitext(os.path.basename(filename))[0] or "report"
+    stem = re.sub(r'[^A-Za-z0-9_.-]+', '_', stem)
+    return f"{index:04d}_{stem}_report.pdf"
+
+
+def _render_report_file(objective, analysis, filename, output_path):
+    # Imported in the worker so the parent process never needs reportlab.
+    from pdf_generator import create_pdf_report
+
+    create_pdf_report(objective, analysis, filename, output=output_path)
+    return output_path
+
+
+def _render_bundle_file(reports, output_path):
+    from pdf_generator import create_pdf_bundle
+
+    create_pdf_bundle(reports, output_path)
+    return output_path
+
+
+def render_pdf_batch(reports, output_dir, max_workers=None, bundle_path=None, on_complete=None):
+    """
+    Render many reports across a process pool.
+
+    Args:
+        reports: Iterable of (objective, analysis, filename) tuples
+        output_dir: Directory the individual PDFs are written to
+        max_workers: Number of worker processes (defaults to the CPU count)
+        bundle_path: Optional path of a combined PDF with a table of contents
+        on_complete: Optional callback(index, path) called as each PDF finishes
+
+    Returns:
+        dict: {
+            'reports': list,  # output paths in input order (None where rendering failed)
+            'bundle': str or None,
+            'errors': dict  # input index (or 'bundle') -> error message
+        }
+    """
+    reports = [tuple(report) for report in reports]
+    os.makedirs(output_dir, exist_ok=True)
+
+    paths = [None] * len(reports)
+    errors = {}
+    bundle = None
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for index, (objective, analysis, filename) in enumerate(reports):
+            output_path = os.path.join(output_dir, _output_name(index + 1, filename))
+            futures[executor.submit(_render_report_file, objective, analysis, filename, output_path)] = index
+
+        # The bundle is one document, so it renders on a single worker while
+        # the individual reports use the rest of the pool.
+        bundle_future = executor.submit(_render_bundle_file, reports, bundle_path) if bundle_path else None
+
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                paths[index] = future.result()
+            except Exception as e:
+                errors[index] = str(e)
+                continue
+            if on_complete:
+                on_complete(index, paths[index])
+
+        if bundle_future is not None:
+            try:
+                bundle = bundle_future.result()
+            except Exception as e:
+                errors["bundle"] = str(e)
+
+    return {
+        "reports": paths,
+        "bundle": bundle,
+        "errors": errors,
+    }
+
+
+def load_reports(path):
+    """
+    Read report inputs from a JSON Lines file.
+
+    Args:
+        path: Path to a file with one {"objective", "analysis", "filename"} object per line
+
+    Returns:
+        list: (objective, analysis, filename) tuples
+    """
+    reports = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            reports.append((
+                record["objective"],
+                record["analysis"],
+                record.get("filename", f"report_{line_number}"),
+            ))
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render KPI analysis reports in parallel.")
+    parser.add_argument("input", help="JSON Lines file of reports to render")
+    parser.add_argument("output_dir", help="Directory for the rendered PDFs")
+    parser.add_argument("--bundle", help="Also write a combined PDF with a table of contents")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    reports = load_reports(args.input)
+    result = render_pdf_batch(
+        reports,
+        args.output_dir,
+        max_workers=args.workers,
+        bundle_path=args.bundle,
+        on_complete=lambda index, path: print(f"[{index + 1}/{len(reports)}] {path}")
+    )
+
+    for index, error in result["errors"].items():
+        print(f"Failed to render {index}: {error}")
+    if result["bundle"]:
+        print(f"Bundle written to {result['bundle']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,226 +1,552 @@
-import streamlit as st
 import re
+from functools import lru_cache
+from xml.sax.saxutils import escape
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageTemplate, Frame, BaseDocTemplate
+from reportlab.platypus import Paragraph, Spacer, PageTemplate, Frame, BaseDocTemplate, Table, TableStyle, PageBreak, Image as ReportImage
+from reportlab.platypus.tableofcontents import TableOfContents
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.lib.colors import HexColor
+from reportlab.lib.colors import HexColor, white
 from io import BytesIO
+from image_codec import encode_image, scaled_size
+from metrics import time_task
 
-def create_pdf_report(dashboard_objective, analysis_result, filename):
-    """Create a PDF report with I-Score branding and professional formatting."""
-    
-    buffer = BytesIO()
-    
-    class LogoPageTemplate(PageTemplate):
-        def __init__(self, id, frames, pagesize=letter):
-            PageTemplate.__init__(self, id, frames, pagesize=pagesize)
-            
-        def beforeDrawPage(self, canvas, doc):
-            try:
-                canvas.setFillColor(HexColor('#F8F9FA'))
-                canvas.rect(40, letter[1] - 65, letter[0] - 80, 55, fill=1, stroke=0)
-                
-                canvas.setFillColor(HexColor('#4F3C8F'))
-                canvas.setFont("Helvetica-Bold", 18)
-                canvas.drawString(50, letter[1] - 30, "I-SCORE")
-                
-                canvas.setFont("Helvetica", 12)
-                canvas.setFillColor(HexColor('#45BCC3'))
-                canvas.drawString(50, letter[1] - 48, "KPI Dashboard Analysis Report")
-                
-                canvas.setFillColor(HexColor('#45BCC3'))
-                canvas.rect(letter[0] - 120, letter[1] - 45, 60, 8, fill=1, stroke=0)
-                
-                canvas.setFillColor(HexColor('#4F3C8F'))
-                canvas.rect(letter[0] - 120, letter[1] - 35, 60, 4, fill=1, stroke=0)
-                
-                canvas.setStrokeColor(HexColor('#45BCC3'))
-                canvas.setLineWidth(3)
-                canvas.line(40, letter[1] - 68, letter[0] - 40, letter[1] - 68)
-                
-                canvas.setFillColor(HexColor('#495057'))
-                canvas.setFont("Helvetica", 10)
-                page_num = canvas.getPageNumber()
-                canvas.drawRightString(letter[0] - 50, letter[1] - 25, f"Page {page_num}")
-                
-            except Exception as e:
-                canvas.setFillColor(HexColor('#4F3C8F'))
-                canvas.setFont("Helvetica-Bold", 16)
-                canvas.drawString(50, letter[1] - 30, "I-SCORE KPI Dashboard Analyzer")
-                canvas.setStrokeColor(HexColor('#45BCC3'))
-                canvas.setLineWidth(2)
-                canvas.line(50, letter[1] - 40, letter[0] - 50, letter[1] - 40)
-    
-    doc = BaseDocTemplate(
-        buffer,
+ISCORE_TEAL = HexColor('#45BCC3')
+ISCORE_PURPLE = HexColor('#4F3C8F')
+ISCORE_DARK_CHARCOAL = HexColor('#4B4947')
+ISCORE_GRAY = HexColor('#495057')
+ISCORE_LIGHT_GRAY = HexColor('#F8F9FA')
+
+FRAME_WIDTH = letter[0] - 144
+LIST_INDENT_STEP = 18
+
+# Embedded dashboards are downsampled to this resolution at their printed size.
+PRINT_DPI = 150
+MAX_IMAGE_HEIGHT = 4.5 * inch
+
+# One pattern classifies every analysis line in a single match.
+_LINE_PATTERN = re.compile(
+    r'^(?P<indent>[ \t]*)(?:'
+    r'(?P<heading>#{1,6})\s+(?P<heading_text>.*?)'
+    r'|(?P<table_separator>\|?\s*:?-{3,}:?\s*(?:\|\s*:?-{3,}:?\s*)*\|?)'
+    r'|\|(?P<table_row>.*)\|'
+    r'|(?P<rule>(?P<rule_char>[*_\-])(?:[ \t]*(?P=rule_char)){2,})'
+    r'|(?P<letter>[a-z])[.)]\s+(?P<letter_text>.*)'
+    r'|(?P<number>\d+)[.)]\s+(?P<number_text>.*)'
+    r'|[*\-+•]\s+(?P<bullet_text>.*)'
+    r'|(?P<text>.*?)'
+    r')\s*$'
+)
+# Bold text may contain complete italic spans, so "**a *b***" closes the
+# bold after the italic rather than inside it.
+_INLINE_PATTERN = re.compile(
+    r'\*\*(?P<bold>(?:[^*]|\*[^\s*](?:[^*]*[^\s*])?\*|\*(?!\*))+?)\*\*'
+    r'|__(?P<bold_alt>.+?)__'
+    r'|(?<![\*\w])\*(?P<italic>[^\s*](?:.*?[^\s*])?)\*(?![\*\w])'
+    r'|`(?P<code>[^`]+)`'
+)
+_FULLY_BOLD_PATTERN = re.compile(r'^\*\*(?P<text>[^*]+)\*\*:?$')
+
+
+class LogoPageTemplate(PageTemplate):
+    def __init__(self, id, frames, pagesize=letter):
+        PageTemplate.__init__(self, id, frames, pagesize=pagesize)
+
+    def beforeDrawPage(self, canvas, doc):
+        try:
+            canvas.setFillColor(ISCORE_LIGHT_GRAY)
+            canvas.rect(40, letter[1] - 65, letter[0] - 80, 55, fill=1, stroke=0)
+
+            canvas.setFillColor(ISCORE_PURPLE)
+            canvas.setFont("Helvetica-Bold", 18)
+            canvas.drawString(50, letter[1] - 30, "I-SCORE")
+
+            canvas.setFont("Helvetica", 12)
+            canvas.setFillColor(ISCORE_TEAL)
+            canvas.drawString(50, letter[1] - 48, "KPI Dashboard Analysis Report")
+
+            canvas.setFillColor(ISCORE_TEAL)
+            canvas.rect(letter[0] - 120, letter[1] - 45, 60, 8, fill=1, stroke=0)
+
+            canvas.setFillColor(ISCORE_PURPLE)
+            canvas.rect(letter[0] - 120, letter[1] - 35, 60, 4, fill=1, stroke=0)
+
+            canvas.setStrokeColor(ISCORE_TEAL)
+            canvas.setLineWidth(3)
+            canvas.line(40, letter[1] - 68, letter[0] - 40, letter[1] - 68)
+
+            canvas.setFillColor(ISCORE_GRAY)
+            canvas.setFont("Helvetica", 10)
+            page_num = canvas.getPageNumber()
+            canvas.drawRightString(letter[0] - 50, letter[1] - 25, f"Page {page_num}")
+
+        except Exception as e:
+            canvas.setFillColor(ISCORE_PURPLE)
+            canvas.setFont("Helvetica-Bold", 16)
+            canvas.drawString(50, letter[1] - 30, "I-SCORE KPI Dashboard Analyzer")
+            canvas.setStrokeColor(ISCORE_TEAL)
+            canvas.setLineWidth(2)
+            canvas.line(50, letter[1] - 40, letter[0] - 50, letter[1] - 40)
+
+
+@lru_cache(maxsize=None)
+def get_report_styles():
+    """Build the report's paragraph styles once per process."""
+    styles = getSampleStyleSheet()
+
+    return {
+        'title': ParagraphStyle(
+            'IScorerTitle',
+            parent=styles['Title'],
+            fontSize=16,
+            fontName='Helvetica-Bold',
+            textColor=ISCORE_PURPLE,
+            spaceAfter=24,
+            spaceBefore=0,
+            alignment=1,
+            letterSpacing=0.3,
+            lineHeight=20
+        ),
+        'section_heading': ParagraphStyle(
+            'SectionHeading',
+            parent=styles['Heading1'],
+            fontSize=14,
+            fontName='Helvetica-Bold',
+            textColor=ISCORE_PURPLE,
+            spaceBefore=20,
+            spaceAfter=12,
+            leftIndent=0,
+            alignment=0
+        ),
+        'sub_heading': ParagraphStyle(
+            'SubHeading',
+            parent=styles['Heading2'],
+            fontSize=12,
+            fontName='Helvetica-Bold',
+            textColor=ISCORE_TEAL,
+            spaceBefore=12,
+            spaceAfter=6,
+            leftIndent=0,
+            alignment=0
+        ),
+        'body': ParagraphStyle(
+            'BodyText',
+            parent=styles['Normal'],
+            fontSize=12,
+            fontName='Helvetica',
+            textColor=ISCORE_DARK_CHARCOAL,
+            spaceBefore=4,
+            spaceAfter=6,
+            leftIndent=12,
+            lineHeight=16,
+            alignment=4
+        ),
+        'bullet': ParagraphStyle(
+            'Bullet',
+            parent=styles['Normal'],
+            fontSize=12,
+            fontName='Helvetica',
+            textColor=ISCORE_DARK_CHARCOAL,
+            spaceBefore=3,
+            spaceAfter=6,
+            leftIndent=24,
+            bulletIndent=12,
+            lineHeight=16,
+            alignment=4
+        ),
+        'objective': ParagraphStyle(
+            'Objective',
+            parent=styles['Normal'],
+            fontSize=12,
+            fontName='Helvetica-Oblique',
+            textColor=ISCORE_DARK_CHARCOAL,
+            spaceBefore=8,
+            spaceAfter=12,
+            leftIndent=12,
+            rightIndent=12,
+            lineHeight=16,
+            borderWidth=1,
+            borderColor=ISCORE_TEAL,
+            borderPadding=15,
+            backColor=ISCORE_LIGHT_GRAY,
+            alignment=4
+        ),
+        'image_caption': ParagraphStyle(
+            'ImageCaption',
+            parent=styles['Normal'],
+            fontSize=9,
+            fontName='Helvetica-Oblique',
+            textColor=ISCORE_GRAY,
+            alignment=1,
+            spaceBefore=4,
+            spaceAfter=12
+        ),
+        'table_header': ParagraphStyle(
+            'TableHeader',
+            parent=styles['Normal'],
+            fontSize=10,
+            fontName='Helvetica-Bold',
+            textColor=white,
+            leading=13
+        ),
+        'table_cell': ParagraphStyle(
+            'TableCell',
+            parent=styles['Normal'],
+            fontSize=10,
+            fontName='Helvetica',
+            textColor=ISCORE_DARK_CHARCOAL,
+            leading=13
+        ),
+        'bundle_entry': ParagraphStyle(
+            'BundleEntry',
+            parent=styles['Heading1'],
+            fontSize=14,
+            fontName='Helvetica-Bold',
+            textColor=ISCORE_PURPLE,
+            spaceBefore=0,
+            spaceAfter=12,
+            alignment=0
+        ),
+        'toc_entry': ParagraphStyle(
+            'TOCEntry',
+            parent=styles['Normal'],
+            fontSize=11,
+            fontName='Helvetica',
+            textColor=ISCORE_DARK_CHARCOAL,
+            leftIndent=12,
+            leading=18
+        ),
+        'footer': ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=9,
+            fontName='Helvetica',
+            textColor=ISCORE_GRAY,
+            alignment=1,
+            spaceBefore=16,
+            spaceAfter=4,
+            lineHeight=12
+        ),
+    }
+
+
+@lru_cache(maxsize=None)
+def get_list_style(depth):
+    """Return the bullet style for a list nesting depth (0 = top level)."""
+    base = get_report_styles()['bullet']
+    return ParagraphStyle(
+        f'Bullet{depth}',
+        parent=base,
+        leftIndent=base.leftIndent + depth * LIST_INDENT_STEP,
+        bulletIndent=base.bulletIndent + depth * LIST_INDENT_STEP
+    )
+
+
+@lru_cache(maxsize=None)
+def _get_table_style(has_header):
+    first_body_row = 1 if has_header else 0
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), ISCORE_PURPLE if has_header else white),
+        ('ROWBACKGROUNDS', (0, first_body_row), (-1, -1), [white, ISCORE_LIGHT_GRAY]),
+        ('GRID', (0, 0), (-1, -1), 0.5, ISCORE_TEAL),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ])
+
+
+def _format_spans(text):
+    def replace(match):
+        if match.group('bold') is not None:
+            return f"<b>{_format_spans(match.group('bold'))}</b>"
+        if match.group('bold_alt') is not None:
+            return f"<b>{_format_spans(match.group('bold_alt'))}</b>"
+        if match.group('italic') is not None:
+            return f"<i>{_format_spans(match.group('italic'))}</i>"
+        return f"<font face=\"Courier\">{match.group('code')}</font>"
+
+    return _INLINE_PATTERN.sub(replace, text)
+
+
+def format_inline(text):
+    """Escape text for reportlab and convert inline markdown to its markup."""
+    return _format_spans(escape(text.strip()))
+
+
+def _indent_width(indent):
+    return len(indent.replace('\t', '    '))
+
+
+def parse_markdown(text):
+    """
+    Parse analysis markdown into a flat list of block nodes in a single pass.
+
+    Args:
+        text: Markdown text returned by the model
+
+    Returns:
+        list: Node dicts, each with a 'type' of 'blank', 'heading', 'subheading',
+              'paragraph', 'numbered', 'list_item' or 'table'
+    """
+    nodes = []
+    list_indents = []
+    table = None
+
+    for raw_line in text.split('\n'):
+        match = _LINE_PATTERN.match(raw_line)
+
+        if match.group('table_row') is not None:
+            cells = [cell.strip() for cell in match.group('table_row').split('|')]
+            if table is None:
+                table = {'type': 'table', 'rows': [], 'header': False}
+                nodes.append(table)
+            table['rows'].append(cells)
+            continue
+        if match.group('table_separator') is not None and table is not None and len(table['rows']) == 1:
+            # A separator directly under the first row marks it as the header
+            table['header'] = True
+            continue
+        table = None
+        if match.group('table_separator') is not None or match.group('rule') is not None:
+            # Anywhere else it is a horizontal rule and is dropped
+            list_indents = []
+            continue
+
+        if match.group('text') == '':
+            nodes.append({'type': 'blank'})
+            continue
+
+        indent = _indent_width(match.group('indent'))
+        is_nested_number = match.group('number') is not None and indent > 0
+        if match.group('bullet_text') is not None or is_nested_number:
+            while list_indents and list_indents[-1] > indent:
+                list_indents.pop()
+            if not list_indents or list_indents[-1] < indent:
+                list_indents.append(indent)
+            nodes.append({
+                'type': 'list_item',
+                'depth': len(list_indents) - 1,
+                'marker': f"{match.group('number')}." if is_nested_number else '•',
+                'text': match.group('number_text') if is_nested_number else match.group('bullet_text'),
+            })
+            continue
+        list_indents = []
+
+        if match.group('heading') is not None:
+            level = len(match.group('heading'))
+            nodes.append({'type': 'heading' if level <= 2 else 'subheading', 'text': match.group('heading_text')})
+        elif match.group('letter') is not None:
+            nodes.append({'type': 'subheading', 'text': f"{match.group('letter')}. {match.group('letter_text')}"})
+        elif match.group('number') is not None:
+            nodes.append({'type': 'numbered', 'number': match.group('number'), 'text': match.group('number_text')})
+            # Indented bullets that follow belong to this item
+            list_indents = [0]
+        else:
+            line = match.group('text')
+            bold = _FULLY_BOLD_PATTERN.match(line)
+            if bold:
+                nodes.append({'type': 'subheading', 'text': bold.group('text')})
+            else:
+                nodes.append({'type': 'paragraph', 'text': line})
+
+    return nodes
+
+
+def _compile_table(node, styles):
+    rows = node['rows']
+    column_count = max(len(row) for row in rows)
+    data = []
+    for row_index, row in enumerate(rows):
+        style = styles['table_header'] if node['header'] and row_index == 0 else styles['table_cell']
+        cells = row + [''] * (column_count - len(row))
+        data.append([Paragraph(format_inline(cell), style) for cell in cells])
+
+    table = Table(
+        data,
+        colWidths=[FRAME_WIDTH / column_count] * column_count,
+        repeatRows=1 if node['header'] else 0
+    )
+    table.setStyle(_get_table_style(node['header']))
+    return table
+
+
+def markdown_to_flowables(text):
+    """
+    Compile analysis markdown into reportlab flowables.
+
+    Args:
+        text: Markdown text returned by the model
+
+    Returns:
+        list: Flowables ready to append to a report story
+    """
+    styles = get_report_styles()
+    flowables = []
+
+    for node in parse_markdown(text):
+        node_type = node['type']
+        if node_type == 'blank':
+            flowables.append(Spacer(1, 6))
+        elif node_type == 'heading':
+            flowables.append(Paragraph(format_inline(node['text']), styles['section_heading']))
+        elif node_type == 'subheading':
+            flowables.append(Paragraph(format_inline(node['text']), styles['sub_heading']))
+        elif node_type == 'numbered':
+            title, separator, description = node['text'].replace('**', '').partition(':')
+            if separator:
+                text = f"<b>{node['number']}. {format_inline(title)}:</b><br />{format_inline(description)}"
+            else:
+                text = f"{node['number']}. {format_inline(node['text'])}"
+            flowables.append(Paragraph(text, styles['body']))
+        elif node_type == 'list_item':
+            flowables.append(Paragraph(
+                format_inline(node['text']),
+                get_list_style(node['depth']),
+                bulletText=node['marker']
+            ))
+        elif node_type == 'table':
+            flowables.append(_compile_table(node, styles))
+            flowables.append(Spacer(1, 6))
+        else:
+            flowables.append(Paragraph(format_inline(node['text']), styles['body']))
+
+    return flowables
+
+
+def encode_report_image(image):
+    """
+    Downsample an image to print resolution and JPEG-encode it.
+
+    Encodings are memoized by the image codec, so regenerating a report (or
+    embedding the same dashboard twice) does not re-encode it. Identical
+    encoded bytes are also written to the PDF as a single shared image object.
+
+    Args:
+        image: PIL Image object
+
+    Returns:
+        tuple: (jpeg_bytes, (width_px, height_px))
+    """
+    width_px, height_px, max_side = scaled_size(
+        image.size,
+        int(FRAME_WIDTH / 72 * PRINT_DPI),
+        int(MAX_IMAGE_HEIGHT / 72 * PRINT_DPI)
+    )
+    return encode_image(image, "JPEG", quality=85, max_side=max_side), (width_px, height_px)
+
+
+def _image_flowables(image, caption, styles):
+    data, (width_px, height_px) = encode_report_image(image)
+    scale = min(FRAME_WIDTH / width_px, MAX_IMAGE_HEIGHT / height_px)
+    flowables = [ReportImage(BytesIO(data), width=width_px * scale, height=height_px * scale)]
+    if caption:
+        flowables.append(Paragraph(escape(caption), styles['image_caption']))
+    return flowables
+
+
+def build_report_story(dashboard_objective, analysis_result, images=None):
+    """Build the list of flowables that make up one analysis report."""
+    styles = get_report_styles()
+    story = []
+
+    story.append(Paragraph("I-SCORE KPI Dashboard Analysis Report", styles['title']))
+    story.append(Spacer(1, 0.3 * inch))
+
+    story.append(Paragraph("1. Dashboard Objective", styles['section_heading']))
+    story.append(Paragraph(escape(dashboard_objective), styles['objective']))
+    story.append(Spacer(1, 0.2 * inch))
+
+    for image, caption in images or []:
+        story.extend(_image_flowables(image, caption, styles))
+
+    story.append(Paragraph("2. AI Analysis Results", styles['section_heading']))
+    story.append(Spacer(1, 0.1 * inch))
+
+    story.extend(markdown_to_flowables(analysis_result))
+
+    story.append(Spacer(1, 0.3 * inch))
+    story.append(Paragraph("Generated by I-Score KPI Dashboard Analyzer | Powered by Gemini Pro Vision Model", styles['footer']))
+    return story
+
+
+class BundleDocTemplate(BaseDocTemplate):
+    """Document template that feeds bundle entry headings into the table of contents."""
+
+    def afterFlowable(self, flowable):
+        if isinstance(flowable, Paragraph) and flowable.style.name == 'BundleEntry':
+            title = flowable.getPlainText()
+            # Entry headings are numbered, so the title is a stable bookmark key
+            # across multiBuild passes.
+            key = f"bundle-entry-{title}"
+            self.canv.bookmarkPage(key)
+            self.canv.addOutlineEntry(title, key, level=0)
+            self.notify('TOCEntry', (0, title, self.page, key))
+
+
+def _create_doc_template(output, doc_class=BaseDocTemplate):
+    doc = doc_class(
+        output,
         pagesize=letter,
         rightMargin=72,
         leftMargin=72,
         topMargin=72,
         bottomMargin=72
     )
-    
+
     frame = Frame(
-        72, 72, letter[0] - 144, letter[1] - 144,
+        72, 72, FRAME_WIDTH, letter[1] - 144,
         leftPadding=0, bottomPadding=0, rightPadding=0, topPadding=0
     )
-    
+
     doc.addPageTemplates([LogoPageTemplate(id='logo_template', frames=[frame])])
-    
-    styles = getSampleStyleSheet()
-    story = []
-    
-    iscore_teal = HexColor('#45BCC3')
-    iscore_purple = HexColor('#4F3C8F')
-    iscore_dark_charcoal = HexColor('#4B4947')
-    iscore_gray = HexColor('#495057')
-    
-    title_style = ParagraphStyle(
-        'IScorerTitle',
-        parent=styles['Title'],
-        fontSize=16,
-        fontName='Helvetica-Bold',
-        textColor=iscore_purple,
-        spaceAfter=24,
-        spaceBefore=0,
-        alignment=1,
-        letterSpacing=0.3,
-        lineHeight=20
-    )
-    
-    section_heading_style = ParagraphStyle(
-        'SectionHeading',
-        parent=styles['Heading1'],
-        fontSize=14,
-        fontName='Helvetica-Bold',
-        textColor=iscore_purple,
-        spaceBefore=20,
-        spaceAfter=12,
-        leftIndent=0,
-        alignment=0
-    )
-    
-    sub_heading_style = ParagraphStyle(
-        'SubHeading',
-        parent=styles['Heading2'],
-        fontSize=12,
-        fontName='Helvetica-Bold',
-        textColor=iscore_teal,
-        spaceBefore=12,
-        spaceAfter=6,
-        leftIndent=0,
-        alignment=0
-    )
-    
-    body_style = ParagraphStyle(
-        'BodyText',
-        parent=styles['Normal'],
-        fontSize=12,
-        fontName='Helvetica',
-        textColor=iscore_dark_charcoal,
-        spaceBefore=4,
-        spaceAfter=6,
-        leftIndent=12,
-        lineHeight=16,
-        alignment=4
-    )
-    
-    bullet_style = ParagraphStyle(
-        'Bullet',
-        parent=styles['Normal'],
-        fontSize=12,
-        fontName='Helvetica',
-        textColor=iscore_dark_charcoal,
-        spaceBefore=3,
-        spaceAfter=6,
-        leftIndent=24,
-        bulletIndent=12,
-        lineHeight=16,
-        alignment=4
-    )
-    
-    objective_style = ParagraphStyle(
-        'Objective',
-        parent=styles['Normal'],
-        fontSize=12,
-        fontName='Helvetica-Oblique',
-        textColor=iscore_dark_charcoal,
-        spaceBefore=8,
-        spaceAfter=12,
-        leftIndent=12,
-        rightIndent=12,
-        lineHeight=16,
-        borderWidth=1,
-        borderColor=iscore_teal,
-        borderPadding=15,
-        backColor=HexColor('#F8F9FA'),
-        alignment=4
-    )
-    
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=9,
-        fontName='Helvetica',
-        textColor=iscore_gray,
-        alignment=1,
-        spaceBefore=16,
-        spaceAfter=4,
-        lineHeight=12
-    )
-    
-    story.append(Paragraph("I-SCORE KPI Dashboard Analysis Report", title_style))
-    story.append(Spacer(1, 0.3 * inch))
-    
-    story.append(Paragraph("1. Dashboard Objective", section_heading_style))
-    story.append(Paragraph(dashboard_objective, objective_style))
-    story.append(Spacer(1, 0.2 * inch))
-    
-    story.append(Paragraph("2. AI Analysis Results", section_heading_style))
-    story.append(Spacer(1, 0.1 * inch))
-    
-    def clean_markdown(text):
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-        text = re.sub(r'\*(.*?)\*', r'\1', text)
-        text = re.sub(r'^#+\s*', '', text, flags=re.MULTILINE)
-        return text.strip()
-    
-    analysis_lines = analysis_result.split('\n')
-    
-    for line in analysis_lines:
-        line = line.strip()
-        if not line:
-            story.append(Spacer(1, 6))
-            continue
-        
-        if line.startswith(tuple(f'{chr(97+i)}. ' for i in range(26))):
-            clean_line = clean_markdown(line)
-            story.append(Paragraph(clean_line, sub_heading_style))
-        
-        elif line.startswith(tuple(f'{i}. ' for i in range(1, 10))):
-            clean_line = clean_markdown(line)
-            if ':' in clean_line:
-                parts = clean_line.split(':', 1)
-                title = parts[0].strip()
-                description = parts[1].strip() if len(parts) > 1 else ''
-                formatted = f'<b>{title}:</b><br />{description}'
-                story.append(Paragraph(formatted, body_style))
-            else:
-                story.append(Paragraph(clean_line, body_style))
-        
-        elif line.startswith(('*', '-', '•')):
-            clean_line = clean_markdown(line.lstrip('*-• ').strip())
-            story.append(Paragraph(f'• {clean_line}', bullet_style))
-        
-        else:
-            clean_line = clean_markdown(line)
-            if clean_line:
-                story.append(Paragraph(clean_line, body_style))
-    
-    story.append(Spacer(1, 0.3 * inch))
-    story.append(Paragraph("Generated by I-Score KPI Dashboard Analyzer | Powered by Gemini Pro Vision Model", footer_style))
-    
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return doc
+
+
+def create_pdf_report(dashboard_objective, analysis_result, filename, output=None, images=None):
+    """
+    Create a PDF report with I-Score branding and professional formatting.
+
+    The report is written to ``output`` (a file path or binary file object)
+    when one is given, so large reports never need to be held in memory;
+    otherwise it is returned in a BytesIO buffer. ``images`` is an optional
+    list of (PIL image, caption) pairs embedded under the objective.
+    """
+    with time_task("pdf"):
+        if output is not None:
+            doc = _create_doc_template(output)
+            doc.build(build_report_story(dashboard_objective, analysis_result, images))
+            return output
+
+        buffer = BytesIO()
+        doc = _create_doc_template(buffer)
+        doc.build(build_report_story(dashboard_objective, analysis_result, images))
+        buffer.seek(0)
+        return buffer
+
+
+def create_pdf_bundle(reports, output):
+    """
+    Render several reports into one PDF with a table of contents.
+
+    Args:
+        reports: List of (dashboard_objective, analysis_result, filename) tuples
+        output: File path or binary file object to write the bundle to
+    """
+    styles = get_report_styles()
+
+    toc = TableOfContents()
+    toc.levelStyles = [styles['toc_entry']]
+
+    story = [
+        Paragraph("I-SCORE KPI Dashboard Report Bundle", styles['title']),
+        Paragraph("Contents", styles['section_heading']),
+        toc,
+    ]
+    for index, (dashboard_objective, analysis_result, filename) in enumerate(reports, start=1):
+        story.append(PageBreak())
+        story.append(Paragraph(f"{index}. {escape(filename)}", styles['bundle_entry']))
+        story.extend(build_report_story(dashboard_objective, analysis_result))
+
+    with time_task("pdf_bundle"):
+        doc = _create_doc_template(output, doc_class=BundleDocTemplate)
+        doc.multiBuild(story)
@@ -0,0 +1,133 @@
+"""
+Plugin Registry Module
+
+This module imports model backends and the PDF engine lazily, on first use,
+and records how long every tracked import took so start-up cost can be
+reported per module.
+"""
+
+import importlib
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Plugin name -> module path. Heavy SDKs are only imported when a session
+# actually needs them.
+PLUGINS = {
+    "gemini": "google.generativeai",
+    "ollama": "ollama",
+    "pdf": "pdf_generator",
+    "similarity": "dashboard_similarity",
+}
+
+_loaded_plugins = {}
+# Module label -> its first recorded import. Streamlit re-runs the app's
+# module-level imports on every rerun; only the first one has a real cost.
+_import_records = {}
+_registry_lock = threading.RLock()
+
+
+def register_plugin(name, module_path):
+    """
+    Register (or replace) a lazily imported plugin.
+
+    Args:
+        name: Short plugin name used with load_plugin()
+        module_path: Dotted module path to import on first use
+    """
+    with _registry_lock:
+        PLUGINS[name] = module_path
+        _loaded_plugins.pop(name, None)
+
+
+def _record_import(module_name, seconds, phase):
+    _import_records.setdefault(module_name, {
+        "module": module_name,
+        "seconds": seconds,
+        "phase": phase,
+    })
+
+
+@contextmanager
+def import_timer(module_name):
+    """
+    Time the imports executed inside the block as start-up cost, once per process.
+
+    Args:
+        module_name: Label to report the import under
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _registry_lock:
+            _record_import(module_name, time.perf_counter() - start, "startup")
+
+
+def load_plugin(name):
+    """
+    Import a registered plugin on first use and return its module.
+
+    Args:
+        name: Plugin name from PLUGINS
+
+    Returns:
+        module: The imported plugin module
+
+    Raises:
+        KeyError: If the plugin is not registered
+        ImportError: If the plugin module cannot be imported
+    """
+    module = _loaded_plugins.get(name)
+    if module is not None:
+        return module
+
+    with _registry_lock:
+        module = _loaded_plugins.get(name)
+        if module is None:
+            module_path = PLUGINS[name]
+            start = time.perf_counter()
+            module = importlib.import_module(module_path)
+            _record_import(module_path, time.perf_counter() - start, "lazy")
+            _loaded_plugins[name] = module
+    return module
+
+
+def is_plugin_loaded(name):
+    """Check whether a plugin has already been imported in this process."""
+    return name in _loaded_plugins
+
+
+def get_import_report():
+    """
+    Get the recorded import costs, most expensive first.
+
+    Returns:
+        list: [{'module': str, 'seconds': float, 'phase': 'startup'|'lazy'}, ...]
+    """
+    with _registry_lock:
+        return sorted(_import_records.values(), key=lambda record: record["seconds"], reverse=True)
+
+
+def format_import_report():
+    """
+    Format the import report as plain text for logs.
+
+    Returns:
+        str: One line per recorded import
+    """
+    lines = ["Import cost per module:"]
+    for record in get_import_report():
+        lines.append(f"  {record['seconds'] * 1000:8.1f} ms  {record['phase']:<7}  {record['module']}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Cold-start report: import every plugin once and print the cost of each.
+    for plugin_name in PLUGINS:
+        try:
+            load_plugin(plugin_name)
+        except ImportError as e:
+            print(f"Could not import plugin '{plugin_name}': {e}")
+    print(format_import_report())
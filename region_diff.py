@@ -0,0 +1,308 @@
+"""
+Region Diff Module
+
+This module compares two versions of the same dashboard locally. The images
+are aligned by phase correlation, diffed tile by tile with NumPy, and the
+changed regions are returned as before/after crops together with a heatmap,
+so the model only has to look at the patches that actually changed.
+"""
+
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from llm_service import gemini_inference, ollama_inference
+from image_fingerprint import tiles_to_regions
+
+
+DIFF_MAX_SIDE = 2048
+REGION_GRID = 32
+# Per-pixel luma or chroma difference that counts as a change; JPEG noise stays below it.
+PIXEL_CHANGE_THRESHOLD = 32
+# Share of a tile's pixels that must change for the tile to count as changed.
+MIN_TILE_CHANGE = 0.01
+# Shifts larger than this share of the image are treated as failed alignment.
+MAX_SHIFT_FRACTION = 0.1
+CHROMA_FACTOR = 4
+MAX_REGIONS = 6
+HEATMAP_MAX_SIDE = 900
+# Top share of a dashboard holding its title bar; versions of one dashboard keep it.
+TITLE_REGION_FRACTION = 0.1
+
+
+def _image_array(image, size, mode):
+    resized = image.convert(mode).resize(size, Image.BILINEAR, reducing_gap=2.0)
+    return np.asarray(resized, dtype=np.float32)
+
+
+def estimate_shift(before, after):
+    """
+    Estimate the translation between two grayscale arrays by phase correlation.
+
+    Args:
+        before: 2-D float array
+        after: 2-D float array of the same shape
+
+    Returns:
+        tuple: (dx, dy) such that after[y, x] matches before[y - dy, x - dx]
+    """
+    height, width = before.shape
+    window = np.outer(np.hanning(height), np.hanning(width)).astype(np.float32)
+    spectrum_before = np.fft.rfft2((before - before.mean()) * window)
+    spectrum_after = np.fft.rfft2((after - after.mean()) * window)
+
+    cross_power = spectrum_after * np.conj(spectrum_before)
+    cross_power /= np.abs(cross_power) + 1e-9
+    correlation = np.fft.irfft2(cross_power, s=before.shape)
+
+    dy, dx = np.unravel_index(np.argmax(correlation), correlation.shape)
+    if dy > height // 2:
+        dy -= height
+    if dx > width // 2:
+        dx -= width
+    if abs(dx) > width * MAX_SHIFT_FRACTION or abs(dy) > height * MAX_SHIFT_FRACTION:
+        return 0, 0
+    return int(dx), int(dy)
+
+
+def _aligned_difference(before, after, dx, dy):
+    """
+    Per-pixel difference of the overlapping area after alignment.
+
+    Each pixel is compared with the closest match in a 3x3 neighbourhood of the
+    earlier version, which absorbs the sub-pixel error left by the alignment.
+    Multi-channel arrays are compared on their most-changed channel. Pixels
+    without overlap count as unchanged.
+    """
+    if before.ndim == 2:
+        before, after = before[..., None], after[..., None]
+    height, width = after.shape[:2]
+    padded = np.pad(before, ((1, 1), (1, 1), (0, 0)), mode="edge")
+    difference = np.zeros((height, width), dtype=np.float32)
+    top, bottom = max(0, dy), min(height, height + dy)
+    left, right = max(0, dx), min(width, width + dx)
+
+    target = after[top:bottom, left:right]
+    best = None
+    for offset_y in (0, 1, 2):
+        for offset_x in (0, 1, 2):
+            candidate = padded[top - dy + offset_y:bottom - dy + offset_y, left - dx + offset_x:right - dx + offset_x]
+            distance = np.abs(target - candidate).max(axis=-1)
+            best = distance if best is None else np.minimum(best, distance)
+    difference[top:bottom, left:right] = best
+    return difference
+
+
+def _changed_tiles(mask):
+    """Return the (row, col) tiles of a REGION_GRID x REGION_GRID grid with enough changed pixels."""
+    height, width = mask.shape
+    row_edges = np.linspace(0, height, REGION_GRID + 1).astype(int)
+    col_edges = np.linspace(0, width, REGION_GRID + 1).astype(int)
+    counts = np.add.reduceat(np.add.reduceat(mask.astype(np.int32), row_edges[:-1], axis=0), col_edges[:-1], axis=1)
+    areas = np.outer(np.diff(row_edges), np.diff(col_edges))
+    rows, cols = np.nonzero(counts > areas * MIN_TILE_CHANGE)
+    return set(zip(rows.tolist(), cols.tolist()))
+
+
+def _render_heatmap(after, difference, boxes):
+    """Overlay the difference in red on a dimmed copy of the new version."""
+    intensity = np.clip(difference / (PIXEL_CHANGE_THRESHOLD * 2), 0.0, 1.0)
+    base = after * 0.6 + 60
+    rgb = np.stack([
+        base * (1 - intensity) + 255 * intensity,
+        base * (1 - intensity),
+        base * (1 - intensity),
+    ], axis=-1)
+    heatmap = Image.fromarray(rgb.astype(np.uint8), "RGB")
+
+    draw = ImageDraw.Draw(heatmap)
+    for number, box in enumerate(boxes, start=1):
+        draw.rectangle(box, outline=(220, 20, 60), width=2)
+        draw.text((box[0] + 4, box[1] + 2), str(number), fill=(220, 20, 60))
+    heatmap.thumbnail((HEATMAP_MAX_SIDE, HEATMAP_MAX_SIDE), Image.LANCZOS)
+    return heatmap
+
+
+def _compare(before, after):
+    """Align and diff two versions at diff resolution; returns (size, after array, difference, shift, tiles)."""
+    scale = min(1.0, DIFF_MAX_SIDE / max(after.size))
+    size = (max(1, round(after.width * scale)), max(1, round(after.height * scale)))
+    before_array = _image_array(before, size, "L")
+    after_array = _image_array(after, size, "L")
+    dx, dy = estimate_shift(before_array, after_array)
+    difference = _aligned_difference(before_array, after_array, dx, dy)
+
+    # Colour changes at similar brightness (a status turning from red to green)
+    # only show up in chroma. JPEG stores chroma at reduced resolution, so it is
+    # compared at a quarter of the size, which also keeps the cost low.
+    chroma_size = (max(1, size[0] // CHROMA_FACTOR), max(1, size[1] // CHROMA_FACTOR))
+    chroma_difference = _aligned_difference(
+        _image_array(before, chroma_size, "YCbCr")[..., 1:],
+        _image_array(after, chroma_size, "YCbCr")[..., 1:],
+        round(dx / CHROMA_FACTOR), round(dy / CHROMA_FACTOR)
+    )
+    chroma_difference = np.kron(chroma_difference, np.ones((CHROMA_FACTOR, CHROMA_FACTOR), dtype=np.float32))
+    height, width = min(size[1], chroma_difference.shape[0]), min(size[0], chroma_difference.shape[1])
+    difference[:height, :width] = np.maximum(difference[:height, :width], chroma_difference[:height, :width])
+
+    return size, after_array, difference, (dx, dy), _changed_tiles(difference > PIXEL_CHANGE_THRESHOLD)
+
+
+def images_match(before, after):
+    """
+    Check whether two images show the same content, ignoring re-encoding noise and small shifts.
+
+    Args:
+        before: PIL Image
+        after: PIL Image
+
+    Returns:
+        bool: True if no region changed
+    """
+    return not _compare(before, after)[4]
+
+
+def title_regions_match(before, after):
+    """
+    Check whether two dashboards share the same title bar, ignoring re-encoding noise and small shifts.
+
+    Dashboards built from one template differ in their title while versions of
+    one dashboard keep it, so this separates the two where a perceptual hash
+    cannot.
+
+    Args:
+        before: PIL Image
+        after: PIL Image
+
+    Returns:
+        bool: True if the title regions show the same content
+    """
+    def title(image):
+        return image.crop((0, 0, image.width, max(1, int(image.height * TITLE_REGION_FRACTION))))
+    return images_match(title(before), title(after))
+
+
+def diff_images(before, after):
+    """
+    Find the regions that changed between two versions of a dashboard.
+
+    Args:
+        before: PIL Image of the earlier version
+        after: PIL Image of the later version (may differ in size)
+
+    Returns:
+        dict: {
+            'shift': (dx, dy) alignment offset in pixels of the later version,
+            'regions': [(left, top, right, bottom), ...] boxes in the later version,
+            'crops': [(before_crop, after_crop), ...] one pair per region,
+            'changed_fraction': float share of grid tiles that changed,
+            'heatmap': PIL Image highlighting the changes,
+        }
+    """
+    size, after_array, difference, (dx, dy), tiles = _compare(before, after)
+
+    regions = tiles_to_regions(tiles, after.size, padding=0.01, grid=REGION_GRID)
+    if len(regions) > MAX_REGIONS:
+        # Too many scattered changes: keep one region spanning all of them.
+        regions = [(
+            min(box[0] for box in regions), min(box[1] for box in regions),
+            max(box[2] for box in regions), max(box[3] for box in regions),
+        )]
+
+    after_scale = after.width / size[0]
+    before_scale_x, before_scale_y = before.width / size[0], before.height / size[1]
+    crops = []
+    for left, top, right, bottom in regions:
+        # Map the box into the earlier version through the alignment offset.
+        before_box = (
+            min(before.width - 1, max(0, int((left / after_scale - dx) * before_scale_x))),
+            min(before.height - 1, max(0, int((top / after_scale - dy) * before_scale_y))),
+            min(before.width, max(1, int((right / after_scale - dx) * before_scale_x))),
+            min(before.height, max(1, int((bottom / after_scale - dy) * before_scale_y))),
+        )
+        crops.append((before.crop(before_box), after.crop((left, top, right, bottom))))
+
+    heatmap_boxes = [tuple(int(value / after_scale) for value in box) for box in regions]
+    return {
+        "shift": (round(dx * after_scale), round(dy * after_scale)),
+        "regions": regions,
+        "crops": crops,
+        "changed_fraction": len(tiles) / (REGION_GRID * REGION_GRID),
+        "heatmap": _render_heatmap(after_array, difference, heatmap_boxes),
+    }
+
+
+def summarize_diff(diff, image_size):
+    """
+    Describe the changed regions in words for the comparison prompt and the UI.
+
+    Args:
+        diff: Dict from diff_images()
+        image_size: (width, height) of the later version
+
+    Returns:
+        str: One line per changed region
+    """
+    width, height = image_size
+    lines = [
+        f"- Region {index}: x {left / width:.0%}-{right / width:.0%}, y {top / height:.0%}-{bottom / height:.0%} of the dashboard"
+        for index, (left, top, right, bottom) in enumerate(diff["regions"], start=1)
+    ]
+    lines.append(f"- About {diff['changed_fraction']:.0%} of the dashboard area changed")
+    if diff["shift"] != (0, 0):
+        lines.append(f"- The layout shifted by {diff['shift'][0]} px horizontally and {diff['shift'][1]} px vertically")
+    return "\n".join(lines)
+
+
+def build_region_comparison_prompt(objective1, objective2, summary):
+    """
+    Build the prompt comparing two versions of a dashboard from their changed regions.
+
+    Args:
+        objective1: Objective of the earlier version
+        objective2: Objective of the later version
+        summary: Text from summarize_diff()
+
+    Returns:
+        str: Prompt to send together with the before/after crops
+    """
+    return f"""
+            You are an expert at comparing KPI dashboards.
+
+            Two versions of the same dashboard were compared locally. Only the
+            regions below changed; everything else is identical. For each region
+            two images are attached in order: the earlier version, then the later version.
+
+            Dashboard 1 (earlier) Objective: {objective1}
+            Dashboard 2 (later) Objective: {objective2}
+
+            CHANGED REGIONS:
+            {summary}
+
+            Task: Provide a detailed comparison of the two versions. For each changed
+            region, describe what changed (values, trends, statuses) and what it means
+            for the objectives, then summarize the overall performance shift and
+            potential strategic insights. Format the response clearly with headings.
+        """
+
+
+def run_region_comparison(diff, after_size, objective1, objective2, model_choice):
+    """
+    Compare two versions of a dashboard by sending only the changed crops.
+
+    Args:
+        diff: Dict from diff_images()
+        after_size: (width, height) of the later version
+        objective1: Objective of the earlier version
+        objective2: Objective of the later version
+        model_choice: String indicating which model to use
+
+    Returns:
+        str or None: The comparison, or None if the model call failed
+    """
+    prompt = build_region_comparison_prompt(objective1, objective2, summarize_diff(diff, after_size))
+    images = [crop for pair in diff["crops"] for crop in pair]
+    if model_choice == "Gemini (Online)":
+        return gemini_inference(prompt, images, task="comparison")
+    return ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), prompt, images, task="comparison")
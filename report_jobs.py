@@ -0,0 +1,232 @@
+"""
+Report Jobs Module
+
+This module builds PDF reports in a background worker so that Streamlit
+reruns (chat messages, widget changes) never wait on reportlab. Reports are
+keyed by a content hash computed once when an analysis finishes and are
+written to the disk-backed artifact store rather than kept in memory.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from artifact_store import get_artifact_store
+from plugin_registry import load_plugin
+from tracing import start_span, current_span
+from metrics import get_metrics
+
+
+MAX_CACHED_REPORTS = 64
+# A failed build is not retried for the same content until this many seconds
+# have passed, doubling with each consecutive failure up to MAX_RETRY_SECONDS.
+RETRY_SECONDS = float(os.getenv("PDF_RETRY_SECONDS", 30))
+MAX_RETRY_SECONDS = 600
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PDF_WORKERS", 2)),
+    thread_name_prefix="pdf-report"
+)
+_reports = OrderedDict()
+_reports_lock = threading.Lock()
+# content hash -> (consecutive failures, time of the last failure)
+_failures = {}
+_failures_lock = threading.Lock()
+# Reports a download could not serve, with the reason; the page tells the user
+# on its next rerun.
+_report_notices = {}
+
+
+def pending_reports():
+    """Count reports that are queued or being built."""
+    with _reports_lock:
+        return sum(1 for future in _reports.values() if not future.done())
+
+
+get_metrics().add_gauge("kpi_pdf_reports_pending", "PDF reports queued or being built.", (), lambda: [((), pending_reports())])
+
+
+def report_content_hash(objective, analysis, image_hashes=()):
+    """
+    Compute the key a report is stored under.
+
+    Args:
+        objective: Objective printed on the report
+        analysis: Analysis text printed on the report
+        image_hashes: Content hashes of the dashboard images embedded in the report
+
+    Returns:
+        str: SHA-256 hex digest of the report content
+    """
+    digest = hashlib.sha256()
+    digest.update(objective.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(analysis.encode("utf-8"))
+    for image_hash in image_hashes:
+        digest.update(b"\x00")
+        digest.update(image_hash.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _build_pdf(content_hash, objective, analysis, filename, images, parent_span):
+    with start_span("pdf.build", parent=parent_span, image_count=len(images or []), analysis_chars=len(analysis)) as span:
+        store = get_artifact_store()
+        if store.exists(content_hash):
+            span.set("cached", True)
+            return store.path_for(content_hash)
+
+        pdf_generator = load_plugin("pdf")
+        path = store.write(
+            content_hash,
+            lambda path: pdf_generator.create_pdf_report(objective, analysis, filename, output=path, images=images)
+        )
+        span.set("cached", False)
+        span.set("pdf_bytes", os.path.getsize(path))
+        return path
+
+
+def _record_outcome(content_hash, future):
+    with _failures_lock:
+        if future.exception() is None:
+            _failures.pop(content_hash, None)
+        else:
+            count, _ = _failures.get(content_hash, (0, 0.0))
+            _failures[content_hash] = (count + 1, time.time())
+
+
+def retry_delay(content_hash):
+    """
+    Get how long a failed report must wait before it is built again.
+
+    Args:
+        content_hash: Key from report_content_hash()
+
+    Returns:
+        float: Seconds until the next build attempt; 0 if it may be built now
+    """
+    with _failures_lock:
+        failure = _failures.get(content_hash)
+    if failure is None:
+        return 0.0
+    count, failed_at = failure
+    backoff = min(MAX_RETRY_SECONDS, RETRY_SECONDS * 2 ** (count - 1))
+    return max(0.0, failed_at + backoff - time.time())
+
+
+def submit_pdf_report(content_hash, objective, analysis, filename, images=None):
+    """
+    Start building a report in the background unless it is already built or queued.
+
+    A report whose last build failed is only rebuilt once its retry delay has
+    passed; until then the failed future is returned.
+
+    Args:
+        content_hash: Key from report_content_hash()
+        objective: Objective printed on the report
+        analysis: Analysis text printed on the report
+        filename: Source filename of the dashboard
+        images: Optional list of (PIL image, caption) pairs to embed
+
+    Returns:
+        Future: Resolves to the path of the stored PDF
+    """
+    with _reports_lock:
+        future = _reports.get(content_hash)
+        if future is not None and not future.done():
+            _reports.move_to_end(content_hash)
+            return future
+        if future is not None and future.exception() is None and get_artifact_store().exists(content_hash):
+            _reports.move_to_end(content_hash)
+            return future
+        if future is not None and future.exception() is not None and retry_delay(content_hash) > 0:
+            return future
+
+        future = _executor.submit(_build_pdf, content_hash, objective, analysis, filename, images, current_span())
+        future.add_done_callback(lambda done: _record_outcome(content_hash, done))
+        _reports[content_hash] = future
+        while len(_reports) > MAX_CACHED_REPORTS:
+            _reports.popitem(last=False)
+        return future
+
+
+def get_pdf_report_path(content_hash, wait=False):
+    """
+    Get the path of a report's PDF in the artifact store.
+
+    Args:
+        content_hash: Key from report_content_hash()
+        wait: Block until a queued report finishes building
+
+    Returns:
+        str or None: The PDF path, or None if it is unknown or still building
+
+    Raises:
+        Exception: Whatever the report build raised, when wait is True
+    """
+    with _reports_lock:
+        future = _reports.get(content_hash)
+    if future is None:
+        store = get_artifact_store()
+        return store.path_for(content_hash) if store.exists(content_hash) else None
+    if not wait and not future.done():
+        return None
+    return future.result()
+
+
+def read_pdf_report(content_hash, objective=None, analysis=None, filename=None, images=None):
+    """
+    Wait for a report and read its bytes, for use as a deferred download.
+
+    A report evicted from the artifact store (or never queued in this
+    process) is rebuilt from the given content before it is read. Nothing is
+    raised: a report that cannot be served leaves a notice for
+    pop_report_notice() instead.
+
+    Args:
+        content_hash: Key from report_content_hash()
+        objective: Objective printed on the report, for rebuilding
+        analysis: Analysis text printed on the report, for rebuilding
+        filename: Source filename of the dashboard, for rebuilding
+        images: Optional list of (PIL image, caption) pairs, for rebuilding
+
+    Returns:
+        bytes or None: The PDF contents, or None if the report could not be served
+    """
+    store = get_artifact_store()
+    try:
+        try:
+            if get_pdf_report_path(content_hash, wait=True) is not None:
+                return store.read(content_hash)
+        except FileNotFoundError:
+            pass
+
+        if analysis is None:
+            _set_notice(content_hash, "This report expired from storage. Please generate it again.")
+            return None
+        submit_pdf_report(content_hash, objective, analysis, filename, images).result()
+        return store.read(content_hash)
+    except Exception as e:
+        _set_notice(content_hash, f"The PDF report could not be generated: {e}")
+        return None
+
+
+def _set_notice(content_hash, message):
+    with _reports_lock:
+        _report_notices[content_hash] = message
+
+
+def pop_report_notice(content_hash):
+    """
+    Get, and forget, why the last download of a report could not be served.
+
+    Args:
+        content_hash: Key from report_content_hash()
+
+    Returns:
+        str or None: A message for the user, or None if the download succeeded
+    """
+    with _reports_lock:
+        return _report_notices.pop(content_hash, None)
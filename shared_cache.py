@@ -0,0 +1,256 @@
+"""
+Shared Analysis Cache Module
+
+This module provides a server-wide store for dashboard analyses so that the
+same dashboard uploaded by several users (or several worker processes) is only
+analyzed once per model.
+"""
+
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "kpi_dashboard_analysis_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = 1000
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def normalize_objective(objective):
+    """
+    Normalize an objective so that trivial differences do not split cache entries.
+
+    Args:
+        objective: Business objective text entered by the user
+
+    Returns:
+        str: Lower-cased objective with collapsed whitespace
+    """
+    return " ".join((objective or "").lower().split())
+
+
+def make_cache_key(image_hash, objective, model):
+    """
+    Build the cache key for an analysis.
+
+    Args:
+        image_hash: Content hash of the dashboard image
+        objective: Business objective text
+        model: Model identifier (e.g. "gemini:gemini-1.5-flash-latest")
+
+    Returns:
+        str: SHA-256 hex digest identifying the analysis
+    """
+    raw = "\x00".join([image_hash, normalize_objective(objective), model])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SharedAnalysisCache:
+    """SQLite-backed LRU cache of analyses shared across sessions and processes."""
+
+    def __init__(self, path=None, max_entries=None):
+        self.path = path or os.getenv("ANALYSIS_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.max_entries = max_entries or int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        """Return the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # SQLite's file locking makes the store safe across worker processes;
+            # WAL lets readers proceed while another process is writing.
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                key TEXT PRIMARY KEY,
+                image_hash TEXT NOT NULL,
+                objective TEXT NOT NULL,
+                model TEXT NOT NULL,
+                analysis TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_last_accessed ON analyses (last_accessed)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_image_hash ON analyses (image_hash)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+    def _bump_stat(self, conn, name, amount=1):
+        conn.execute(
+            "INSERT INTO cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount)
+        )
+
+    def get(self, image_hash, objective, model):
+        """
+        Look up a cached analysis.
+
+        Args:
+            image_hash: Content hash of the dashboard image
+            objective: Business objective text
+            model: Model identifier
+
+        Returns:
+            str or None: The cached analysis, or None on a miss
+        """
+        key = make_cache_key(image_hash, objective, model)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT analysis FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE analyses SET last_accessed = ?, hit_count = hit_count + 1 WHERE key = ?",
+                    (time.time(), key)
+                )
+                self._bump_stat(conn, "hits")
+                self._bump_stat(conn, f"hits:{model}")
+            else:
+                self._bump_stat(conn, "misses")
+                self._bump_stat(conn, f"misses:{model}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row[0] if row else None
+
+    def put(self, image_hash, objective, model, analysis):
+        """
+        Store an analysis and evict the least recently used entries over capacity.
+
+        Args:
+            image_hash: Content hash of the dashboard image
+            objective: Business objective text
+            model: Model identifier
+            analysis: Analysis text returned by the model
+        """
+        key = make_cache_key(image_hash, objective, model)
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses "
+                "(key, image_hash, objective, model, analysis, created_at, last_accessed, hit_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, image_hash, normalize_objective(objective), model, analysis, now, now)
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM analyses WHERE key IN "
+                    "(SELECT key FROM analyses ORDER BY last_accessed ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self._bump_stat(conn, "evictions", overflow)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def find_by_image(self, image_hash):
+        """
+        List every cached analysis of an image, whatever its objective or model.
+
+        Unlike get(), this does not count as a hit or refresh the entries.
+
+        Args:
+            image_hash: Content hash of the dashboard image
+
+        Returns:
+            list: [{'objective': str, 'model': str, 'analysis': str, 'created_at': float}, ...], newest first
+        """
+        rows = self._connect().execute(
+            "SELECT objective, model, analysis, created_at FROM analyses WHERE image_hash = ? ORDER BY created_at DESC",
+            (image_hash,)
+        ).fetchall()
+        return [
+            {"objective": objective, "model": model, "analysis": analysis, "created_at": created_at}
+            for objective, model, analysis, created_at in rows
+        ]
+
+    def stats(self):
+        """
+        Summarize cache usage for the admin view.
+
+        Returns:
+            dict: {
+                'entries': int,
+                'max_entries': int,
+                'hits': int,
+                'misses': int,
+                'evictions': int,
+                'hit_rate': float,  # 0.0-1.0
+                'per_model': {model: {'hits': int, 'misses': int, 'hit_rate': float}}
+            }
+        """
+        conn = self._connect()
+        (entries,) = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()
+        raw = dict(conn.execute("SELECT name, value FROM cache_stats").fetchall())
+
+        per_model = {}
+        for name, value in raw.items():
+            if ":" not in name:
+                continue
+            kind, model = name.split(":", 1)
+            per_model.setdefault(model, {"hits": 0, "misses": 0})[kind] = value
+        for counts in per_model.values():
+            total = counts["hits"] + counts["misses"]
+            counts["hit_rate"] = counts["hits"] / total if total else 0.0
+
+        hits = raw.get("hits", 0)
+        misses = raw.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "evictions": raw.get("evictions", 0),
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "per_model": per_model,
+        }
+
+    def clear(self):
+        """Remove every cached analysis and reset the counters."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM analyses")
+        conn.execute("DELETE FROM cache_stats")
+        conn.execute("COMMIT")
+
+
+def get_shared_cache():
+    """
+    Get the process-wide shared analysis cache.
+
+    Returns:
+        SharedAnalysisCache: Cache instance shared by every Streamlit session in this process
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SharedAnalysisCache()
+    return _shared_cache
@@ -0,0 +1,97 @@
+"""
+Single Flight Module
+
+This module collapses concurrent identical calls into one. The first caller
+for a key runs the call; callers arriving with the same key while it is in
+flight wait for it and share its result (or its exception) instead of sending
+a duplicate request. Waiting callers can give up independently without
+affecting the call or the other callers.
+"""
+
+import threading
+
+
+class CallCancelledError(RuntimeError):
+    """Raised to a waiting caller that cancelled before the shared call finished."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """Registry of in-flight calls keyed by request identity."""
+
+    # How often waiting callers check whether they were cancelled.
+    POLL_SECONDS = 0.1
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executed": 0, "collapsed": 0, "cancelled": 0, "max_followers": 0}
+
+    def do(self, key, function, cancelled=None):
+        """
+        Run function once for all concurrent callers with the same key.
+
+        Args:
+            key: Hashable request identity
+            function: Callable with no arguments performing the call
+            cancelled: Optional callable returning True once this caller no
+                       longer needs the result; only checked while waiting
+
+        Returns:
+            The result of the shared call
+
+        Raises:
+            CallCancelledError: If this caller cancelled while waiting
+            Exception: Whatever the shared call raised
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["executed"] += 1
+            else:
+                call.followers += 1
+                self._stats["collapsed"] += 1
+                self._stats["max_followers"] = max(self._stats["max_followers"], call.followers)
+
+        if leader:
+            try:
+                call.result = function()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            while not call.done.wait(self.POLL_SECONDS):
+                if cancelled is not None and cancelled():
+                    with self._lock:
+                        self._stats["cancelled"] += 1
+                    raise CallCancelledError("Caller cancelled while waiting for a shared call.")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        """
+        Summarize how many calls were collapsed.
+
+        Returns:
+            dict: {'calls', 'executed', 'collapsed', 'cancelled', 'max_followers',
+                   'in_flight', 'collapse_rate'}
+        """
+        with self._lock:
+            stats = dict(self._stats, in_flight=len(self._calls))
+        stats["collapse_rate"] = stats["collapsed"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
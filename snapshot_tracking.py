@@ -0,0 +1,434 @@
+"""
+Snapshot Tracking Module
+
+This module keeps a history of snapshots for recurring dashboards (the same
+dashboard uploaded week after week). A new upload is matched to its dashboard
+by perceptual hash and layout within a scope (an explicitly named dashboard,
+or the uploading session), so dashboards built from one template are not
+mistaken for each other. If an earlier snapshot exists, it is diffed against
+the upload at full resolution and only the changed regions plus the previous
+analysis are sent to the model for a delta report.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from PIL import Image
+
+from llm_service import gemini_inference, ollama_inference
+from shared_cache import normalize_objective
+from utils import image_content_hash
+from artifact_store import get_artifact_store
+from region_diff import diff_images
+from image_fingerprint import (
+    perceptual_hash, layout_signature, hamming_distance, grayscale_thumbnail,
+    changed_tiles, TILE_GRID, LAYOUT_SIZE
+)
+from job_queue import notify
+
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(tempfile.gettempdir(), "kpi_dashboard_snapshots.sqlite3")
+
+# A new upload belongs to an existing dashboard when both signatures are close.
+# Dashboards built from one template differ only in their values, so these are
+# kept tight and matching is further limited to one scope.
+MAX_HASH_DISTANCE = 6
+MAX_LAYOUT_DISTANCE = int(LAYOUT_SIZE * LAYOUT_SIZE * 0.1)
+# Above this share of changed tiles a delta report is no cheaper than a full analysis.
+MAX_CHANGED_FRACTION = 0.5
+# Full-size snapshot images are kept in the artifact store for diffing.
+SNAPSHOT_IMAGE_SUFFIX = ".snapshot.png"
+
+_snapshot_store = None
+_snapshot_store_lock = threading.Lock()
+
+
+def compute_fingerprint(image):
+    """
+    Compute the signatures used to identify a dashboard and diff its snapshots.
+
+    Args:
+        image: PIL Image object
+
+    Returns:
+        dict: {'image_hash': str, 'phash': int, 'layout': int, 'thumbnail': bytes}
+    """
+    return {
+        "image_hash": image_content_hash(image),
+        "phash": perceptual_hash(image),
+        "layout": layout_signature(image),
+        "thumbnail": grayscale_thumbnail(image),
+    }
+
+
+def dashboard_scope(name):
+    """
+    Scope snapshot history to an explicitly named dashboard.
+
+    Args:
+        name: Dashboard name given by the user or API client
+
+    Returns:
+        str or None: Scope key, or None if the name is blank
+    """
+    name = " ".join((name or "").split()).lower()
+    return f"dashboard:{name}" if name else None
+
+
+def session_scope(owner):
+    """
+    Scope snapshot history to the uploads of one session.
+
+    Args:
+        owner: Session or job owner id
+
+    Returns:
+        str: Scope key
+    """
+    return f"session:{owner}"
+
+
+def is_same_dashboard(first, second):
+    """
+    Check whether two fingerprints are versions of the same dashboard.
+
+    Args:
+        first: Dict from compute_fingerprint()
+        second: Dict from compute_fingerprint()
+
+    Returns:
+        bool: True if both the perceptual hash and the layout are close
+    """
+    return (hamming_distance(first["phash"], second["phash"]) <= MAX_HASH_DISTANCE
+            and hamming_distance(first["layout"], second["layout"]) <= MAX_LAYOUT_DISTANCE)
+
+
+class SnapshotStore:
+    """SQLite-backed history of dashboard identities and their snapshots."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SNAPSHOT_DB_PATH", DEFAULT_SNAPSHOT_PATH)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dashboards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                phash TEXT NOT NULL,
+                layout TEXT NOT NULL,
+                scope TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                dashboard_id INTEGER NOT NULL REFERENCES dashboards (id),
+                created_at REAL NOT NULL,
+                image_hash TEXT NOT NULL,
+                phash TEXT NOT NULL,
+                thumbnail BLOB NOT NULL,
+                objective TEXT NOT NULL,
+                model TEXT NOT NULL,
+                analysis TEXT NOT NULL,
+                kpis TEXT NOT NULL
+            )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(dashboards)")}
+        if "scope" not in columns:
+            conn.execute("ALTER TABLE dashboards ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_dashboard ON snapshots (dashboard_id, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_snapshots_image_hash ON snapshots (image_hash)")
+
+    def find_dashboard(self, fingerprint, scope):
+        """
+        Find the dashboard identity an upload belongs to.
+
+        Args:
+            fingerprint: Dict from compute_fingerprint()
+            scope: Dashboard name or session the history is limited to
+
+        Returns:
+            int or None: Dashboard id of the closest match within the thresholds
+        """
+        conn = self._connect()
+        dashboard_id = self.dashboard_for_image(fingerprint["image_hash"], scope)
+        if dashboard_id is not None:
+            return dashboard_id
+
+        best_id, best_distance = None, None
+        rows = conn.execute("SELECT id, phash, layout FROM dashboards WHERE scope = ?", (scope,))
+        for dashboard_id, phash, layout in rows:
+            distance = hamming_distance(fingerprint["phash"], int(phash, 16))
+            if distance > MAX_HASH_DISTANCE:
+                continue
+            if hamming_distance(fingerprint["layout"], int(layout, 16)) > MAX_LAYOUT_DISTANCE:
+                continue
+            if best_distance is None or distance < best_distance:
+                best_id, best_distance = dashboard_id, distance
+        return best_id
+
+    def latest_snapshot(self, dashboard_id, objective, model):
+        """
+        Get the most recent snapshot of a dashboard analyzed for the same objective and model.
+
+        Returns:
+            dict or None: Snapshot row with 'analysis', 'kpis' and 'thumbnail'
+        """
+        row = self._connect().execute(
+            "SELECT id, created_at, image_hash, thumbnail, analysis, kpis FROM snapshots "
+            "WHERE dashboard_id = ? AND objective = ? AND model = ? ORDER BY created_at DESC LIMIT 1",
+            (dashboard_id, normalize_objective(objective), model)
+        ).fetchone()
+        if not row:
+            return None
+        return {
+            "id": row[0],
+            "created_at": row[1],
+            "image_hash": row[2],
+            "thumbnail": row[3],
+            "analysis": row[4],
+            "kpis": json.loads(row[5]),
+        }
+
+    def record_snapshot(self, fingerprint, objective, model, analysis, kpis, scope, dashboard_id=None):
+        """
+        Store a snapshot, creating the dashboard identity in the scope if it is new.
+
+        Returns:
+            int: Dashboard id the snapshot was recorded under
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if dashboard_id is None:
+                cursor = conn.execute(
+                    "INSERT INTO dashboards (phash, layout, scope, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (f"{fingerprint['phash']:016x}", f"{fingerprint['layout']:x}", scope, now, now)
+                )
+                dashboard_id = cursor.lastrowid
+            else:
+                # Track the latest look of the dashboard so gradual redesigns keep matching.
+                conn.execute(
+                    "UPDATE dashboards SET phash = ?, layout = ?, updated_at = ? WHERE id = ?",
+                    (f"{fingerprint['phash']:016x}", f"{fingerprint['layout']:x}", now, dashboard_id)
+                )
+            conn.execute(
+                "INSERT INTO snapshots (dashboard_id, created_at, image_hash, phash, thumbnail, objective, model, analysis, kpis) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (dashboard_id, now, fingerprint["image_hash"], f"{fingerprint['phash']:016x}", fingerprint["thumbnail"],
+                 normalize_objective(objective), model, analysis, json.dumps(kpis or []))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return dashboard_id
+
+    def dashboard_for_image(self, image_hash, scope):
+        """Return the dashboard id an exact image was recorded under in the scope, or None."""
+        row = self._connect().execute(
+            "SELECT snapshots.dashboard_id FROM snapshots JOIN dashboards ON dashboards.id = snapshots.dashboard_id "
+            "WHERE snapshots.image_hash = ? AND dashboards.scope = ? ORDER BY snapshots.created_at DESC LIMIT 1",
+            (image_hash, scope)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_kpi_trends(self, dashboard_id):
+        """
+        Collect each KPI's value across a dashboard's snapshots.
+
+        Args:
+            dashboard_id: Dashboard identity
+
+        Returns:
+            dict: {kpi_name: [(snapshot_time, period, value), ...]} in chronological order
+        """
+        trends = {}
+        rows = self._connect().execute(
+            "SELECT created_at, kpis FROM snapshots WHERE dashboard_id = ? ORDER BY created_at",
+            (dashboard_id,)
+        )
+        for created_at, kpis in rows:
+            for kpi in json.loads(kpis):
+                trends.setdefault(kpi["name"], []).append((created_at, kpi["period"], kpi["value"]))
+        return trends
+
+
+def get_snapshot_store():
+    """
+    Get the process-wide snapshot store.
+
+    Returns:
+        SnapshotStore: Store shared by every Streamlit session in this process
+    """
+    global _snapshot_store
+    if _snapshot_store is None:
+        with _snapshot_store_lock:
+            if _snapshot_store is None:
+                _snapshot_store = SnapshotStore()
+    return _snapshot_store
+
+
+def build_delta_prompt(objective, previous_analysis, regions, image_size):
+    """
+    Build the prompt asking for a delta report from changed regions only.
+
+    Args:
+        objective: Business objective for the analysis
+        previous_analysis: Analysis of the previous snapshot
+        regions: (left, top, right, bottom) boxes of the attached crops
+        image_size: (width, height) of the full dashboard
+
+    Returns:
+        str: Prompt to send together with the cropped regions
+    """
+    width, height = image_size
+    region_lines = "\n".join(
+        f"- Image {index}: x {left / width:.0%}-{right / width:.0%}, y {top / height:.0%}-{bottom / height:.0%} of the dashboard"
+        for index, (left, top, right, bottom) in enumerate(regions, start=1)
+    )
+    return f"""
+You previously analyzed this KPI dashboard. A new version has been uploaded and
+only the regions attached as images have changed; everything else is identical.
+
+BUSINESS OBJECTIVE: {objective}
+
+PREVIOUS ANALYSIS:
+{previous_analysis}
+
+CHANGED REGIONS (attached in this order):
+{region_lines}
+
+Task: Write an updated analysis of the dashboard. Start with a "## What Changed"
+section describing the differences visible in the changed regions and their
+impact on the objective, then give the full updated analysis, carrying over
+findings from the previous analysis that the changes do not affect.
+"""
+
+
+def _save_snapshot_image(image, image_hash):
+    store = get_artifact_store()
+    if not store.exists(image_hash, SNAPSHOT_IMAGE_SUFFIX):
+        store.write(image_hash, lambda path: image.save(path, "PNG", compress_level=1), suffix=SNAPSHOT_IMAGE_SUFFIX)
+
+
+def _load_snapshot_image(image_hash):
+    """Return the full-size image of a snapshot, or None if it was evicted."""
+    try:
+        image = Image.open(get_artifact_store().path_for(image_hash, SNAPSHOT_IMAGE_SUFFIX))
+        image.load()
+        return image
+    except OSError:
+        return None
+
+
+def run_incremental_analysis(image, objective, model_choice, model_id, scope):
+    """
+    Analyze a new version of a known dashboard from its changed regions only.
+
+    The thumbnail comparison only rules out uploads that changed too much; what
+    changed is decided by diffing the previous snapshot's full image against
+    the upload. The previous analysis is never returned as-is for a different
+    image.
+
+    Args:
+        image: PIL Image object of the new upload
+        objective: Business objective for the analysis
+        model_choice: String indicating which model to use
+        model_id: Backend-qualified model name
+        scope: Dashboard name or session the history is limited to
+
+    Returns:
+        dict or None: {'analysis': str, 'changed_regions': int} when the upload
+                      matched an earlier snapshot, None if a full analysis is needed
+    """
+    store = get_snapshot_store()
+    fingerprint = compute_fingerprint(image)
+    dashboard_id = store.find_dashboard(fingerprint, scope)
+    if dashboard_id is None:
+        return None
+
+    previous = store.latest_snapshot(dashboard_id, objective, model_id)
+    if previous is None:
+        return None
+
+    tiles = changed_tiles(previous["thumbnail"], fingerprint["thumbnail"])
+    if len(tiles) > MAX_CHANGED_FRACTION * TILE_GRID * TILE_GRID:
+        return None
+
+    previous_image = _load_snapshot_image(previous["image_hash"])
+    if previous_image is None:
+        return None
+    diff = diff_images(previous_image, image)
+    if diff["changed_fraction"] > MAX_CHANGED_FRACTION:
+        return None
+
+    if not diff["regions"]:
+        # Confirmed at diff resolution: only re-encoding noise or a small shift.
+        recorded = datetime.fromtimestamp(previous["created_at"]).strftime("%Y-%m-%d %H:%M")
+        return {
+            "analysis": f"## What Changed\nNo visible changes since the snapshot of {recorded}.\n\n{previous['analysis']}",
+            "changed_regions": 0,
+        }
+
+    regions = diff["regions"]
+    crops = [after_crop for _, after_crop in diff["crops"]]
+    prompt = build_delta_prompt(objective, previous["analysis"], regions, image.size)
+    if model_choice == "Gemini (Online)":
+        analysis = gemini_inference(prompt, crops)
+    else:
+        analysis = ollama_inference(os.getenv("OLLAMA_MODEL_NAME"), prompt, crops)
+
+    if not analysis:
+        return None
+    return {"analysis": analysis, "changed_regions": len(regions)}
+
+
+def record_analysis_snapshot(image, objective, model_id, analysis, scope, kpis=None):
+    """
+    Record an analyzed upload in its dashboard's snapshot history.
+
+    Args:
+        image: PIL Image object of the upload
+        objective: Business objective for the analysis
+        model_id: Backend-qualified model name
+        analysis: Analysis text shown to the user
+        scope: Dashboard name or session the history is limited to
+        kpis: Optional extracted KPI table
+
+    Returns:
+        int or None: Dashboard id, or None if recording failed
+    """
+    try:
+        store = get_snapshot_store()
+        fingerprint = compute_fingerprint(image)
+        dashboard_id = store.find_dashboard(fingerprint, scope)
+        if dashboard_id is not None:
+            previous = store.latest_snapshot(dashboard_id, objective, model_id)
+            if previous and previous["image_hash"] == fingerprint["image_hash"]:
+                # Re-uploads of the exact same image are not a new snapshot.
+                return dashboard_id
+        _save_snapshot_image(image, fingerprint["image_hash"])
+        return store.record_snapshot(fingerprint, objective, model_id, analysis, kpis, scope, dashboard_id)
+    except Exception as e:
+        notify("warning", f"Could not record dashboard snapshot: {e}")
+        return None
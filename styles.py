@@ -1,8 +1,28 @@
+import hashlib
+import os
+import re
+import urllib.request
+from functools import lru_cache
+
+import streamlit as st
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+FONTS_DIR = os.path.join(STATIC_DIR, "fonts")
+SELF_HOSTED_FONTS_CSS = os.path.join(FONTS_DIR, "fonts.css")
+STYLESHEET_PREFIX = "kpi-styles."
+
+_FONT_IMPORT_PATTERN = re.compile(r"@import url\('(?P<url>[^']+)'\);")
+_CSS_COMMENT_PATTERN = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_WHITESPACE_PATTERN = re.compile(r"\s+")
+_CSS_PUNCTUATION_PATTERN = re.compile(r"\s*([{}:;,>])\s*")
+_FONT_URL_PATTERN = re.compile(r"url\((?P<url>https://[^)]+)\)")
+
+
 def custom_styles():
     return """
     <style>
     /* Import Google Fonts matching I-Score's modern aesthetic */
-    @import url('https://fonts.com/css2?family=Inter:wght@300;400;500;600;700;800&family=Space+Grotesk:wght@300;400;500;600;700&display=swap');
+    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&family=Space+Grotesk:wght@300;400;500;600;700&display=swap');
     
     /* I-Score Logo Color Palette - Exact Brand Colors */
     :root {
@@ -623,4 +643,112 @@ def custom_styles():
         margin-left: auto;
     }
     </style>
-    """ 
\ No newline at end of file
+    """ 
+
+def minify_css(css):
+    """Strip comments and redundant whitespace from a stylesheet."""
+    css = _CSS_COMMENT_PATTERN.sub("", css)
+    css = _CSS_WHITESPACE_PATTERN.sub(" ", css)
+    css = _CSS_PUNCTUATION_PATTERN.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def _stylesheet_source(self_host_fonts):
+    css = custom_styles().replace("<style>", "").replace("</style>", "")
+    if self_host_fonts:
+        with open(SELF_HOSTED_FONTS_CSS, encoding="utf-8") as f:
+            css = _FONT_IMPORT_PATTERN.sub(lambda _: f.read(), css)
+    return css
+
+
+@lru_cache(maxsize=None)
+def build_stylesheet(self_host_fonts=False):
+    """
+    Compile the app styles into a minified, content-hashed static file.
+
+    The file is written once per process under ``static/`` and only when its
+    content changed, so the hashed name can be cached by browsers indefinitely.
+
+    Args:
+        self_host_fonts: Replace the Google Fonts import with the font files
+                         downloaded by ``python styles.py --download-fonts``
+
+    Returns:
+        tuple: (filename, minified_css)
+    """
+    css = minify_css(_stylesheet_source(self_host_fonts))
+    content_hash = hashlib.sha256(css.encode("utf-8")).hexdigest()[:16]
+    filename = f"{STYLESHEET_PREFIX}{content_hash}.css"
+
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    path = os.path.join(STATIC_DIR, filename)
+    if not os.path.exists(path):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(css)
+        os.replace(temp_path, path)
+
+        for name in os.listdir(STATIC_DIR):
+            if name.startswith(STYLESHEET_PREFIX) and name.endswith(".css") and name != filename:
+                os.remove(os.path.join(STATIC_DIR, name))
+
+    return filename, css
+
+
+def stylesheet_html():
+    """
+    Get the HTML that applies the app styles.
+
+    With static file serving enabled this is a single <link> to the hashed
+    stylesheet, so reruns no longer resend the whole stylesheet. Otherwise the
+    minified CSS is inlined.
+
+    Returns:
+        str: HTML to render with st.markdown(..., unsafe_allow_html=True)
+    """
+    self_host_fonts = (
+        os.getenv("SELF_HOST_FONTS", "").lower() in ("1", "true", "yes")
+        and os.path.exists(SELF_HOSTED_FONTS_CSS)
+    )
+    filename, css = build_stylesheet(self_host_fonts)
+    if st.get_option("server.enableStaticServing"):
+        return f'<link rel="stylesheet" href="app/static/{filename}">'
+    return f"<style>{css}</style>"
+
+
+def download_fonts():
+    """
+    Download the Google Fonts used by the app into ``static/fonts`` for self-hosting.
+
+    Returns:
+        str: Path of the generated @font-face stylesheet
+    """
+    match = _FONT_IMPORT_PATTERN.search(custom_styles())
+    # Google Fonts serves woff2 files only to user agents it recognises.
+    request = urllib.request.Request(match.group("url"), headers={"User-Agent": "Mozilla/5.0 Chrome/120.0"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        fonts_css = response.read().decode("utf-8")
+
+    os.makedirs(FONTS_DIR, exist_ok=True)
+
+    def localize(font_match):
+        url = font_match.group("url")
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16] + os.path.splitext(url)[1]
+        path = os.path.join(FONTS_DIR, name)
+        if not os.path.exists(path):
+            urllib.request.urlretrieve(url, path)
+        return f"url(fonts/{name})"
+
+    fonts_css = _FONT_URL_PATTERN.sub(localize, fonts_css)
+    with open(SELF_HOSTED_FONTS_CSS, "w", encoding="utf-8") as f:
+        f.write(fonts_css)
+    return SELF_HOSTED_FONTS_CSS
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--download-fonts" in sys.argv:
+        print(f"Fonts written to {download_fonts()}")
+    filename, css = build_stylesheet(os.path.exists(SELF_HOSTED_FONTS_CSS))
+    print(f"Stylesheet written to {os.path.join(STATIC_DIR, filename)} ({len(css)} bytes)")
@@ -0,0 +1,133 @@
+"""
+Synthetic Dashboards Module
+
+This module draws deterministic dashboard-like images for offline runs: a
+title bar, KPI tiles, a bar chart, a line chart and a table, with layout and
+values derived from a seed. A later version of a dashboard keeps its layout
+and changes a few values, which is what the snapshot and region-diff paths
+expect of two versions of one dashboard.
+"""
+
+import random
+
+from PIL import Image, ImageDraw
+
+
+PALETTES = [
+    ((245, 247, 250), (31, 58, 96), (52, 152, 219), (231, 76, 60)),
+    ((255, 255, 255), (44, 62, 80), (39, 174, 96), (243, 156, 18)),
+    ((250, 245, 240), (90, 40, 60), (142, 68, 173), (22, 160, 133)),
+    ((240, 244, 248), (20, 20, 20), (230, 126, 34), (41, 128, 185)),
+]
+KPI_NAMES = ["Revenue", "Churn Rate", "Active Users", "NPS", "ARPU", "Conversion", "Tickets", "Uptime"]
+
+
+def _layout(rng):
+    return {
+        "palette": rng.choice(PALETTES),
+        "kpis": rng.sample(KPI_NAMES, rng.randint(3, 5)),
+        "bars": rng.randint(5, 10),
+        "points": rng.randint(8, 16),
+        "rows": rng.randint(3, 6),
+        "chart_first": rng.random() < 0.5,
+    }
+
+
+def _values(layout, rng):
+    return {
+        "kpis": [rng.randint(10, 99999) for _ in layout["kpis"]],
+        "bars": [rng.uniform(0.15, 1.0) for _ in range(layout["bars"])],
+        "points": [rng.uniform(0.1, 0.9) for _ in range(layout["points"])],
+        "table": [[rng.randint(0, 9999) for _ in range(3)] for _ in range(layout["rows"])],
+    }
+
+
+def _revise(values, version, rng):
+    """Change a few values per version, leaving the rest of the dashboard as it was."""
+    revised = {key: [list(row) if isinstance(row, list) else row for row in value] for key, value in values.items()}
+    for _ in range(version):
+        index = rng.randrange(len(revised["kpis"]))
+        revised["kpis"][index] = rng.randint(10, 99999)
+        row = rng.randrange(len(revised["table"]))
+        revised["table"][row][rng.randrange(3)] = rng.randint(0, 9999)
+    return revised
+
+
+def _draw(layout, values, size, title):
+    width, height = size
+    background, ink, primary, accent = layout["palette"]
+    image = Image.new("RGB", size, background)
+    draw = ImageDraw.Draw(image)
+
+    draw.rectangle([0, 0, width, height // 12], fill=ink)
+    draw.text((20, height // 36), title, fill=background)
+
+    tile_top, tile_bottom = height // 12 + 16, height // 12 + 16 + height // 7
+    tile_width = (width - 20) // len(layout["kpis"])
+    for index, (name, value) in enumerate(zip(layout["kpis"], values["kpis"])):
+        left = 10 + index * tile_width
+        draw.rectangle([left + 6, tile_top, left + tile_width - 6, tile_bottom], outline=ink, width=2)
+        draw.text((left + 16, tile_top + 10), name, fill=ink)
+        draw.text((left + 16, tile_top + 34), f"{value:,}", fill=primary)
+
+    charts_top = tile_bottom + 20
+    charts_bottom = charts_top + height // 3
+    halves = [(10, width // 2 - 10), (width // 2 + 10, width - 10)]
+    bar_box, line_box = halves if layout["chart_first"] else halves[::-1]
+
+    bar_width = (bar_box[1] - bar_box[0]) / len(values["bars"])
+    for index, fraction in enumerate(values["bars"]):
+        left = bar_box[0] + index * bar_width
+        top = charts_bottom - fraction * (charts_bottom - charts_top)
+        draw.rectangle([left + 3, top, left + bar_width - 3, charts_bottom], fill=primary)
+
+    step = (line_box[1] - line_box[0]) / (len(values["points"]) - 1)
+    points = [
+        (line_box[0] + index * step, charts_bottom - fraction * (charts_bottom - charts_top))
+        for index, fraction in enumerate(values["points"])
+    ]
+    draw.line(points, fill=accent, width=3)
+
+    row_height = max(18, (height - charts_bottom - 30) // (len(values["table"]) + 1))
+    table_top = charts_bottom + 20
+    for row_index, row in enumerate([["Region", "Orders", "Returns"]] + values["table"]):
+        top = table_top + row_index * row_height
+        draw.line([(10, top), (width - 10, top)], fill=ink)
+        for column, cell in enumerate(row):
+            draw.text((20 + column * (width - 40) // 3, top + 4), f"{cell:,}" if isinstance(cell, int) else cell, fill=ink)
+    return image
+
+
+def make_dashboard(seed, version=0, size=(1280, 800)):
+    """
+    Draw one synthetic dashboard.
+
+    Args:
+        seed: Dashboard identity; the same seed always gives the same layout
+        version: 0 for the original, higher numbers change progressively more values
+        size: (width, height) in pixels
+
+    Returns:
+        PIL.Image: RGB dashboard image
+    """
+    rng = random.Random(seed)
+    layout = _layout(rng)
+    values = _values(layout, rng)
+    if version:
+        values = _revise(values, version, random.Random(f"{seed}:{version}"))
+    return _draw(layout, values, size, f"Dashboard {seed} - v{version + 1}")
+
+
+def make_corpus(count, seed=0, size=(1280, 800)):
+    """
+    Draw a corpus of distinct dashboards.
+
+    Args:
+        count: Number of dashboards
+        seed: Corpus seed
+        size: (width, height) in pixels
+
+    Returns:
+        list: [(image, filename), ...]
+    """
+    return [(make_dashboard(seed * 100003 + index, size=size), f"dashboard_{index:03d}.png") for index in range(count)]
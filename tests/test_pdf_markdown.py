@@ -0,0 +1,56 @@
+import pytest
+
+from pdf_generator import format_inline, markdown_to_flowables, parse_markdown
+
+
+def _types(nodes):
+    return [node['type'] for node in nodes]
+
+
+def test_table_header_separator():
+    nodes = parse_markdown("| KPI | Value |\n|---|---|\n| Revenue | $1M |")
+    assert _types(nodes) == ['table']
+    assert nodes[0]['header'] is True
+    assert nodes[0]['rows'] == [['KPI', 'Value'], ['Revenue', '$1M']]
+
+
+def test_rule_after_table_ends_the_table():
+    nodes = parse_markdown("| a | b |\n| 1 | 2 |\n---\n| c | d |")
+    assert _types(nodes) == ['table', 'table']
+    assert nodes[0]['rows'] == [['a', 'b'], ['1', '2']]
+    assert nodes[1]['rows'] == [['c', 'd']]
+    assert nodes[1]['header'] is False
+
+
+@pytest.mark.parametrize("rule", ["---", "***", "___", "* * *", "- - -", "_ _ _"])
+def test_rules_are_not_rendered_as_text(rule):
+    assert _types(parse_markdown(f"Before\n{rule}\nAfter")) == ['paragraph', 'paragraph']
+
+
+def test_bullets_nest_under_numbered_item():
+    nodes = parse_markdown("1. Revenue\n   - Up 10%\n      - Driven by Q3\n2. Costs\n- Flat")
+    assert _types(nodes) == ['numbered', 'list_item', 'list_item', 'numbered', 'list_item']
+    assert [node['depth'] for node in nodes if node['type'] == 'list_item'] == [1, 2, 0]
+
+
+def test_nested_numbers_under_numbered_item():
+    nodes = parse_markdown("1. Revenue\n   1. North\n   2. South")
+    assert [(node['marker'], node['depth']) for node in nodes[1:]] == [('1.', 1), ('2.', 1)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("**bold** and *ital*", "<b>bold</b> and <i>ital</i>"),
+    ("**bold *ital*** end", "<b>bold <i>ital</i></b> end"),
+    ("***both***", "<b><i>both</i></b>"),
+    ("*ital **bold** ital*", "<i>ital <b>bold</b> ital</i>"),
+    ("**a*b**", "<b>a*b</b>"),
+    ("__bold__ `code`", "<b>bold</b> <font face=\"Courier\">code</font>"),
+    ("a < b & c", "a &lt; b &amp; c"),
+])
+def test_format_inline(text, expected):
+    assert format_inline(text) == expected
+
+
+def test_markdown_compiles_to_flowables():
+    text = "# Title\n1. **Revenue**: grew\n   - **up *10%***\n***\n| a | b |\n|---|---|\n| 1 | 2 |"
+    assert len(markdown_to_flowables(text)) == 5
@@ -0,0 +1,265 @@
+"""
+Tracing Module
+
+This module records spans for pipeline stages and backend calls: what ran,
+under which parent, for how long, and with which sizes, cache outcomes and
+backends. Finished spans are kept in memory for the performance panel and
+appended by a background writer to a local JSONL file, one span per line in
+the OTLP JSON span layout. The file is rotated once it reaches TRACE_MAX_BYTES,
+keeping TRACE_BACKUPS older files.
+"""
+
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+DEFAULT_TRACE_PATH = os.path.join(tempfile.gettempdir(), "kpi_dashboard_traces.jsonl")
+SERVICE_NAME = "kpi-dashboard-analyzer"
+# Traces kept in memory for the performance panel.
+MAX_RECENT_TRACES = 200
+# Spans waiting for the writer; beyond this they are dropped rather than
+# letting a slow disk hold up the pipeline.
+MAX_PENDING_SPANS = 10000
+
+_tracer = None
+_tracer_lock = threading.Lock()
+_current = threading.local()
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, key, value):
+        """Set an attribute; None values are ignored."""
+        if value is not None:
+            self.attributes[key] = value
+
+    def add(self, key, amount):
+        """Add to a numeric attribute, starting from zero."""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def record_error(self, error):
+        """Mark the span as failed."""
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        """Finish the span and hand it to the tracer; later calls do nothing."""
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            get_tracer().export(self)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self):
+        """Return the span in the OTLP JSON span layout."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _attribute_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"},
+        }
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Collects finished spans into the trace file and the recent-traces buffer."""
+
+    def __init__(self, path=None, enabled=None):
+        self.path = path or os.getenv("TRACE_PATH", DEFAULT_TRACE_PATH)
+        if enabled is None:
+            enabled = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.max_bytes = int(os.getenv("TRACE_MAX_BYTES", 50 * 1024 * 1024))
+        self.backups = int(os.getenv("TRACE_BACKUPS", 3))
+        self.dropped = 0
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = queue.Queue(maxsize=MAX_PENDING_SPANS)
+        self._writer = None
+
+    def export(self, span):
+        if not self.enabled:
+            return
+        with self._lock:
+            spans = self._traces.setdefault(span.trace_id, [])
+            spans.append(span)
+            self._traces.move_to_end(span.trace_id)
+            while len(self._traces) > MAX_RECENT_TRACES:
+                self._traces.popitem(last=False)
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+                self._writer.start()
+        try:
+            self._pending.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Wait until the spans exported so far are written, or the timeout passes."""
+        deadline = time.monotonic() + timeout
+        while self._pending.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def _write_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            while True:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except OSError:
+                # Tracing must never break the pipeline it observes.
+                pass
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+
+    def _write(self, batch):
+        trace_file = open(self.path, "a", encoding="utf-8")
+        try:
+            size = trace_file.tell()
+            for span in batch:
+                line = json.dumps(dict(span.to_dict(), resource={"service.name": SERVICE_NAME})) + "\n"
+                if size and size + len(line) > self.max_bytes:
+                    trace_file.close()
+                    self._rotate()
+                    trace_file = open(self.path, "a", encoding="utf-8")
+                    size = 0
+                trace_file.write(line)
+                size += len(line)
+        finally:
+            trace_file.close()
+
+    def _rotate(self):
+        """Shift trace.jsonl to trace.jsonl.1, .1 to .2 and so on, dropping the oldest."""
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def recent_traces(self, owner=None, limit=20):
+        """
+        Get the most recent traces, newest first.
+
+        Args:
+            owner: Optional owner id; only traces whose root span carries it are returned
+            limit: Maximum number of traces
+
+        Returns:
+            list: [{'trace_id', 'name', 'owner', 'start_ns', 'duration_ms', 'spans'}, ...]
+                  where 'spans' are Span objects ordered by start time
+        """
+        with self._lock:
+            traces = [(trace_id, list(spans)) for trace_id, spans in reversed(self._traces.items())]
+
+        results = []
+        for trace_id, spans in traces:
+            roots = [span for span in spans if span.parent_id is None]
+            if not roots:
+                continue
+            root = roots[0]
+            if owner is not None and root.attributes.get("owner") != owner:
+                continue
+            spans.sort(key=lambda span: span.start_ns)
+            end_ns = max(span.end_ns for span in spans)
+            results.append({
+                "trace_id": trace_id,
+                "name": root.name,
+                "owner": root.attributes.get("owner"),
+                "start_ns": spans[0].start_ns,
+                "duration_ms": (end_ns - spans[0].start_ns) / 1e6,
+                "spans": spans,
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+
+def get_tracer():
+    """
+    Get the process-wide tracer.
+
+    Returns:
+        Tracer: Tracer shared by every session, job and API request in this process
+    """
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+    return _tracer
+
+
+def bind_span(span):
+    """Make span the parent of spans started on this thread."""
+    _current.span = span
+
+
+def current_span():
+    """Return the span active on this thread, or None."""
+    return getattr(_current, "span", None)
+
+
+@contextmanager
+def start_span(name, parent=None, **attributes):
+    """
+    Time a block as a child of the current span (or of an explicit parent).
+
+    Args:
+        name: Span name, e.g. "model.gemini" or "cache.lookup"
+        parent: Optional parent span; defaults to the span active on this thread
+        **attributes: Initial span attributes
+
+    Yields:
+        Span: The running span, for adding attributes
+    """
+    previous = current_span()
+    span = Span(name, parent or previous, attributes)
+    bind_span(span)
+    try:
+        yield span
+    except Exception as e:
+        span.record_error(e)
+        raise
+    finally:
+        bind_span(previous)
+        span.end()
@@ -1,22 +1,21 @@
-import streamlit as st
-import base64
-from PIL import Image
-from io import BytesIO
+import hashlib
 
 def image_to_base64(image_file):
-    """Converts an uploaded image file to a base64 encoded string."""
-    try:
-        if hasattr(image_file, 'mode'):
-            img = image_file
-        else:
-            img = Image.open(image_file)
-        
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        buffered = BytesIO()
-        img.save(buffered, format="JPEG")
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
-    except Exception as e:
-        st.error(f"Error processing image: {e}")
-        return None
\ No newline at end of file
+    """Converts an image (or image file) to a base64 encoded JPEG string; errors propagate to the caller."""
+    # Imported here because image_codec depends on image_content_hash below.
+    from image_codec import encode_image_base64, open_image
+
+    return encode_image_base64(open_image(image_file), "JPEG")
+
+def image_content_hash(image):
+    """Returns a SHA-256 hex digest of a PIL image's pixel content."""
+    cached = getattr(image, '_content_hash', None)
+    if cached:
+        return cached
+
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode('utf-8'))
+    digest.update(image.tobytes())
+    content_hash = digest.hexdigest()
+    image._content_hash = content_hash
+    return content_hash